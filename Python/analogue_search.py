@@ -6,19 +6,23 @@ This module performs:
 2. Slice to event bounding box on-the-fly
 3. Use snapshot_date as reference pattern
 4. Compute latitude-weighted Euclidean distance between reference and all days
-5. Split into past/present periods
+5. Split into named periods (past/present, or any epochs from the config)
 6. Select top N analogues per period with minimum time separation
-7. Save results to CSV files
+7. Save results to CSV (or Parquet, --output_format parquet) files
 
 Usage:
     python analogue_search.py --dataset era5 --event antarctica_peninsula
     python analogue_search.py --dataset era5 --all
+    python analogue_search.py --dataset era5 --event antarctica_peninsula --window
+    python analogue_search.py --dataset era5 --event antarctica_peninsula --incremental
+    python analogue_search.py --dataset era5 --event antarctica_peninsula --smoothing_sweep 1,3,5,7
 """
 
 import argparse
 import os
 import sys
 import json
+import time
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional, Any
 from datetime import datetime
@@ -36,6 +40,22 @@ from data_utils import (
 )
 
 from spatial_weights import compute_spatial_weights
+from analogue_selection import epoch_definitions, period_epochs, select_period_analogues
+from coord_schema import open_field, sel_bbox
+from cube_store import cube_store_exists, cube_store_matches, cube_store_path, open_cube_store
+from manifest import manifest_path, needs_build, record
+from slice_cache import anomaly_source_files, slice_year_range
+from table_io import TABLE_FORMATS, find_table, read_table, table_suffix, write_table
+from distance_engine import (
+    compute_euclidean_distances_batch,
+    compute_euclidean_distances_expanded,
+    compute_wasserstein_distances_sorted,
+    norm_cache_dir,
+    running_mean,
+    running_mean_cache_dir,
+    running_mean_days,
+    running_means,
+)
 
 # #region agent log - Debug logging helper
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -65,73 +85,6 @@ def debug_log(hypothesis_id: str, location: str, message: str, data: dict):
 # #endregion
 
 
-def _select_primary_var(ds: xr.Dataset, expected_var: Optional[str] = None) -> str:
-    """Select main field variable, ignoring bounds helper variables when possible."""
-    if expected_var and expected_var in ds.data_vars:
-        return expected_var
-
-    scored: List[Tuple[int, int, str]] = []
-    for name, da in ds.data_vars.items():
-        nl = name.lower()
-        if "bnd" in nl or "bound" in nl:
-            continue
-
-        dims_lower = [d.lower() for d in da.dims]
-        has_lat = any("lat" in d for d in dims_lower)
-        has_lon = any("lon" in d for d in dims_lower)
-        has_time = any(("time" in d) or ("valid" in d) for d in dims_lower)
-        score = (3 if has_lat and has_lon else 0) + (1 if has_time else 0) + da.ndim
-        scored.append((score, da.size, name))
-
-    if scored:
-        scored.sort(reverse=True)
-        return scored[0][2]
-
-    non_bounds = [n for n in ds.data_vars if "bnd" not in n.lower() and "bound" not in n.lower()]
-    if non_bounds:
-        return non_bounds[0]
-
-    var_names = list(ds.data_vars)
-    if not var_names:
-        raise ValueError("No data variables found in anomaly files")
-    return var_names[0]
-
-
-def _standardize_coords(ds: xr.Dataset, expected_var: Optional[str] = None) -> Tuple[xr.DataArray, str]:
-    """Detect and rename coords to standard names; return selected data variable + name."""
-    selected_var = _select_primary_var(ds, expected_var=expected_var)
-    data_var = ds[selected_var]
-
-    lat_name = lon_name = time_name = None
-    for coord in data_var.coords:
-        coord_lower = coord.lower()
-        if 'lat' in coord_lower:
-            lat_name = coord
-        elif 'lon' in coord_lower:
-            lon_name = coord
-        elif 'time' in coord_lower or 'valid' in coord_lower:
-            time_name = coord
-    if lat_name is None or lon_name is None:
-        raise ValueError(f"Could not detect lat/lon coordinates. Found: {list(ds.coords)}")
-    rename_dict = {}
-    if lat_name != 'lat':
-        rename_dict[lat_name] = 'lat'
-    if lon_name != 'lon':
-        rename_dict[lon_name] = 'lon'
-    if time_name and time_name != 'time':
-        rename_dict[time_name] = 'time'
-    if rename_dict:
-        data_var = data_var.rename(rename_dict)
-
-    if "lat" not in data_var.coords or "lon" not in data_var.coords:
-        raise ValueError(
-            f"Selected variable '{selected_var}' has no lat/lon coords. "
-            f"dims={data_var.dims}, coords={list(data_var.coords)}"
-        )
-
-    return data_var, selected_var
-
-
 def load_anomaly_data(
     dataset: str,
     var: str,
@@ -139,13 +92,16 @@ def load_anomaly_data(
     region: Dict[str, float],
     year_range: Optional[Tuple[int, int]] = None,
     sliced_path: Optional[Path] = None,
-    verbose: bool = True
+    verbose: bool = True,
+    store_path: Optional[Path] = None
 ) -> xr.DataArray:
     """
-    Load anomaly data, optionally from a pre-sliced CDO file.
+    Load anomaly data, optionally from a cube store or a pre-sliced CDO file.
 
-    When sliced_path is provided, loads that single file (already sliced in time/space).
-    Otherwise loads full F01 anomaly files and slices to region in Python.
+    When store_path points at a cube store (see cube_store.py), it is opened
+    memory-mapped.  Otherwise, when sliced_path is provided, loads that single
+    file (already sliced in time/space).  Otherwise loads full F01 anomaly
+    files and slices to region in Python.
     
     Parameters
     ----------
@@ -163,19 +119,31 @@ def load_anomaly_data(
         Pre-sliced NetCDF from CDO. If set, loads this file directly.
     verbose : bool
         Print progress messages
+    store_path : Path, optional
+        Cube store directory written by dask_slice.py --store. Takes
+        precedence over sliced_path when it exists.
         
     Returns
     -------
     xr.DataArray
         Anomaly data sliced to event bounding box
     """
+    if store_path is not None and cube_store_exists(store_path):
+        if verbose:
+            print(f"Opening cube store (memory-mapped): {store_path}")
+        data_var = open_cube_store(store_path)
+        if verbose:
+            print(f"Using variable: {data_var.name}")
+            print(f"Data shape: {dict(data_var.sizes)}")
+        return data_var
+
     if sliced_path is not None and sliced_path.exists():
         if verbose:
             print(f"Loading pre-sliced data: {sliced_path.name}")
         ds = xr.open_dataset(sliced_path, chunks={'time': 365})
-        data_var, selected_var = _standardize_coords(ds, expected_var=var)
+        data_var, schema = open_field(ds, sliced_path, preferred_var=var)
         if verbose:
-            print(f"Using variable: {selected_var}")
+            print(f"Using variable: {schema['var']}")
             print(f"Data shape: {dict(data_var.sizes)}")
         return data_var
 
@@ -217,9 +185,9 @@ def load_anomaly_data(
         chunks={'time': 365}
     )
     
-    data_var, selected_var = _standardize_coords(ds, expected_var=var)
+    data_var, schema = open_field(ds, anom_files, preferred_var=var)
     if verbose:
-        print(f"Using variable: {selected_var}")
+        print(f"Using variable: {schema['var']}")
     
     lat_min = region['lat_min']
     lat_max = region['lat_max']
@@ -229,10 +197,7 @@ def load_anomaly_data(
     if verbose:
         print(f"Slicing to region: lat[{lat_min}, {lat_max}], lon[{lon_min}, {lon_max}]")
     
-    if data_var.lat[0] > data_var.lat[-1]:
-        data_var = data_var.sel(lat=slice(lat_max, lat_min), lon=slice(lon_min, lon_max))
-    else:
-        data_var = data_var.sel(lat=slice(lat_min, lat_max), lon=slice(lon_min, lon_max))
+    data_var = sel_bbox(data_var, schema, lat_min, lat_max, lon_min, lon_max)
     
     if verbose:
         print(f"Data shape after slicing: {dict(data_var.sizes)}")
@@ -240,149 +205,226 @@ def load_anomaly_data(
     return data_var
 
 
-def compute_euclidean_distances(
-    data: xr.DataArray,
-    reference: xr.DataArray,
-    spatial_weights: xr.DataArray
+def _wasserstein_options(paths: Dict[str, Path], analogue_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Keyword arguments for compute_wasserstein_distances_sorted from the config."""
+    cfg = analogue_config.get('wasserstein', {}) or {}
+    return {
+        'cache_dir': paths['analogue'] / 'cache' / 'sorted' if cfg.get('cache_sorted', True) else None,
+        'n_quantiles': cfg.get('quantiles'),
+        'max_error': cfg.get('max_error'),
+    }
+
+
+def _with_smoothing(analogue_config: Dict[str, Any], window_days: int) -> Dict[str, Any]:
+    """Copy of the config with smoothing.window_days set (applied in the search)."""
+    smoothing = {**(analogue_config.get('smoothing', {}) or {}), 'window_days': int(window_days), 'in_search': True}
+    return {**analogue_config, 'smoothing': smoothing}
+
+
+def _load_event_cube(
+    event: Dict[str, Any],
+    dataset: str,
+    paths: Dict[str, Path],
+    match_var: str,
+    year_range: Optional[Tuple[int, int]],
+    verbose: bool = True
 ) -> xr.DataArray:
     """
-    Compute spatial-weighted Euclidean distance between reference and all time steps.
+    Load the event's anomaly cube, preferring a cube store, then the pre-sliced file.
 
-    Distance formula (no square root): d(t) = sum_ij( w_ij * (data(t,i,j) - ref(i,j))^2 )
-    where spatial_weights w_ij are normalized (sum == 1).
+    The store is only used if it was built from the current pre-sliced file;
+    a store left over from an older slice (rebuilt without --store) is
+    ignored with a warning.
+    """
+    event_name = event['name']
 
-    Parameters
-    ----------
-    data : xr.DataArray
-        Data array with dimensions (time, lat, lon)
-    reference : xr.DataArray
-        Reference pattern with dimensions (lat, lon)
-    spatial_weights : xr.DataArray
-        Normalized spatial weights with dims (lat, lon), sum == 1
+    # Path to CDO pre-sliced file (same location as cdo_slice.py writes).
+    # CDO slicing is done by the shell script before calling this; we just use the result if it exists.
+    sliced_path = paths["data"] / "F02_analogue_search" / "sliced" / dataset / event_name / f"anomaly_{match_var}_sliced.nc"
+    sliced_exists = sliced_path.exists()
 
-    Returns
-    -------
-    xr.DataArray
-        Distance for each time step, dimension (time,)
-    """
-    diff = data - reference
-    diff_sq = diff ** 2
-    weighted_diff_sq = diff_sq * spatial_weights
-    return weighted_diff_sq.sum(dim=['lat', 'lon'])
+    # Memory-mapped cube store written by dask_slice.py --store
+    store_path = cube_store_path(paths, dataset, event_name, match_var)
+    store_ok = cube_store_exists(store_path)
+    if store_ok and sliced_exists and not cube_store_matches(store_path, sliced_path):
+        print(f"[WARN] Cube store {store_path.relative_to(paths['data'])} was built from a different "
+              f"slice; using the slice (rerun dask_slice.py --store to rebuild the store)")
+        store_ok = False
+    if store_ok:
+        if verbose:
+            print(f"\nUsing cube store: {store_path.relative_to(paths['data'])}")
+        return load_anomaly_data(
+            dataset=dataset,
+            var=match_var,
+            paths=paths,
+            region=event['region'],
+            year_range=year_range,
+            store_path=store_path,
+            verbose=verbose
+        )
 
+    if verbose:
+        if sliced_exists:
+            print(f"\nUsing CDO pre-sliced file: {sliced_path.relative_to(paths['data'])}")
+        else:
+            print(f"\nCDO sliced file not found ({sliced_path.name}), loading full anomaly files and slicing in Python.")
 
-def compute_wasserstein_distances(
-    data: xr.DataArray,
-    reference: xr.DataArray,
-    spatial_weights: Optional[xr.DataArray] = None,
-) -> xr.DataArray:
+    # Load anomaly data sliced to event region (from sliced file if present, else full F01 + slice)
+    if verbose:
+        print(f"\nLoading anomaly data...")
+        if year_range and not sliced_exists:
+            print(f"  Year range filter: {year_range[0]}-{year_range[1]}")
+
+    return load_anomaly_data(
+        dataset=dataset,
+        var=match_var,
+        paths=paths,
+        region=event['region'],
+        year_range=year_range,
+        sliced_path=sliced_path if sliced_exists else None,
+        verbose=verbose
+    )
+
+
+def _extract_reference(
+    data_var: xr.DataArray,
+    target_date: pd.Timestamp,
+    event: Dict[str, Any],
+    dataset: str,
+    paths: Dict[str, Path],
+    match_var: str,
+    year_range: Optional[Tuple[int, int]],
+    verbose: bool = True,
+    mean_days: int = 1,
+    running_mean_cache: Optional[Path] = None
+) -> Tuple[xr.DataArray, pd.Timestamp]:
     """
-    Compute the 1-D Wasserstein (Earth Mover's) distance between the reference
-    pattern and every time step.
+    Return the (lat, lon) reference pattern nearest to target_date and its actual date.
 
-    The spatial field at each time step is treated as a sample of anomaly values
-    over the domain.  The closed-form 1-D W1 distance between two equal-size
-    empirical distributions is:
+    If the target year is not in the loaded data (e.g., processing past but the
+    snapshot is in present), the reference is loaded separately and smoothed
+    with the same running mean (mean_days) as the cube.
+    """
+    target_year = target_date.year
 
-        W1(u, v) = mean( |sort(u) - sort(v)| )
+    if year_range and not (year_range[0] <= target_year <= year_range[1]):
+        # Target is outside loaded year range - load it separately
+        if verbose:
+            print(f"  Snapshot year {target_year} not in loaded range, loading separately...")
+        ref_data = _load_reference_year(
+            target_year, event, dataset, paths, match_var, mean_days, running_mean_cache
+        )
+        reference = ref_data.sel(time=target_date, method='nearest')
+    else:
+        reference = data_var.sel(time=target_date, method='nearest')
+    actual_date = pd.Timestamp(reference.time.values)
+    return reference, actual_date
 
-    This is computed in a single vectorised numpy call: sort the reference once,
-    sort all candidate time steps in one go, then take the mean absolute
-    difference along the spatial axis.
 
-    No spatial weighting is applied: the Wasserstein metric already integrates
-    over the full spatial distribution, making it naturally area-representative
-    as long as the grid is reasonably regular (the same domain restriction used
-    for the Euclidean metric is applied upstream).
+def _load_reference_year(
+    year: int,
+    event: Dict[str, Any],
+    dataset: str,
+    paths: Dict[str, Path],
+    match_var: str,
+    mean_days: int = 1,
+    running_mean_cache: Optional[Path] = None
+) -> xr.DataArray:
+    """One year of the event's anomaly field, smoothed like the cube (for references outside year_range)."""
+    ref_data = load_anomaly_data(
+        dataset=dataset,
+        var=match_var,
+        paths=paths,
+        region=event['region'],
+        year_range=(year, year),
+        verbose=False
+    )
+    return running_mean(ref_data, mean_days, running_mean_cache)
 
-    Parameters
-    ----------
-    data : xr.DataArray
-        Anomaly data with dimensions (time, lat, lon).
-    reference : xr.DataArray
-        Reference anomaly pattern with dimensions (lat, lon).
-    spatial_weights : xr.DataArray, optional
-        Accepted for a unified call signature but not used.
 
-    Returns
-    -------
-    xr.DataArray
-        W1 distance for each time step, dimension (time,).
-    """
-    data_np = np.nan_to_num(data.values, nan=0.0)   # (time, lat, lon)
-    ref_np  = np.nan_to_num(reference.values, nan=0.0)  # (lat, lon)
+def _event_spatial_weights(event: Dict[str, Any], data_var: xr.DataArray) -> xr.DataArray:
+    """Spatial weights (cos(lat) * optional Gaussian via great-circle distance)."""
+    gaussian_spec = event.get('gaussian_center', None)
+    sigma_km = 1000.0
+    if isinstance(gaussian_spec, dict) and 'sigma_km' in gaussian_spec:
+        try:
+            sigma_km = float(gaussian_spec['sigma_km'])
+        except (TypeError, ValueError):
+            sigma_km = 1000.0
+    return compute_spatial_weights(
+        lat=data_var.lat,
+        lon=data_var.lon,
+        gaussian_center_spec=gaussian_spec,
+        sigma_km=sigma_km
+    )
 
-    n_time   = data_np.shape[0]
-    n_spatial = ref_np.size
 
-    data_flat   = data_np.reshape(n_time, n_spatial)   # (time, n_spatial)
-    ref_sorted  = np.sort(ref_np.ravel())              # sort reference once
+def _distances_to_frame(distances: xr.DataArray) -> pd.DataFrame:
+    """Convert a (time,) distance array to the all_distances DataFrame layout."""
+    all_distances = pd.DataFrame({
+        'date': pd.to_datetime(distances.time.values),
+        'distance': distances.values
+    })
+    all_distances['year'] = all_distances['date'].dt.year
+    all_distances['month'] = all_distances['date'].dt.month
+    all_distances['day'] = all_distances['date'].dt.day
+    return all_distances
 
-    data_sorted = np.sort(data_flat, axis=1)           # (time, n_spatial)
-    distances   = np.mean(np.abs(data_sorted - ref_sorted[np.newaxis, :]), axis=1)
 
-    return xr.DataArray(distances, coords={'time': data.time}, dims=['time'])
+def _distances_meta(event: Dict[str, Any], dataset: str, analogue_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Settings that determine an all_distances table; stored next to it for --incremental."""
+    return {
+        'dataset': dataset,
+        'snapshot_date': str(pd.Timestamp(event['snapshot_date']).date()) if 'snapshot_date' in event else None,
+        'region': {k: float(v) for k, v in event['region'].items()},
+        'gaussian_center': event.get('gaussian_center'),
+        'match_variable': analogue_config.get('distance', {}).get('match_variable', 'psurf'),
+        'similarity_metric': analogue_config.get('similarity_metric', 'rmse').lower(),
+        'calendar_window_days': analogue_config.get('snapshot_calendar_window', 15),
+        'year_range': list(slice_year_range(analogue_config)),
+        'running_mean_days': running_mean_days(analogue_config),
+        'wasserstein': {k: v for k, v in (analogue_config.get('wasserstein', {}) or {}).items() if k != 'cache_sorted'},
+    }
 
 
-def select_time_separated_analogues(
-    df: pd.DataFrame,
-    n_analogues: int,
-    time_col: str = 'date',
-    distance_col: str = 'distance',
-    min_separation: pd.Timedelta = pd.Timedelta('5D')
-) -> pd.DataFrame:
-    """
-    Select top N analogues with minimum time separation.
-    
-    This ensures analogues are not clustered in time (e.g., consecutive days
-    from the same weather pattern).
-    
-    Parameters
-    ----------
-    df : pd.DataFrame
-        DataFrame with date and distance columns
-    n_analogues : int
-        Number of analogues to select
-    time_col : str
-        Name of the datetime column
-    distance_col : str
-        Name of the distance column
-    min_separation : pd.Timedelta
-        Minimum time separation between selected analogues
-        
-    Returns
-    -------
-    pd.DataFrame
-        Selected analogues with rank column
-    """
+def _table_metadata(event: Dict[str, Any], dataset: str, analogue_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Run metadata stored with Parquet output tables."""
+    gaussian_spec = event.get('gaussian_center')
+    sigma_km = None
+    if gaussian_spec:
+        sigma_km = float(gaussian_spec.get('sigma_km', 1000.0)) if isinstance(gaussian_spec, dict) else 1000.0
+    return {
+        **_distances_meta(event, dataset, analogue_config),
+        'event': event['name'],
+        'sigma_km': sigma_km,
+        'calendar_window_days': analogue_config.get('snapshot_calendar_window', 15),
+        'smoothing_days': analogue_config.get('smoothing', {}).get('window_days', 5),
+        'n_analogues': analogue_config.get('n_analogues', 15),
+        'epochs': {name: list(bounds) for name, bounds in epoch_definitions(analogue_config).items()},
+    }
+
+
+def _manifest_inputs(paths: Dict[str, Path], dataset: str, analogue_config: Dict[str, Any]) -> List[Path]:
+    """Anomaly files the tables derive from (slices and cube stores are built from them)."""
+    match_var = analogue_config.get('distance', {}).get('match_variable', 'psurf')
+    return anomaly_source_files(paths, dataset, match_var, *slice_year_range(analogue_config))
 
-    df_sorted = df.sort_values(distance_col).reset_index(drop=True)
-    
-    chosen_indices = []
-    chosen_dates = []
-    
-    for idx, row in df_sorted.iterrows():
-        candidate_date = row[time_col]
-        
-        # Check if this date is far enough from all chosen dates
-        is_separated = True
-        for chosen_date in chosen_dates:
-            if abs(candidate_date - chosen_date) < min_separation:
-                is_separated = False
-                break
-        
-        if is_separated:
-            chosen_indices.append(idx)
-            chosen_dates.append(candidate_date)
-            
-            if len(chosen_indices) >= n_analogues:
-                break
-    
-    # Create result DataFrame
-    result = df_sorted.loc[chosen_indices].copy()
-    result['rank'] = range(1, len(result) + 1)
-    
-    return result
+
+def _load_known_distances(
+    distances_file: Path,
+    event: Dict[str, Any],
+    dataset: str,
+    analogue_config: Dict[str, Any]
+) -> Optional[pd.DataFrame]:
+    """Previous all_distances table (CSV or Parquet) if computed with the current settings, else None."""
+    meta_file = distances_file.with_suffix('.json')
+    distances_file = find_table(distances_file)
+    if not distances_file.exists() or not meta_file.exists():
+        return None
+    with open(meta_file) as f:
+        if json.load(f) != json.loads(json.dumps(_distances_meta(event, dataset, analogue_config))):
+            return None
+    return read_table(distances_file)
 
 
 def find_analogues(
@@ -391,8 +433,10 @@ def find_analogues(
     paths: Dict[str, Path],
     analogue_config: Dict[str, Any],
     period: Optional[str] = None,
-    verbose: bool = True
-) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    verbose: bool = True,
+    known_distances: Optional[pd.DataFrame] = None,
+    cube: Optional[xr.DataArray] = None
+) -> Tuple[pd.DataFrame, Dict[str, pd.DataFrame]]:
     """
     Find analogue dates for a single event using snapshot_date as reference.
     
@@ -407,17 +451,24 @@ def find_analogues(
     analogue_config : dict
         Analogue search configuration
     period : str, optional
-        'past', 'present', or None (both). If specified, only loads/processes
-        that period to save time and memory.
+        Name of a single epoch (e.g. 'past'), or None (all epochs). If
+        specified, only loads/processes that epoch to save time and memory.
     verbose : bool
         Print progress messages
+    known_distances : pd.DataFrame, optional
+        all_distances table from a previous run with the same settings.  Only
+        days missing from it are computed; selection runs on the merged table.
+    cube : xr.DataArray, optional
+        Event cube already loaded and smoothed (see
+        find_analogues_smoothing_sweep); by default the cube is loaded and
+        smoothed with the config's smoothing.window_days.
         
     Returns
     -------
-    Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]
+    Tuple[pd.DataFrame, Dict[str, pd.DataFrame]]
         - all_distances: DataFrame with all dates and distances
-        - past_analogues: DataFrame with top N past analogues (empty if period='present')
-        - present_analogues: DataFrame with top N present analogues (empty if period='past')
+        - epoch_analogues: epoch name -> DataFrame with top N analogues in that
+          epoch (period column set to the epoch name)
     """
     event_name = event['name']
     region = event['region']
@@ -433,22 +484,14 @@ def find_analogues(
     match_var = analogue_config.get('distance', {}).get('match_variable', 'psurf')
     similarity_metric = analogue_config.get('similarity_metric', 'rmse').lower()
     
-    past_period = analogue_config.get('periods', {}).get('past', {})
-    present_period = analogue_config.get('periods', {}).get('present', {})
-    
-    past_start = past_period.get('start_year') # no default values -- better fail than silently assume
-    past_end = past_period.get('end_year')
-    present_start = present_period.get('start_year')
-    present_end = present_period.get('end_year')
+    # Epochs to select in, and the year range to load based on period filter
+    epochs, year_range = period_epochs(analogue_config, period)
     
     # #region agent log - H1: Verify period configuration loaded correctly
     debug_log("H1", "analogue_search.py:find_analogues", "Period config loaded", {
         "event_name": event_name,
         "match_var": match_var,
-        "past_start": past_start,
-        "past_end": past_end,
-        "present_start": present_start,
-        "present_end": present_end,
+        "epochs": {name: list(bounds) for name, bounds in epochs.items()},
         "snapshot_date": str(snapshot_date),
         "period_filter": period
     })
@@ -457,14 +500,7 @@ def find_analogues(
     # Time separation for analogue selection
     smoothing_days = analogue_config.get('smoothing', {}).get('window_days', 5)
     min_separation = pd.Timedelta(days=smoothing_days)
-    
-    # Determine year range to load based on period filter
-    if period == 'past':
-        year_range = (past_start, past_end)
-    elif period == 'present':
-        year_range = (present_start, present_end)
-    else:
-        year_range = None  # Load all years
+    mean_days = running_mean_days(analogue_config)
     
     if verbose:
         print(f"\n{'='*60}")
@@ -474,40 +510,23 @@ def find_analogues(
         print(f"Snapshot date: {snapshot_date.strftime('%Y-%m-%d')}")
         print(f"Match variable: {match_var}")
         print(f"Region: lat[{region['lat_min']}, {region['lat_max']}], lon[{region['lon_min']}, {region['lon_max']}]")
-        print(f"Past period: {past_start}-{past_end}")
-        print(f"Present period: {present_start}-{present_end}")
+        for name, (start, end) in epochs.items():
+            print(f"Period {name}: {start}-{end}")
         if period:
             print(f"Processing ONLY: {period} period")
         print(f"N analogues: {n_analogues}")
         print(f"Similarity metric: {similarity_metric}")
+        print(f"Running mean: {mean_days} day(s)")
         print(f"Min time separation: {min_separation}")
     
-    # Path to CDO pre-sliced file (same location as cdo_slice.py writes).
-    # CDO slicing is done by the shell script before calling this; we just use the result if it exists.
-    sliced_path = paths["data"] / "F02_analogue_search" / "sliced" / dataset / event_name / f"anomaly_{match_var}_sliced.nc"
-    sliced_exists = sliced_path.exists()
-    
-    if verbose:
-        if sliced_exists:
-            print(f"\nUsing CDO pre-sliced file: {sliced_path.relative_to(paths['data'])}")
-        else:
-            print(f"\nCDO sliced file not found ({sliced_path.name}), loading full anomaly files and slicing in Python.")
-
-    # Load anomaly data sliced to event region (from sliced file if present, else full F01 + slice)
-    if verbose:
-        print(f"\nLoading anomaly data...")
-        if year_range and not sliced_exists:
-            print(f"  Year range filter: {year_range[0]}-{year_range[1]}")
-    
-    data_var = load_anomaly_data(
-        dataset=dataset,
-        var=match_var,
-        paths=paths,
-        region=region,
-        year_range=year_range,
-        sliced_path=sliced_path if sliced_exists else None,
-        verbose=verbose
-    )
+    if cube is None:
+        data_var = _load_event_cube(event, dataset, paths, match_var, year_range, verbose=verbose)
+        if mean_days > 1:
+            if verbose:
+                print(f"\nApplying {mean_days}-day running mean...")
+            data_var = running_mean(data_var, mean_days, running_mean_cache_dir(paths, analogue_config))
+    else:
+        data_var = cube
     
     # #region agent log - H2: Verify data loaded and time range
     time_values = pd.to_datetime(data_var.time.values)
@@ -520,155 +539,297 @@ def find_analogues(
     # #endregion
     
     # Get reference pattern from snapshot date
-    # If snapshot year is not in loaded data (e.g., processing past but snapshot is in present),
-    # load the reference separately
-    snapshot_year = snapshot_date.year
-    
     if verbose:
         print(f"\nExtracting reference pattern for {snapshot_date.strftime('%Y-%m-%d')}...")
     
-    if year_range and not (year_range[0] <= snapshot_year <= year_range[1]):
-        # Snapshot is outside loaded year range - load it separately
-        if verbose:
-            print(f"  Snapshot year {snapshot_year} not in loaded range, loading separately...")
-        ref_data = load_anomaly_data(
-            dataset=dataset,
-            var=match_var,
-            paths=paths,
-            region=region,
-            year_range=(snapshot_year, snapshot_year),
-            verbose=False
-        )
-        reference = ref_data.sel(time=snapshot_date, method='nearest')
-        actual_snapshot = pd.Timestamp(reference.time.values)
-    else:
-        reference = data_var.sel(time=snapshot_date, method='nearest')
-        actual_snapshot = pd.Timestamp(reference.time.values)
+    reference, actual_snapshot = _extract_reference(
+        data_var, snapshot_date, event, dataset, paths, match_var, year_range, verbose=verbose,
+        mean_days=mean_days, running_mean_cache=running_mean_cache_dir(paths, analogue_config)
+    )
     
     if verbose:
         print(f"Actual snapshot date used: {actual_snapshot.strftime('%Y-%m-%d')}")
         print(f"Reference pattern shape: {reference.shape}")
 
-    # Compute spatial weights (cos(lat) * optional Gaussian via great-circle distance)
-    gaussian_spec = event.get('gaussian_center', None)
-    sigma_km = 1000.0
-    if isinstance(gaussian_spec, dict) and 'sigma_km' in gaussian_spec:
-        try:
-            sigma_km = float(gaussian_spec['sigma_km'])
-        except (TypeError, ValueError):
-            sigma_km = 1000.0
-    spatial_weights = compute_spatial_weights(
-        lat=data_var.lat,
-        lon=data_var.lon,
-        gaussian_center_spec=gaussian_spec,
-        sigma_km=sigma_km
-    )
+    spatial_weights = _event_spatial_weights(event, data_var)
 
-    # Compute distances to all time steps
-    if verbose:
-        print(f"\nComputing distances to all {len(data_var.time)} time steps...")
-        print(f"  (This may take a while for large datasets...)")
-        import sys
-        sys.stdout.flush()
-    
-    if similarity_metric == 'wasserstein':
-        distances = compute_wasserstein_distances(data_var, reference, spatial_weights)
+    # Incremental run: only days not in the previous table need distances.
+    # Caches are keyed by cube, so a one-off subset bypasses them.
+    compute_var = data_var
+    norms_dir = norm_cache_dir(paths, analogue_config)
+    wasserstein_options = _wasserstein_options(paths, analogue_config)
+    if known_distances is not None:
+        # Days no longer in the cube (shrunk window or epochs) must not be reselected
+        cube_dates = data_var.time.values.astype('datetime64[ns]')
+        known_dates = pd.to_datetime(known_distances['date']).values.astype('datetime64[ns]')
+        in_cube = np.isin(known_dates, cube_dates)
+        if not in_cube.all():
+            if verbose:
+                print(f"\nIncremental: dropping {int((~in_cube).sum())} known days outside the loaded data")
+            known_distances = known_distances[in_cube].reset_index(drop=True)
+            known_dates = known_dates[in_cube]
+        new_idx = np.flatnonzero(~np.isin(cube_dates, known_dates))
+        compute_var = data_var.isel(time=new_idx)
+        norms_dir = None
+        wasserstein_options['cache_dir'] = None
+        if verbose:
+            print(f"\nIncremental: {len(known_distances)} known days, {len(new_idx)} new")
+
+    if compute_var.sizes['time'] == 0:
+        all_distances = known_distances.copy()
     else:
-        if similarity_metric not in ('rmse', 'euclidean'):
-            print(f"[WARN] Unknown similarity_metric '{similarity_metric}'; falling back to 'rmse'.")
-        distances = compute_euclidean_distances(data_var, reference, spatial_weights)
+        # Compute distances to all (new) time steps
+        if verbose:
+            print(f"\nComputing distances to all {len(compute_var.time)} time steps...")
+            print(f"  (This may take a while for large datasets...)")
+            sys.stdout.flush()
+        
+        if similarity_metric == 'wasserstein':
+            # Sorted daily fields are cached per cube; a query is one reduction over them
+            distances = compute_wasserstein_distances_sorted(
+                compute_var,
+                reference.drop_vars('time', errors='ignore').expand_dims(ref=[0]),
+                **wasserstein_options
+            ).isel(ref=0, drop=True)
+        else:
+            if similarity_metric not in ('rmse', 'euclidean'):
+                print(f"[WARN] Unknown similarity_metric '{similarity_metric}'; falling back to 'rmse'.")
+            # Norm-expanded kernel; per-day weighted norms are cached per (cube, weights)
+            distances = compute_euclidean_distances_expanded(
+                compute_var, reference, spatial_weights, cache_dir=norms_dir
+            )
 
-    # Trigger computation (if using dask) with progress bar
-    if verbose:
-        print(f"  Triggering dask computation...")
-        sys.stdout.flush()
-        from dask.diagnostics import ProgressBar
-        with ProgressBar():
+        # Trigger computation (if using dask) with progress bar
+        if verbose:
+            print(f"  Triggering dask computation...")
+            sys.stdout.flush()
+            from dask.diagnostics import ProgressBar
+            with ProgressBar():
+                distances = distances.compute()
+        else:
             distances = distances.compute()
-    else:
-        distances = distances.compute()
-    
-    if verbose:
-        print(f"Distance computation complete.")
-    
-    # Convert to DataFrame
-    all_distances = pd.DataFrame({
-        'date': pd.to_datetime(distances.time.values),
-        'distance': distances.values
-    })
-    all_distances['year'] = all_distances['date'].dt.year
-    all_distances['month'] = all_distances['date'].dt.month
-    all_distances['day'] = all_distances['date'].dt.day
-    
-    # Define masks for past and present periods
-    past_mask = (all_distances['year'] >= past_start) & (all_distances['year'] <= past_end)
-    present_mask = (all_distances['year'] >= present_start) & (all_distances['year'] <= present_end)
+        
+        if verbose:
+            print(f"Distance computation complete.")
+        
+        # Convert to DataFrame
+        all_distances = _distances_to_frame(distances)
+        if known_distances is not None:
+            # Parsed CSV values round-trip to the kernel's dtype, matching a full run
+            known = known_distances[all_distances.columns].astype({'distance': all_distances['distance'].dtype})
+            all_distances = (
+                pd.concat([known, all_distances], ignore_index=True)
+                .sort_values('date', kind='stable')
+                .reset_index(drop=True)
+            )
     
-    # Exclude snapshot date from candidates (and nearby dates)
-    snapshot_exclusion = (
-        (all_distances['date'] >= actual_snapshot - min_separation) & 
-        (all_distances['date'] <= actual_snapshot + min_separation)
+    epoch_analogues, epoch_masks = select_period_analogues(
+        all_distances, actual_snapshot, analogue_config, epochs
     )
-    past_mask = past_mask & ~snapshot_exclusion
-    present_mask = present_mask & ~snapshot_exclusion
     
     if verbose:
-        print(f"\nPast candidates: {past_mask.sum()}")
-        print(f"Present candidates (excl. snapshot): {present_mask.sum()}")
-    
-    # Select top analogues from each period (skip if not processing that period)
-    if period != 'present':  # Process past if period is None or 'past'
-        past_candidates = all_distances[past_mask].copy()
-        past_df = select_time_separated_analogues(
-            past_candidates,
-            n_analogues=n_analogues,
-            time_col='date',
-            distance_col='distance',
-            min_separation=min_separation
-        )
-        past_df['period'] = 'past'
-    else:
-        past_df = pd.DataFrame(columns=['date', 'distance', 'year', 'month', 'day', 'rank', 'period'])
-    
-    if period != 'past':  # Process present if period is None or 'present'
-        present_candidates = all_distances[present_mask].copy()
-        present_df = select_time_separated_analogues(
-            present_candidates,
-            n_analogues=n_analogues,
-            time_col='date',
-            distance_col='distance',
-            min_separation=min_separation
-        )
-        present_df['period'] = 'present'
-    else:
-        present_df = pd.DataFrame(columns=['date', 'distance', 'year', 'month', 'day', 'rank', 'period'])
+        print()
+        for name, mask in epoch_masks.items():
+            print(f"{name} candidates (excl. snapshot): {int(mask.sum())}")
     
     # #region agent log - H3: Verify analogue selection results
     debug_log("H3", "analogue_search.py:find_analogues", "Analogues selected", {
         "event_name": event_name,
-        "past_candidates_count": int(past_mask.sum()),
-        "present_candidates_count": int(present_mask.sum()),
-        "past_analogues_found": len(past_df),
-        "present_analogues_found": len(present_df),
-        "top_past_date": str(past_df['date'].iloc[0]) if len(past_df) > 0 else None,
-        "top_present_date": str(present_df['date'].iloc[0]) if len(present_df) > 0 else None
+        "candidates_count": {name: int(mask.sum()) for name, mask in epoch_masks.items()},
+        "analogues_found": {name: len(df) for name, df in epoch_analogues.items()},
+        "top_dates": {
+            name: str(df['date'].iloc[0]) if len(df) > 0 else None
+            for name, df in epoch_analogues.items()
+        }
     })
     # #endregion
     
     if verbose:
-        print(f"\n--- Top {len(past_df)} Past Analogues ---")
-        if len(past_df) > 0:
-            print(past_df[['rank', 'date', 'distance']].to_string(index=False))
-        else:
-            print("  No past analogues found")
-        
-        print(f"\n--- Top {len(present_df)} Present Analogues ---")
-        if len(present_df) > 0:
-            print(present_df[['rank', 'date', 'distance']].to_string(index=False))
-        else:
-            print("  No present analogues found")
-    
-    return all_distances, past_df, present_df
+        for name, df in epoch_analogues.items():
+            print(f"\n--- Top {len(df)} {name} Analogues ---")
+            if len(df) > 0:
+                print(df[['rank', 'date', 'distance']].to_string(index=False))
+            else:
+                print(f"  No {name} analogues found")
+    
+    return all_distances, epoch_analogues
+
+
+def find_analogues_window(
+    event: Dict[str, Any],
+    dataset: str,
+    paths: Dict[str, Path],
+    analogue_config: Dict[str, Any],
+    period: Optional[str] = None,
+    verbose: bool = True
+) -> Dict[pd.Timestamp, Tuple[pd.DataFrame, Dict[str, pd.DataFrame]]]:
+    """
+    Find analogues for every day of the event window in one batched pass.
+
+    Every day between the event's start_date and end_date is used as a
+    reference pattern.  The cube is loaded once and all reference-vs-candidate
+    distances are computed in a single blocked pass, instead of one
+    find_analogues() run per day.
+
+    Parameters
+    ----------
+    event : dict
+        Event configuration with start_date and end_date
+    dataset : str
+        Dataset name: 'era5', 'mswx', or 'jra3q'
+    paths : dict
+        Data paths from get_data_paths()
+    analogue_config : dict
+        Analogue search configuration
+    period : str, optional
+        Name of a single epoch, or None (all epochs)
+    verbose : bool
+        Print progress messages
+
+    Returns
+    -------
+    dict
+        Maps each actual reference date to (all_distances, epoch_analogues),
+        with the same layout as find_analogues().
+    """
+    event_name = event['name']
+    for key in ('start_date', 'end_date'):
+        if key not in event:
+            raise ValueError(f"Event '{event_name}' missing required '{key}' field")
+
+    reference_dates = pd.date_range(pd.Timestamp(event['start_date']), pd.Timestamp(event['end_date']), freq='D')
+
+    match_var = analogue_config.get('distance', {}).get('match_variable', 'psurf')
+    similarity_metric = analogue_config.get('similarity_metric', 'rmse').lower()
+    epochs, year_range = period_epochs(analogue_config, period)
+
+    if verbose:
+        print(f"\n{'='*60}")
+        print(f"Batched Analogue Search: {event_name}")
+        print(f"{'='*60}")
+        print(f"Dataset: {dataset}")
+        print(f"Reference window: {reference_dates[0].strftime('%Y-%m-%d')} to "
+              f"{reference_dates[-1].strftime('%Y-%m-%d')} ({len(reference_dates)} days)")
+        print(f"Similarity metric: {similarity_metric}")
+
+    data_var = _load_event_cube(event, dataset, paths, match_var, year_range, verbose=verbose)
+    mean_days = running_mean_days(analogue_config)
+    running_mean_cache = running_mean_cache_dir(paths, analogue_config)
+    if mean_days > 1:
+        if verbose:
+            print(f"\nApplying {mean_days}-day running mean...")
+        data_var = running_mean(data_var, mean_days, running_mean_cache)
+
+    references = []
+    actual_dates = []
+    reference_years = {}  # years outside year_range, each loaded once
+    for ref_date in reference_dates:
+        source = data_var
+        if year_range and not (year_range[0] <= ref_date.year <= year_range[1]):
+            if ref_date.year not in reference_years:
+                if verbose:
+                    print(f"  Reference year {ref_date.year} not in loaded range, loading separately...")
+                reference_years[ref_date.year] = _load_reference_year(
+                    ref_date.year, event, dataset, paths, match_var, mean_days, running_mean_cache
+                )
+            source = reference_years[ref_date.year]
+        reference = source.sel(time=ref_date, method='nearest')
+        actual_date = pd.Timestamp(reference.time.values)
+        if actual_date.normalize() != ref_date.normalize():
+            print(f"[WARN] {ref_date.strftime('%Y-%m-%d')} not in loaded data; "
+                  f"nearest is {actual_date.strftime('%Y-%m-%d')}")
+        if actual_date in actual_dates:
+            continue
+        references.append(reference.drop_vars('time', errors='ignore').load())
+        actual_dates.append(actual_date)
+
+    references = xr.concat(references, dim='ref').assign_coords(ref=np.arange(len(actual_dates)))
+    spatial_weights = _event_spatial_weights(event, data_var)
+
+    if verbose:
+        print(f"\nComputing {len(actual_dates)} x {len(data_var.time)} distances in one pass...")
+        sys.stdout.flush()
+
+    if similarity_metric == 'wasserstein':
+        distances = compute_wasserstein_distances_sorted(
+            data_var, references, **_wasserstein_options(paths, analogue_config)
+        )
+    else:
+        if similarity_metric not in ('rmse', 'euclidean'):
+            print(f"[WARN] Unknown similarity_metric '{similarity_metric}'; falling back to 'rmse'.")
+        distances = compute_euclidean_distances_batch(
+            data_var, references, spatial_weights, cache_dir=norm_cache_dir(paths, analogue_config)
+        )
+
+    results = {}
+    for j, actual_date in enumerate(actual_dates):
+        all_distances = _distances_to_frame(distances.isel(ref=j))
+        epoch_analogues, _ = select_period_analogues(
+            all_distances, actual_date, analogue_config, epochs
+        )
+        results[actual_date] = (all_distances, epoch_analogues)
+        if verbose:
+            best = ', '.join(
+                f"best {name} {df['date'].iloc[0].strftime('%Y-%m-%d') if len(df) > 0 else '-'}"
+                for name, df in epoch_analogues.items()
+            )
+            print(f"  {actual_date.strftime('%Y-%m-%d')}: {best}")
+
+    return results
+
+
+def find_analogues_smoothing_sweep(
+    event: Dict[str, Any],
+    dataset: str,
+    paths: Dict[str, Path],
+    analogue_config: Dict[str, Any],
+    windows: List[int],
+    period: Optional[str] = None,
+    verbose: bool = True
+) -> Dict[int, Tuple[pd.DataFrame, Dict[str, pd.DataFrame]]]:
+    """
+    Find analogues for several running-mean windows from one cube load.
+
+    The cube is loaded once and every window's smoothed cube is written
+    to the running-mean cache from a single cumulative-sum pass
+    (distance_engine.running_means).  Windows are then searched one at a
+    time, each with find_analogues() on its memory-mapped cube and
+    smoothing.window_days (and so the minimum time separation) set to that
+    window, so at most one smoothed cube is held at a time.  With
+    smoothing.cache_smoothed: false each window is smoothed in memory
+    right before its search instead.
+
+    Returns
+    -------
+    dict
+        Maps each window (days) to (all_distances, epoch_analogues), with the
+        same layout as find_analogues().
+    """
+    match_var = analogue_config.get('distance', {}).get('match_variable', 'psurf')
+    _, year_range = period_epochs(analogue_config, period)
+
+    if verbose:
+        print(f"\nSmoothing sweep: {event['name']} ({', '.join(f'{n}d' for n in windows)})")
+
+    data_var = _load_event_cube(event, dataset, paths, match_var, year_range, verbose=verbose)
+    cache_dir = running_mean_cache_dir(paths, analogue_config)
+    if cache_dir is not None:
+        running_means(data_var, windows, cache_dir)
+
+    results = {}
+    for n in windows:
+        cube = running_mean(data_var, n, cache_dir)
+        results[n] = find_analogues(
+            event=event,
+            dataset=dataset,
+            paths=paths,
+            analogue_config=_with_smoothing(analogue_config, n),
+            period=period,
+            verbose=verbose,
+            cube=cube
+        )
+        del cube
+    return results
 
 
 def process_event(
@@ -678,7 +839,9 @@ def process_event(
     analogue_config: Dict[str, Any],
     period: Optional[str] = None,
     skip_existing: bool = True,
-    verbose: bool = True
+    verbose: bool = True,
+    incremental: bool = False,
+    output_format: str = 'csv'
 ) -> bool:
     """
     Process analogue search for a single event and save results.
@@ -694,11 +857,16 @@ def process_event(
     analogue_config : dict
         Analogue configuration
     period : str, optional
-        'past', 'present', or None (both)
+        Name of a single epoch (e.g. 'past'), or None (all epochs)
     skip_existing : bool
         Skip if output exists
     verbose : bool
         Print progress
+    incremental : bool
+        Reuse the existing all_distances table (if computed with the same
+        settings): compute distances for new days only, then reselect
+    output_format : str
+        'csv' or 'parquet' (typed columns plus run metadata; needs pyarrow)
         
     Returns
     -------
@@ -712,44 +880,66 @@ def process_event(
     
     # Output files - add period suffix if processing single period
     suffix = f"_{period}" if period else ""
-    distances_file = output_dir / f'all_distances{suffix}.csv'
-    past_file = output_dir / f'past_analogues{suffix}.csv'
-    present_file = output_dir / f'present_analogues{suffix}.csv'
-    combined_file = output_dir / f'analogues{suffix}.csv'
-    
-    # Check if can skip
-    if skip_existing and combined_file.exists():
-        if verbose:
-            print(f"[{event_name}] Output exists, skipping: {combined_file}")
-        return True
-    
+    ext = table_suffix(output_format)
+    distances_file = output_dir / f'all_distances{suffix}{ext}'
+    combined_file = output_dir / f'analogues{suffix}{ext}'
+    
+    # Check if can skip: the manifest records the output as up to date
+    manifest = manifest_path(paths['data'])
+    inputs = _manifest_inputs(paths, dataset, analogue_config)
+    run_config = {'stage': 'analogue_search', 'period': period,
+                  **_table_metadata(event, dataset, analogue_config)}
+    if not incremental:
+        build, status = needs_build(manifest, combined_file, 'analogue_search', inputs, run_config,
+                                    force=not skip_existing)
+        if not build:
+            if verbose:
+                print(f"[{event_name}] Output {status}, skipping: {combined_file}")
+            return True
+        if verbose and status.startswith('stale'):
+            print(f"[{event_name}] Output {status}, recomputing: {combined_file}")
+    
+    start = time.perf_counter()
     try:
+        known_distances = None
+        if incremental:
+            known_distances = _load_known_distances(distances_file, event, dataset, analogue_config)
+            if known_distances is None and verbose:
+                print(f"[{event_name}] No reusable {distances_file.name} (missing or different settings); "
+                      f"computing all days")
+        
         # Find analogues
-        all_distances, past_df, present_df = find_analogues(
+        all_distances, epoch_analogues = find_analogues(
             event=event,
             dataset=dataset,
             paths=paths,
             analogue_config=analogue_config,
             period=period,
-            verbose=verbose
+            verbose=verbose,
+            known_distances=known_distances
         )
         
-        # Save results
-        all_distances.to_csv(distances_file, index=False)
-        if not past_df.empty or period != 'present':
-            past_df.to_csv(past_file, index=False)
-        if not present_df.empty or period != 'past':
-            present_df.to_csv(present_file, index=False)
+        # Save results: one <epoch>_analogues file per epoch
+        metadata = _table_metadata(event, dataset, analogue_config)
+        write_table(all_distances, distances_file, metadata)
+        with open(distances_file.with_suffix('.json'), 'w') as f:
+            json.dump(_distances_meta(event, dataset, analogue_config), f, indent=1)
+        epoch_files = {}
+        for name, df in epoch_analogues.items():
+            epoch_files[name] = output_dir / f'{name}_analogues{suffix}{ext}'
+            write_table(df, epoch_files[name], {**metadata, 'epoch': name})
         
         # Combined analogues file
-        combined = pd.concat([past_df, present_df], ignore_index=True)
-        combined.to_csv(combined_file, index=False)
+        combined = pd.concat(list(epoch_analogues.values()), ignore_index=True)
+        write_table(combined, combined_file, metadata)
+        record(manifest, combined_file, 'analogue_search', inputs, run_config,
+               time.perf_counter() - start)
         
         if verbose:
             print(f"\n[{event_name}] Results saved to:")
             print(f"  - All distances: {distances_file}")
-            print(f"  - Past analogues: {past_file}")
-            print(f"  - Present analogues: {present_file}")
+            for name, epoch_file in epoch_files.items():
+                print(f"  - {name} analogues: {epoch_file}")
             print(f"  - Combined: {combined_file}")
         
         return True
@@ -761,11 +951,187 @@ def process_event(
         return False
 
 
+def process_event_window(
+    event: Dict[str, Any],
+    dataset: str,
+    paths: Dict[str, Path],
+    analogue_config: Dict[str, Any],
+    period: Optional[str] = None,
+    skip_existing: bool = True,
+    verbose: bool = True,
+    output_format: str = 'csv'
+) -> bool:
+    """
+    Batched analogue search over the event window; save per-reference tables.
+
+    Writes, under <output_dir>/window/ (.csv or .parquet per output_format):
+      - all_distances_<YYYYMMDD> and analogues_<YYYYMMDD> per reference day
+      - window_analogues with all reference days (extra column reference_date)
+    
+    Returns
+    -------
+    bool
+        True if successful
+    """
+    event_name = event['name']
+    
+    output_dir = ensure_dir(paths['analogue'] / dataset / event_name / 'window')
+    suffix = f"_{period}" if period else ""
+    ext = table_suffix(output_format)
+    window_file = output_dir / f'window_analogues{suffix}{ext}'
+    
+    manifest = manifest_path(paths['data'])
+    inputs = _manifest_inputs(paths, dataset, analogue_config)
+    run_config = {'stage': 'analogue_window', 'period': period, 'event': event,
+                  **_table_metadata(event, dataset, analogue_config)}
+    build, status = needs_build(manifest, window_file, 'analogue_window', inputs, run_config,
+                                force=not skip_existing)
+    if not build:
+        if verbose:
+            print(f"[{event_name}] Output {status}, skipping: {window_file}")
+        return True
+    if verbose and status.startswith('stale'):
+        print(f"[{event_name}] Output {status}, recomputing: {window_file}")
+    
+    start = time.perf_counter()
+    try:
+        results = find_analogues_window(
+            event=event,
+            dataset=dataset,
+            paths=paths,
+            analogue_config=analogue_config,
+            period=period,
+            verbose=verbose
+        )
+        
+        metadata = _table_metadata(event, dataset, analogue_config)
+        combined_all = []
+        for ref_date, (all_distances, epoch_analogues) in results.items():
+            tag = ref_date.strftime('%Y%m%d')
+            ref_metadata = {**metadata, 'reference_date': ref_date.strftime('%Y-%m-%d')}
+            write_table(all_distances, output_dir / f'all_distances_{tag}{suffix}{ext}', ref_metadata)
+            combined = pd.concat(list(epoch_analogues.values()), ignore_index=True)
+            write_table(combined, output_dir / f'analogues_{tag}{suffix}{ext}', ref_metadata)
+            combined.insert(0, 'reference_date', ref_date.strftime('%Y-%m-%d'))
+            combined_all.append(combined)
+        
+        write_table(pd.concat(combined_all, ignore_index=True), window_file, metadata)
+        record(manifest, window_file, 'analogue_window', inputs, run_config,
+               time.perf_counter() - start)
+        
+        if verbose:
+            print(f"\n[{event_name}] {len(results)} per-reference tables saved to: {output_dir}")
+            print(f"  - Combined: {window_file}")
+        
+        return True
+        
+    except Exception as e:
+        print(f"[{event_name}] ERROR: {e}", file=sys.stderr)
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def process_event_smoothing_sweep(
+    event: Dict[str, Any],
+    dataset: str,
+    paths: Dict[str, Path],
+    analogue_config: Dict[str, Any],
+    windows: List[int],
+    period: Optional[str] = None,
+    skip_existing: bool = True,
+    verbose: bool = True,
+    output_format: str = 'csv'
+) -> bool:
+    """
+    Run a smoothing sweep for one event and save per-window tables.
+
+    Writes, per window N (.csv or .parquet per output_format):
+      - all_distances_smooth<N>d, <epoch>_analogues_smooth<N>d and
+        analogues_smooth<N>d
+    
+    Returns
+    -------
+    bool
+        True if successful
+    """
+    event_name = event['name']
+    output_dir = ensure_dir(paths['analogue'] / dataset / event_name)
+    suffix = f"_{period}" if period else ""
+    ext = table_suffix(output_format)
+    
+    def _combined_file(n: int) -> Path:
+        return output_dir / f'analogues_smooth{n}d{suffix}{ext}'
+    
+    def _window_config(n: int) -> Dict[str, Any]:
+        return {'stage': 'analogue_smoothing', 'period': period,
+                **_table_metadata(event, dataset, _with_smoothing(analogue_config, n))}
+    
+    # Check which windows can be skipped: the manifest records them as up to date
+    manifest = manifest_path(paths['data'])
+    inputs = _manifest_inputs(paths, dataset, analogue_config)
+    todo = []
+    for n in windows:
+        build, status = needs_build(manifest, _combined_file(n), 'analogue_smoothing', inputs, _window_config(n),
+                                    force=not skip_existing)
+        if build:
+            todo.append(n)
+            if verbose and status.startswith('stale'):
+                print(f"[{event_name}] Output {status}, recomputing: {_combined_file(n)}")
+        elif verbose:
+            print(f"[{event_name}] Output {status}, skipping: {_combined_file(n)}")
+    if not todo:
+        return True
+    
+    start = time.perf_counter()
+    try:
+        results = find_analogues_smoothing_sweep(
+            event=event,
+            dataset=dataset,
+            paths=paths,
+            analogue_config=analogue_config,
+            windows=todo,
+            period=period,
+            verbose=verbose
+        )
+        
+        for n, (all_distances, epoch_analogues) in results.items():
+            smooth_suffix = f"_smooth{n}d"
+            metadata = _table_metadata(event, dataset, _with_smoothing(analogue_config, n))
+            write_table(all_distances, output_dir / f'all_distances{smooth_suffix}{suffix}{ext}', metadata)
+            for name, df in epoch_analogues.items():
+                write_table(df, output_dir / f'{name}_analogues{smooth_suffix}{suffix}{ext}', {**metadata, 'epoch': name})
+            combined = pd.concat(list(epoch_analogues.values()), ignore_index=True)
+            write_table(combined, _combined_file(n), metadata)
+        # One cube load and one cumulative sum serve every window: record the sweep time per table
+        seconds = time.perf_counter() - start
+        for n in results:
+            record(manifest, _combined_file(n), 'analogue_smoothing', inputs, _window_config(n), seconds)
+        
+        if verbose:
+            print(f"\n[{event_name}] Smoothing sweep results saved to: {output_dir}")
+            for n in results:
+                print(f"  - {_combined_file(n).name}")
+        
+        return True
+        
+    except Exception as e:
+        print(f"[{event_name}] ERROR: {e}", file=sys.stderr)
+        import traceback
+        traceback.print_exc()
+        return False
+
+
 def process_all_events(
     dataset: str,
     period: Optional[str] = None,
     skip_existing: bool = True,
-    verbose: bool = True
+    verbose: bool = True,
+    window: bool = False,
+    incremental: bool = False,
+    output_format: str = 'csv',
+    smoothing_days: Optional[int] = None,
+    smoothing_sweep: Optional[List[int]] = None
 ) -> bool:
     """
     Process analogue search for all events.
@@ -775,11 +1141,21 @@ def process_all_events(
     dataset : str
         Dataset name: 'era5', 'mswx', or 'jra3q'
     period : str, optional
-        'past', 'present', or None (both)
+        Name of a single epoch (e.g. 'past'), or None (all epochs)
     skip_existing : bool
         Skip if output exists
     verbose : bool
         Print progress
+    window : bool
+        Use every day of the event window as reference (batched mode)
+    incremental : bool
+        Compute distances for new days only (snapshot mode; see process_event)
+    output_format : str
+        'csv' or 'parquet'
+    smoothing_days : int, optional
+        Override smoothing.window_days
+    smoothing_sweep : list of int, optional
+        Running-mean windows to sweep in one pass (snapshot mode)
         
     Returns
     -------
@@ -790,6 +1166,8 @@ def process_all_events(
     env = load_env_setting()
     paths = get_data_paths(env)
     analogue_config = load_analogue_config()
+    if smoothing_days is not None:
+        analogue_config = _with_smoothing(analogue_config, smoothing_days)
     events_config = load_events_config()
     
     events = events_config.get('events', [])
@@ -798,11 +1176,13 @@ def process_all_events(
         print("No events defined in extreme_events.yaml")
         return False
     
-    # Filter events that have snapshot_date defined
-    valid_events = [e for e in events if 'snapshot_date' in e]
+    # Filter events that have the reference date(s) defined: the event
+    # window for --window, snapshot_date otherwise
+    required = ('start_date', 'end_date') if window else ('snapshot_date',)
+    valid_events = [e for e in events if all(key in e for key in required)]
     
     if not valid_events:
-        print("No events with 'snapshot_date' defined in extreme_events.yaml")
+        print(f"No events with {' and '.join(repr(k) for k in required)} defined in extreme_events.yaml")
         return False
     
     print(f"\nDataset: {dataset}")
@@ -812,15 +1192,41 @@ def process_all_events(
     
     all_success = True
     for event in valid_events:
-        success = process_event(
-            event=event,
-            dataset=dataset,
-            paths=paths,
-            analogue_config=analogue_config,
-            period=period,
-            skip_existing=skip_existing,
-            verbose=verbose
-        )
+        if smoothing_sweep:
+            success = process_event_smoothing_sweep(
+                event=event,
+                dataset=dataset,
+                paths=paths,
+                analogue_config=analogue_config,
+                windows=smoothing_sweep,
+                period=period,
+                skip_existing=skip_existing,
+                verbose=verbose,
+                output_format=output_format
+            )
+        elif window:
+            success = process_event_window(
+                event=event,
+                dataset=dataset,
+                paths=paths,
+                analogue_config=analogue_config,
+                period=period,
+                skip_existing=skip_existing,
+                verbose=verbose,
+                output_format=output_format
+            )
+        else:
+            success = process_event(
+                event=event,
+                dataset=dataset,
+                paths=paths,
+                analogue_config=analogue_config,
+                period=period,
+                skip_existing=skip_existing,
+                verbose=verbose,
+                incremental=incremental,
+                output_format=output_format
+            )
         if not success:
             all_success = False
     
@@ -842,7 +1248,7 @@ def main():
     parser.add_argument(
         '--all',
         action='store_true',
-        help='Process all events with snapshot_date defined'
+        help='Process all events with snapshot_date (start_date/end_date with --window) defined'
     )
     parser.add_argument(
         '--event',
@@ -853,21 +1259,62 @@ def main():
     parser.add_argument(
         '--period',
         type=str,
-        choices=['past', 'present'],
         default=None,
-        help='Process only this period (past or present) to save time. If not specified, processes both.'
+        help='Process only this period (any epoch name from the config, e.g. past) to save time. '
+             'If not specified, processes all epochs.'
+    )
+    parser.add_argument(
+        '--window',
+        action='store_true',
+        help='Batched mode: use every day from start_date to end_date as reference, in one pass'
     )
     parser.add_argument(
         '--force',
         action='store_true',
         help='Force recomputation even if output exists'
     )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Reuse the existing all_distances table: compute distances for new days only, then reselect'
+    )
+    parser.add_argument(
+        '--output_format',
+        choices=TABLE_FORMATS,
+        default='csv',
+        help='Table format for all_distances/analogues outputs (parquet needs pyarrow)'
+    )
+    parser.add_argument(
+        '--smoothing_days',
+        type=int,
+        default=None,
+        help='Override smoothing.window_days (running mean applied to the loaded cube; 1 = none)'
+    )
+    parser.add_argument(
+        '--smoothing_sweep',
+        type=str,
+        default=None,
+        help='Comma-separated running-mean windows computed from one cube load, e.g. 1,3,5,7 '
+             '(writes analogues_smooth<N>d for each)'
+    )
     parser.add_argument(
         '--quiet',
         action='store_true',
         help='Suppress verbose output'
     )
     args = parser.parse_args()
+    if args.incremental and args.window:
+        parser.error('--incremental is not supported with --window')
+    windows = None
+    if args.smoothing_sweep:
+        try:
+            windows = sorted({int(v) for v in args.smoothing_sweep.split(',') if v.strip()})
+        except ValueError:
+            parser.error(f'invalid --smoothing_sweep value: {args.smoothing_sweep}')
+        if not windows or windows[0] < 1:
+            parser.error('--smoothing_sweep needs window lengths >= 1')
+        if args.window or args.incremental:
+            parser.error('--smoothing_sweep is not supported with --window or --incremental')
     
     skip_existing = not args.force
     verbose = not args.quiet
@@ -878,6 +1325,10 @@ def main():
     print(f"Dataset: {args.dataset}")
     if args.period:
         print(f"Period: {args.period} only")
+    if windows:
+        print(f"Smoothing sweep: {', '.join(f'{n}d' for n in windows)}")
+    elif args.smoothing_days is not None:
+        print(f"Smoothing override: {args.smoothing_days} day(s)")
     
     if args.all or args.event:
         if args.event:
@@ -885,6 +1336,8 @@ def main():
             env = load_env_setting()
             paths = get_data_paths(env)
             analogue_config = load_analogue_config()
+            if args.smoothing_days is not None:
+                analogue_config = _with_smoothing(analogue_config, args.smoothing_days)
             events_config = load_events_config()
             
             # Find the event
@@ -898,26 +1351,59 @@ def main():
                 print(f"Event not found: {args.event}")
                 sys.exit(1)
             
-            if 'snapshot_date' not in event:
-                print(f"Event '{args.event}' is missing required 'snapshot_date' field")
+            required = ('start_date', 'end_date') if args.window else ('snapshot_date',)
+            missing = [key for key in required if key not in event]
+            if missing:
+                print(f"Event '{args.event}' is missing required '{missing[0]}' field")
                 sys.exit(1)
             
-            success = process_event(
-                event=event,
-                dataset=args.dataset,
-                paths=paths,
-                analogue_config=analogue_config,
-                period=args.period,
-                skip_existing=skip_existing,
-                verbose=verbose
-            )
+            if windows:
+                success = process_event_smoothing_sweep(
+                    event=event,
+                    dataset=args.dataset,
+                    paths=paths,
+                    analogue_config=analogue_config,
+                    windows=windows,
+                    period=args.period,
+                    skip_existing=skip_existing,
+                    verbose=verbose,
+                    output_format=args.output_format
+                )
+            elif args.window:
+                success = process_event_window(
+                    event=event,
+                    dataset=args.dataset,
+                    paths=paths,
+                    analogue_config=analogue_config,
+                    period=args.period,
+                    skip_existing=skip_existing,
+                    verbose=verbose,
+                    output_format=args.output_format
+                )
+            else:
+                success = process_event(
+                    event=event,
+                    dataset=args.dataset,
+                    paths=paths,
+                    analogue_config=analogue_config,
+                    period=args.period,
+                    skip_existing=skip_existing,
+                    verbose=verbose,
+                    incremental=args.incremental,
+                    output_format=args.output_format
+                )
         else:
             # Process all events
             success = process_all_events(
                 dataset=args.dataset,
                 period=args.period,
                 skip_existing=skip_existing,
-                verbose=verbose
+                verbose=verbose,
+                window=args.window,
+                incremental=args.incremental,
+                output_format=args.output_format,
+                smoothing_days=args.smoothing_days,
+                smoothing_sweep=windows
             )
         
         sys.exit(0 if success else 1)
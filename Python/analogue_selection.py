@@ -0,0 +1,402 @@
+"""
+Time-separated analogue selection.
+
+Shared selector used by analogue_search.py, analogue_weights.py and
+select_analogues_from_distances.py.
+
+Candidates are walked in order of increasing distance; a candidate is kept
+if no already-chosen analogue lies within min_separation of it.  Instead of
+comparing every candidate against every chosen date, dates are mapped to
+integer day ordinals and the days blocked by chosen analogues are marked in
+a bitmap, so each candidate is accepted or rejected in O(1).
+
+The same sorted order is shared by any number of groups (periods, epochs,
+bootstrap resamples), each with its own bitmap, so selecting for many groups
+costs one sort.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+NS_PER_DAY = 86_400 * 10**9
+
+
+def day_ordinals(dates) -> Tuple[np.ndarray, bool]:
+    """
+    Convert dates to integer day ordinals.
+
+    Parameters
+    ----------
+    dates : array-like of datetime
+        Candidate dates
+
+    Returns
+    -------
+    Tuple[np.ndarray, bool]
+        Day ordinals (days since 1970-01-01) and whether all dates share the
+        same time of day.  Only in that case are day differences exact.
+    """
+    ns = pd.to_datetime(np.asarray(dates)).values.astype('datetime64[ns]').astype(np.int64)
+    ordinals = np.floor_divide(ns, NS_PER_DAY)
+    time_of_day = ns - ordinals * NS_PER_DAY
+    aligned = time_of_day.size == 0 or bool(np.all(time_of_day == time_of_day[0]))
+    return ordinals, aligned
+
+
+def separation_radius(min_separation: pd.Timedelta) -> int:
+    """
+    Number of days on each side of a chosen analogue that are blocked.
+
+    A candidate is rejected if |candidate - chosen| < min_separation, i.e. if
+    it lies within ceil(min_separation / 1 day) - 1 whole days.
+    """
+    sep_ns = pd.Timedelta(min_separation).value
+    return max(int(-(-sep_ns // NS_PER_DAY)) - 1, -1)
+
+
+def _select_in_order(
+    order: np.ndarray,
+    ordinals: np.ndarray,
+    n_select: int,
+    radius: int,
+    origin: int,
+    span: int,
+) -> np.ndarray:
+    """Greedy bitmap selection over candidate positions given in distance order."""
+    chosen = []
+    if n_select <= 0 or order.size == 0:
+        return np.asarray(chosen, dtype=np.int64)
+    if radius < 0:
+        return order[:n_select].astype(np.int64)
+
+    blocked = bytearray(span)
+    days = (ordinals[order] - origin).tolist()
+    for pos, day in zip(order.tolist(), days):
+        if blocked[day]:
+            continue
+        chosen.append(pos)
+        if len(chosen) >= n_select:
+            break
+        lo = day - radius
+        hi = day + radius + 1
+        blocked[lo:hi] = b'\x01' * (hi - lo)
+    return np.asarray(chosen, dtype=np.int64)
+
+
+def _select_in_order_exact(
+    order: np.ndarray,
+    ns: np.ndarray,
+    n_select: int,
+    sep_ns: int,
+) -> np.ndarray:
+    """Fallback for dates with mixed times of day: compare nanosecond offsets."""
+    chosen = []
+    chosen_ns = np.empty(max(n_select, 0), dtype=np.int64)
+    for pos in order.tolist():
+        if len(chosen) >= n_select:
+            break
+        t = ns[pos]
+        if np.any(np.abs(chosen_ns[:len(chosen)] - t) < sep_ns):
+            continue
+        chosen_ns[len(chosen)] = t
+        chosen.append(pos)
+    return np.asarray(chosen, dtype=np.int64)
+
+
+def select_separated_indices(
+    dates,
+    distances: np.ndarray,
+    n_select: int,
+    min_separation: pd.Timedelta = pd.Timedelta('5D'),
+    groups: Optional[np.ndarray] = None,
+) -> List[np.ndarray]:
+    """
+    Select the n_select closest, mutually time-separated candidates per group.
+
+    Parameters
+    ----------
+    dates : array-like of datetime
+        Candidate dates, shape (n,)
+    distances : np.ndarray
+        Candidate distances, shape (n,); NaNs sort last
+    n_select : int
+        Number of analogues to select per group
+    min_separation : pd.Timedelta
+        Minimum time separation between selected analogues
+    groups : np.ndarray, optional
+        Boolean membership matrix (n_groups, n).  Groups may overlap.  If
+        None, all candidates form a single group.
+
+    Returns
+    -------
+    List[np.ndarray]
+        Per group, positions into the input arrays in rank order
+    """
+    distances = np.asarray(distances)
+    n = distances.shape[0]
+    if groups is None:
+        groups = np.ones((1, n), dtype=bool)
+    groups = np.asarray(groups, dtype=bool)
+    if n == 0:
+        # No candidates: reshape(-1, 0) cannot infer the group count
+        n_groups = groups.shape[0] if groups.ndim == 2 else 1
+        return [np.empty(0, dtype=np.int64) for _ in range(n_groups)]
+    groups = groups.reshape(-1, n)
+
+    # Stable, so ties keep their input order
+    order = np.argsort(distances, kind='stable')
+
+    ordinals, aligned = day_ordinals(dates)
+    results = []
+    if aligned:
+        radius = separation_radius(min_separation)
+        pad = max(radius, 0)
+        origin = int(ordinals.min()) - pad if n else 0
+        span = (int(ordinals.max()) - origin + pad + 1) if n else 0
+        for member in groups:
+            results.append(_select_in_order(order[member[order]], ordinals, n_select, radius, origin, span))
+    else:
+        ns = pd.to_datetime(np.asarray(dates)).values.astype('datetime64[ns]').astype(np.int64)
+        sep_ns = pd.Timedelta(min_separation).value
+        for member in groups:
+            results.append(_select_in_order_exact(order[member[order]], ns, n_select, sep_ns))
+    return results
+
+
+def select_time_separated_analogues(
+    df: pd.DataFrame,
+    n_analogues: int,
+    time_col: str = 'date',
+    distance_col: str = 'distance',
+    min_separation: pd.Timedelta = pd.Timedelta('5D')
+) -> pd.DataFrame:
+    """
+    Select top N analogues with minimum time separation.
+
+    This ensures analogues are not clustered in time (e.g., consecutive days
+    from the same weather pattern).
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        DataFrame with date and distance columns
+    n_analogues : int
+        Number of analogues to select
+    time_col : str
+        Name of the datetime column
+    distance_col : str
+        Name of the distance column
+    min_separation : pd.Timedelta
+        Minimum time separation between selected analogues
+
+    Returns
+    -------
+    pd.DataFrame
+        Selected analogues with rank column
+    """
+    df_sorted = df.sort_values(distance_col, kind='stable').reset_index(drop=True)
+    (positions,) = select_separated_indices(
+        df_sorted[time_col].values,
+        df_sorted[distance_col].values,
+        n_select=n_analogues,
+        min_separation=min_separation,
+    )
+    result = df_sorted.iloc[positions].copy()
+    result['rank'] = range(1, len(result) + 1)
+    return result
+
+
+def select_time_separated_groups(
+    df: pd.DataFrame,
+    masks: Dict[str, np.ndarray],
+    n_analogues: int,
+    time_col: str = 'date',
+    distance_col: str = 'distance',
+    min_separation: pd.Timedelta = pd.Timedelta('5D')
+) -> Dict[str, pd.DataFrame]:
+    """
+    Select top N time-separated analogues for several candidate groups at once.
+
+    Equivalent to calling select_time_separated_analogues(df[mask], ...) for
+    each mask, but the distances are sorted only once.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        DataFrame with date and distance columns
+    masks : dict
+        Group name -> boolean mask over the rows of df
+    n_analogues : int
+        Number of analogues to select per group
+    time_col : str
+        Name of the datetime column
+    distance_col : str
+        Name of the distance column
+    min_separation : pd.Timedelta
+        Minimum time separation between selected analogues
+
+    Returns
+    -------
+    Dict[str, pd.DataFrame]
+        Group name -> selected analogues with rank column
+    """
+    names = list(masks)
+    groups = np.vstack([np.asarray(masks[name], dtype=bool) for name in names]) if names else None
+    if groups is None:
+        return {}
+    positions = select_separated_indices(
+        df[time_col].values,
+        df[distance_col].values,
+        n_select=n_analogues,
+        min_separation=min_separation,
+        groups=groups,
+    )
+    results = {}
+    for name, pos in zip(names, positions):
+        result = df.iloc[pos].reset_index(drop=True)
+        result['rank'] = range(1, len(result) + 1)
+        results[name] = result
+    return results
+
+
+def sliding_epochs(
+    start_year: int,
+    end_year: int,
+    length_years: int,
+    step_years: int = 1
+) -> Dict[str, Tuple[int, int]]:
+    """
+    Generate sliding year windows, named '<start>-<end>'.
+
+    Only windows that fit entirely inside [start_year, end_year] are returned.
+    """
+    if length_years < 1 or step_years < 1:
+        raise ValueError("length_years and step_years must be >= 1")
+    epochs = {}
+    for s in range(int(start_year), int(end_year) - int(length_years) + 2, int(step_years)):
+        e = s + int(length_years) - 1
+        epochs[f"{s}-{e}"] = (s, e)
+    return epochs
+
+
+def epoch_definitions(analogue_config: Dict) -> Dict[str, Tuple[int, int]]:
+    """
+    Named epochs (start_year, end_year) from the analogue config.
+
+    Every entry under `periods` is an epoch (past/present by default, but any
+    number of names is allowed).  If `period_windows.length_years` is set,
+    sliding windows over [start_year, end_year] are appended.
+    """
+    epochs = {}
+    for name, bounds in (analogue_config.get('periods') or {}).items():
+        # no default values -- better fail than silently assume
+        epochs[str(name)] = (int(bounds['start_year']), int(bounds['end_year']))
+
+    windows = analogue_config.get('period_windows') or {}
+    if windows.get('length_years'):
+        all_years = [y for bounds in epochs.values() for y in bounds]
+        start = windows.get('start_year', min(all_years) if all_years else None)
+        end = windows.get('end_year', max(all_years) if all_years else None)
+        if start is None or end is None:
+            raise ValueError("period_windows needs start_year/end_year when no periods are defined")
+        epochs.update(sliding_epochs(start, end, windows['length_years'], windows.get('step_years', 1)))
+    return epochs
+
+
+def select_epoch_analogues(
+    all_distances: pd.DataFrame,
+    epochs: Dict[str, Tuple[int, int]],
+    n_analogues: int,
+    min_separation: pd.Timedelta = pd.Timedelta('5D'),
+    exclude_around: Optional[pd.Timestamp] = None,
+    time_col: str = 'date',
+    distance_col: str = 'distance'
+) -> Tuple[Dict[str, pd.DataFrame], Dict[str, np.ndarray]]:
+    """
+    Select top N time-separated analogues in every epoch from one distance table.
+
+    Parameters
+    ----------
+    all_distances : pd.DataFrame
+        Distances for all candidate dates
+    epochs : dict
+        Epoch name -> (start_year, end_year), inclusive
+    n_analogues : int
+        Number of analogues per epoch
+    min_separation : pd.Timedelta
+        Minimum time separation between selected analogues
+    exclude_around : pd.Timestamp, optional
+        Reference date; candidates within min_separation of it are excluded
+    time_col : str
+        Name of the datetime column
+    distance_col : str
+        Name of the distance column
+
+    Returns
+    -------
+    Tuple[Dict[str, pd.DataFrame], Dict[str, np.ndarray]]
+        Epoch name -> selected analogues (with rank and period columns), and
+        epoch name -> candidate mask
+    """
+    dates = pd.to_datetime(all_distances[time_col])
+    years = dates.dt.year.values
+    keep = np.ones(len(all_distances), dtype=bool)
+    if exclude_around is not None:
+        keep = ~((dates >= exclude_around - min_separation) & (dates <= exclude_around + min_separation)).values
+
+    masks = {name: (years >= start) & (years <= end) & keep for name, (start, end) in epochs.items()}
+    selected = select_time_separated_groups(
+        all_distances,
+        masks,
+        n_analogues=n_analogues,
+        time_col=time_col,
+        distance_col=distance_col,
+        min_separation=min_separation
+    )
+    for name, df in selected.items():
+        df['period'] = name
+    return selected, masks
+
+
+def period_epochs(
+    analogue_config: Dict,
+    period: Optional[str] = None
+) -> Tuple[Dict[str, Tuple[int, int]], Optional[Tuple[int, int]]]:
+    """
+    Epochs to select analogues in and the year range to load.
+
+    All epochs from the config (see epoch_definitions) are returned unless
+    period names a single one; then only that epoch is kept and only its
+    years need loading.  The year range is None when all years are needed.
+    """
+    epochs = epoch_definitions(analogue_config)
+    if period is None:
+        return epochs, None  # Load all years
+    if period not in epochs:
+        raise ValueError(f"Unknown period '{period}'; available: {', '.join(epochs)}")
+    return {period: epochs[period]}, epochs[period]
+
+
+def select_period_analogues(
+    all_distances: pd.DataFrame,
+    actual_snapshot: pd.Timestamp,
+    analogue_config: Dict,
+    epochs: Dict[str, Tuple[int, int]]
+) -> Tuple[Dict[str, pd.DataFrame], Dict[str, np.ndarray]]:
+    """
+    select_epoch_analogues with n_analogues and min_separation from the config.
+
+    Dates within the smoothing window of the snapshot are excluded from all
+    epochs.  Returns (epoch name -> analogues, epoch name -> candidate mask).
+    """
+    n_analogues = analogue_config.get('n_analogues', 15)
+    smoothing_days = analogue_config.get('smoothing', {}).get('window_days', 5)
+    return select_epoch_analogues(
+        all_distances,
+        epochs,
+        n_analogues=n_analogues,
+        min_separation=pd.Timedelta(days=smoothing_days),
+        exclude_around=actual_snapshot
+    )
@@ -6,18 +6,21 @@ This module performs:
 2. Slice to event bounding box on-the-fly
 3. Use snapshot_date as reference pattern
 4. Compute latitude-weighted Euclidean distance between reference and all days
-5. Split into past/present periods
+5. Split into named periods (past/present, or any epochs from the config)
 6. Select top N analogues per period with minimum time separation
 7. Save results to CSV files
 
 Usage:
     python analogue_search.py --dataset era5 --event antarctica_peninsula
     python analogue_search.py --dataset era5 --all
+    python analogue_weights.py --dataset era5 --event antarctica_peninsula \
+        --sigma_sweep 500,600,700,800,900,1000,1100,1300,1500
 """
 
 import argparse
 import sys
 import json
+import time
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional, Any
 from datetime import datetime
@@ -35,6 +38,19 @@ from data_utils import (
 )
 
 from spatial_weights import compute_spatial_weights
+from analogue_selection import epoch_definitions, period_epochs, select_period_analogues
+from coord_schema import open_field, sel_bbox
+from distance_engine import (
+    compute_euclidean_distances_expanded,
+    compute_euclidean_distances_multiweight,
+    norm_cache_dir,
+    running_mean,
+    running_mean_cache_dir,
+    running_mean_days,
+)
+from manifest import manifest_path, needs_build, record
+from slice_cache import anomaly_source_files, slice_year_range
+from table_io import TABLE_FORMATS, table_suffix, write_table
 
 # #region agent log - Debug logging helper
 DEBUG_LOG = Path.home() / ".cursor/debug.log"
@@ -54,35 +70,6 @@ def debug_log(hypothesis_id: str, location: str, message: str, data: dict):
 # #endregion
 
 
-def _standardize_coords(ds: xr.Dataset) -> xr.DataArray:
-    """Detect and rename coords to standard names; return data variable."""
-    var_names = list(ds.data_vars)
-    if len(var_names) == 0:
-        raise ValueError("No data variables found in anomaly files")
-    data_var = ds[var_names[0]]
-    lat_name = lon_name = time_name = None
-    for coord in ds.coords:
-        coord_lower = coord.lower()
-        if 'lat' in coord_lower:
-            lat_name = coord
-        elif 'lon' in coord_lower:
-            lon_name = coord
-        elif 'time' in coord_lower or 'valid' in coord_lower:
-            time_name = coord
-    if lat_name is None or lon_name is None:
-        raise ValueError(f"Could not detect lat/lon coordinates. Found: {list(ds.coords)}")
-    rename_dict = {}
-    if lat_name != 'lat':
-        rename_dict[lat_name] = 'lat'
-    if lon_name != 'lon':
-        rename_dict[lon_name] = 'lon'
-    if time_name and time_name != 'time':
-        rename_dict[time_name] = 'time'
-    if rename_dict:
-        data_var = data_var.rename(rename_dict)
-    return data_var
-
-
 def load_anomaly_data(
     dataset: str,
     var: str,
@@ -102,7 +89,7 @@ def load_anomaly_data(
         if verbose:
             print(f"Loading pre-sliced data: {sliced_path.name}")
         ds = xr.open_dataset(sliced_path, chunks={'time': 365})
-        data_var = _standardize_coords(ds)
+        data_var, _ = open_field(ds, sliced_path, preferred_var=var)
         if verbose:
             print(f"Data shape: {dict(data_var.sizes)}")
         return data_var
@@ -145,9 +132,9 @@ def load_anomaly_data(
         chunks={'time': 365}
     )
     
-    data_var = _standardize_coords(ds)
+    data_var, schema = open_field(ds, anom_files, preferred_var=var)
     if verbose:
-        print(f"Using variable: {list(ds.data_vars)[0]}")
+        print(f"Using variable: {schema['var']}")
     
     lat_min = region['lat_min']
     lat_max = region['lat_max']
@@ -157,10 +144,7 @@ def load_anomaly_data(
     if verbose:
         print(f"Slicing to region: lat[{lat_min}, {lat_max}], lon[{lon_min}, {lon_max}]")
     
-    if data_var.lat[0] > data_var.lat[-1]:
-        data_var = data_var.sel(lat=slice(lat_max, lat_min), lon=slice(lon_min, lon_max))
-    else:
-        data_var = data_var.sel(lat=slice(lat_min, lat_max), lon=slice(lon_min, lon_max))
+    data_var = sel_bbox(data_var, schema, lat_min, lat_max, lon_min, lon_max)
     
     if verbose:
         print(f"Data shape after slicing: {dict(data_var.sizes)}")
@@ -168,142 +152,32 @@ def load_anomaly_data(
     return data_var
 
 
-def compute_euclidean_distances(
-    data: xr.DataArray,
-    reference: xr.DataArray,
-    spatial_weights: xr.DataArray
-) -> xr.DataArray:
-    """
-    Compute weighted sum of squared differences between reference and all time steps.
-
-    spatial_weights must be an xr.DataArray with dims ('lat','lon') and normalized
-    so that sum(spatial_weights) == 1. The function applies the weight element-wise.
-    """
-    # Compute difference (broadcasts reference over time dimension)
-    diff = data - reference
-
-    # Square the differences
-    diff_sq = diff ** 2
-
-    # Apply spatial weights (broadcasts over time dimension)
-    weighted_diff_sq = diff_sq * spatial_weights
-
-    # Sum over spatial dimensions
-    sum_weighted_sq = weighted_diff_sq.sum(dim=['lat', 'lon'])
-
-    return sum_weighted_sq
-
-
-def select_time_separated_analogues(
-    df: pd.DataFrame,
-    n_analogues: int,
-    time_col: str = 'date',
-    distance_col: str = 'distance',
-    min_separation: pd.Timedelta = pd.Timedelta('5D')
-) -> pd.DataFrame:
-    """
-    Select top N analogues with minimum time separation.
-    """
-    df_sorted = df.sort_values(distance_col).reset_index(drop=True)
-    
-    chosen_indices = []
-    chosen_dates = []
-    
-    for idx, row in df_sorted.iterrows():
-        candidate_date = row[time_col]
-        
-        # Check if this date is far enough from all chosen dates
-        is_separated = True
-        for chosen_date in chosen_dates:
-            if abs(candidate_date - chosen_date) < min_separation:
-                is_separated = False
-                break
-        
-        if is_separated:
-            chosen_indices.append(idx)
-            chosen_dates.append(candidate_date)
-            
-            if len(chosen_indices) >= n_analogues:
-                break
-    
-    # Create result DataFrame
-    result = df_sorted.loc[chosen_indices].copy()
-    result['rank'] = range(1, len(result) + 1)
-    
-    return result
-
-
-def find_analogues(
+def _load_cube_and_reference(
     event: Dict[str, Any],
     dataset: str,
     paths: Dict[str, Path],
     analogue_config: Dict[str, Any],
-    period: Optional[str] = None,
+    year_range: Optional[Tuple[int, int]],
     verbose: bool = True
-) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+) -> Tuple[xr.DataArray, xr.DataArray, pd.Timestamp]:
     """
-    Find analogue dates for a single event using snapshot_date as reference.
+    Event cube and snapshot reference pattern, both smoothed with the config's running mean.
+
+    Shared by find_analogues and find_analogues_sigma_sweep.  The cube comes
+    from the pre-sliced file when present, else from the F01 anomaly files
+    limited to year_range; a snapshot outside year_range is loaded separately.
+
+    Returns
+    -------
+    Tuple[xr.DataArray, xr.DataArray, pd.Timestamp]
+        (cube, reference pattern, actual snapshot date used)
     """
     event_name = event['name']
     region = event['region']
-    
-    # Get snapshot date (required field)
-    if 'snapshot_date' not in event:
-        raise ValueError(f"Event '{event_name}' missing required 'snapshot_date' field")
-    
     snapshot_date = pd.Timestamp(event['snapshot_date'])
-    
-    # Get configuration
-    n_analogues = analogue_config.get('n_analogues', 15)
     match_var = analogue_config.get('distance', {}).get('match_variable', 'psurf')
-    
-    past_period = analogue_config.get('periods', {}).get('past', {})
-    present_period = analogue_config.get('periods', {}).get('present', {})
-    
-    past_start = past_period.get('start_year') # no default values -- better fail than silently assume
-    past_end = past_period.get('end_year')
-    present_start = present_period.get('start_year')
-    present_end = present_period.get('end_year')
-    
-    # #region agent log - H1: Verify period configuration loaded correctly
-    debug_log("H1", "analogue_search.py:find_analogues", "Period config loaded", {
-        "event_name": event_name,
-        "match_var": match_var,
-        "past_start": past_start,
-        "past_end": past_end,
-        "present_start": present_start,
-        "present_end": present_end,
-        "snapshot_date": str(snapshot_date),
-        "period_filter": period
-    })
-    # #endregion
-    
-    # Time separation for analogue selection
-    smoothing_days = analogue_config.get('smoothing', {}).get('window_days', 5)
-    min_separation = pd.Timedelta(days=smoothing_days)
-    
-    # Determine year range to load based on period filter
-    if period == 'past':
-        year_range = (past_start, past_end)
-    elif period == 'present':
-        year_range = (present_start, present_end)
-    else:
-        year_range = None  # Load all years
-    
-    if verbose:
-        print(f"\n{'='*60}")
-        print(f"Analogue Search: {event_name}")
-        print(f"{'='*60}")
-        print(f"Dataset: {dataset}")
-        print(f"Snapshot date: {snapshot_date.strftime('%Y-%m-%d')}")
-        print(f"Match variable: {match_var}")
-        print(f"Region: lat[{region['lat_min']}, {region['lat_max']}], lon[{region['lon_min']}, {region['lon_max']}]")
-        print(f"Past period: {past_start}-{past_end}")
-        print(f"Present period: {present_start}-{present_end}")
-        if period:
-            print(f"Processing ONLY: {period} period")
-        print(f"N analogues: {n_analogues}")
-        print(f"Min time separation: {min_separation}")
+    mean_days = running_mean_days(analogue_config)
+    smoothed_cache = running_mean_cache_dir(paths, analogue_config)
     
     # Path to CDO pre-sliced file (same location as cdo_slice.py writes).
     sliced_path = paths["data"] / "F02_analogue_search" / "sliced" / dataset / event_name / f"anomaly_{match_var}_sliced.nc"
@@ -330,6 +204,7 @@ def find_analogues(
         sliced_path=sliced_path if sliced_exists else None,
         verbose=verbose
     )
+    data_var = running_mean(data_var, mean_days, smoothed_cache)
     
     # #region agent log - H2: Verify data loaded and time range
     time_values = pd.to_datetime(data_var.time.values)
@@ -359,16 +234,92 @@ def find_analogues(
             year_range=(snapshot_year, snapshot_year),
             verbose=False
         )
+        ref_data = running_mean(ref_data, mean_days, smoothed_cache)
         reference = ref_data.sel(time=snapshot_date, method='nearest')
-        actual_snapshot = pd.Timestamp(reference.time.values)
     else:
         reference = data_var.sel(time=snapshot_date, method='nearest')
-        actual_snapshot = pd.Timestamp(reference.time.values)
+    actual_snapshot = pd.Timestamp(reference.time.values)
     
     if verbose:
         print(f"Actual snapshot date used: {actual_snapshot.strftime('%Y-%m-%d')}")
         print(f"Reference pattern shape: {reference.shape}")
     
+    return data_var, reference, actual_snapshot
+
+
+def _distances_to_frame(dates: np.ndarray, distances: np.ndarray) -> pd.DataFrame:
+    """all_distances table (date, distance, year, month, day) for one distance series."""
+    all_distances = pd.DataFrame({
+        'date': pd.to_datetime(dates),
+        'distance': distances
+    })
+    all_distances['year'] = all_distances['date'].dt.year
+    all_distances['month'] = all_distances['date'].dt.month
+    all_distances['day'] = all_distances['date'].dt.day
+    return all_distances
+
+
+def find_analogues(
+    event: Dict[str, Any],
+    dataset: str,
+    paths: Dict[str, Path],
+    analogue_config: Dict[str, Any],
+    period: Optional[str] = None,
+    verbose: bool = True
+) -> Tuple[pd.DataFrame, Dict[str, pd.DataFrame]]:
+    """
+    Find analogue dates for a single event using snapshot_date as reference.
+
+    Returns (all_distances, epoch name -> top N analogues), with the epochs
+    (periods and period_windows) of the config, or only period if given.
+    """
+    event_name = event['name']
+    region = event['region']
+    
+    # Get snapshot date (required field)
+    if 'snapshot_date' not in event:
+        raise ValueError(f"Event '{event_name}' missing required 'snapshot_date' field")
+    
+    snapshot_date = pd.Timestamp(event['snapshot_date'])
+    
+    # Get configuration
+    n_analogues = analogue_config.get('n_analogues', 15)
+    match_var = analogue_config.get('distance', {}).get('match_variable', 'psurf')
+    
+    # Epochs to select in, and the year range to load based on period filter
+    epochs, year_range = period_epochs(analogue_config, period)
+    
+    # #region agent log - H1: Verify period configuration loaded correctly
+    debug_log("H1", "analogue_search.py:find_analogues", "Period config loaded", {
+        "event_name": event_name,
+        "match_var": match_var,
+        "epochs": {name: list(bounds) for name, bounds in epochs.items()},
+        "snapshot_date": str(snapshot_date),
+        "period_filter": period
+    })
+    # #endregion
+    
+    if verbose:
+        smoothing_days = analogue_config.get('smoothing', {}).get('window_days', 5)
+        print(f"\n{'='*60}")
+        print(f"Analogue Search: {event_name}")
+        print(f"{'='*60}")
+        print(f"Dataset: {dataset}")
+        print(f"Snapshot date: {snapshot_date.strftime('%Y-%m-%d')}")
+        print(f"Match variable: {match_var}")
+        print(f"Region: lat[{region['lat_min']}, {region['lat_max']}], lon[{region['lon_min']}, {region['lon_max']}]")
+        for name, (start, end) in epochs.items():
+            print(f"Period {name}: {start}-{end}")
+        if period:
+            print(f"Processing ONLY: {period} period")
+        print(f"N analogues: {n_analogues}")
+        print(f"Running mean: {running_mean_days(analogue_config)} day(s)")
+        print(f"Min time separation: {pd.Timedelta(days=smoothing_days)}")
+    
+    data_var, reference, actual_snapshot = _load_cube_and_reference(
+        event, dataset, paths, analogue_config, year_range, verbose=verbose
+    )
+    
     # --------------------
     # Compute spatial weights (lat * optional gaussian)
     # --------------------
@@ -393,9 +344,6 @@ def find_analogues(
     # #region agent log - H2b: weight debugging info
     try:
         # compute approximate center of mass of weights for debugging
-        lat_vals = spatial_weights.sum(dim='lon') * spatial_weights.lat
-        lon_vals = spatial_weights.sum(dim='lat') * spatial_weights.lon
-        # note: these are xarray objects; extract scalar approximations
         approx_lat = float((spatial_weights * spatial_weights.lat).sum()/spatial_weights.sum())
         approx_lon = float((spatial_weights * spatial_weights.lon).sum()/spatial_weights.sum())
     except Exception:
@@ -415,10 +363,12 @@ def find_analogues(
     if verbose:
         print(f"\nComputing distances to all {len(data_var.time)} time steps...")
         print(f"  (This may take a while for large datasets...)")
-        import sys
         sys.stdout.flush()
     
-    distances = compute_euclidean_distances(data_var, reference, spatial_weights)
+    # Same norm-expanded kernel and norm cache as analogue_search and the sigma sweep
+    distances = compute_euclidean_distances_expanded(
+        data_var, reference, spatial_weights, cache_dir=norm_cache_dir(paths, analogue_config)
+    )
     
     # Trigger computation (if using dask) with progress bar
     if verbose:
@@ -433,84 +383,177 @@ def find_analogues(
     if verbose:
         print(f"Distance computation complete.")
     
-    # Convert to DataFrame
-    all_distances = pd.DataFrame({
-        'date': pd.to_datetime(distances.time.values),
-        'distance': distances.values
-    })
-    all_distances['year'] = all_distances['date'].dt.year
-    all_distances['month'] = all_distances['date'].dt.month
-    all_distances['day'] = all_distances['date'].dt.day
-    
-    # Define masks for past and present periods
-    past_mask = (all_distances['year'] >= past_start) & (all_distances['year'] <= past_end)
-    present_mask = (all_distances['year'] >= present_start) & (all_distances['year'] <= present_end)
-    
-    # Exclude snapshot date from candidates (and nearby dates)
-    snapshot_exclusion = (
-        (all_distances['date'] >= actual_snapshot - min_separation) & 
-        (all_distances['date'] <= actual_snapshot + min_separation)
+    all_distances = _distances_to_frame(distances.time.values, distances.values)
+    epoch_analogues, epoch_masks = select_period_analogues(
+        all_distances, actual_snapshot, analogue_config, epochs
     )
-    past_mask = past_mask & ~snapshot_exclusion
-    present_mask = present_mask & ~snapshot_exclusion
     
     if verbose:
-        print(f"\nPast candidates: {past_mask.sum()}")
-        print(f"Present candidates (excl. snapshot): {present_mask.sum()}")
-    
-    # Select top analogues from each period (skip if not processing that period)
-    if period != 'present':  # Process past if period is None or 'past'
-        past_candidates = all_distances[past_mask].copy()
-        past_df = select_time_separated_analogues(
-            past_candidates,
-            n_analogues=n_analogues,
-            time_col='date',
-            distance_col='distance',
-            min_separation=min_separation
-        )
-        past_df['period'] = 'past'
-    else:
-        past_df = pd.DataFrame(columns=['date', 'distance', 'year', 'month', 'day', 'rank', 'period'])
-    
-    if period != 'past':  # Process present if period is None or 'present'
-        present_candidates = all_distances[present_mask].copy()
-        present_df = select_time_separated_analogues(
-            present_candidates,
-            n_analogues=n_analogues,
-            time_col='date',
-            distance_col='distance',
-            min_separation=min_separation
-        )
-        present_df['period'] = 'present'
-    else:
-        present_df = pd.DataFrame(columns=['date', 'distance', 'year', 'month', 'day', 'rank', 'period'])
+        print()
+        for name, mask in epoch_masks.items():
+            print(f"{name} candidates (excl. snapshot): {int(mask.sum())}")
     
     # #region agent log - H3: Verify analogue selection results
     debug_log("H3", "analogue_search.py:find_analogues", "Analogues selected", {
         "event_name": event_name,
-        "past_candidates_count": int(past_mask.sum()),
-        "present_candidates_count": int(present_mask.sum()),
-        "past_analogues_found": len(past_df),
-        "present_analogues_found": len(present_df),
-        "top_past_date": str(past_df['date'].iloc[0]) if len(past_df) > 0 else None,
-        "top_present_date": str(present_df['date'].iloc[0]) if len(present_df) > 0 else None
+        "candidates_count": {name: int(mask.sum()) for name, mask in epoch_masks.items()},
+        "analogues_found": {name: len(df) for name, df in epoch_analogues.items()},
+        "top_dates": {
+            name: str(df['date'].iloc[0]) if len(df) > 0 else None
+            for name, df in epoch_analogues.items()
+        }
     })
     # #endregion
     
     if verbose:
-        print(f"\n--- Top {len(past_df)} Past Analogues ---")
-        if len(past_df) > 0:
-            print(past_df[['rank', 'date', 'distance']].to_string(index=False))
-        else:
-            print("  No past analogues found")
-        
-        print(f"\n--- Top {len(present_df)} Present Analogues ---")
-        if len(present_df) > 0:
-            print(present_df[['rank', 'date', 'distance']].to_string(index=False))
-        else:
-            print("  No present analogues found")
+        for name, df in epoch_analogues.items():
+            print(f"\n--- Top {len(df)} {name.capitalize()} Analogues ---")
+            if len(df) > 0:
+                print(df[['rank', 'date', 'distance']].to_string(index=False))
+            else:
+                print(f"  No {name} analogues found")
+    
+    return all_distances, epoch_analogues
+
+
+def find_analogues_sigma_sweep(
+    event: Dict[str, Any],
+    dataset: str,
+    paths: Dict[str, Path],
+    analogue_config: Dict[str, Any],
+    sigmas_km: List[float],
+    period: Optional[str] = None,
+    verbose: bool = True
+) -> Dict[float, Tuple[pd.DataFrame, Dict[str, pd.DataFrame]]]:
+    """
+    Find analogues for several Gaussian sigma values in a single pass over the data.
+
+    Builds one weight field per sigma with compute_spatial_weights and computes
+    the distances for all of them together, instead of one find_analogues()
+    run (and one cube load) per sigma.
+
+    Returns a dict mapping sigma_km -> (all_distances, epoch analogues), as
+    find_analogues() returns for that sigma.
+    """
+    event_name = event['name']
+    
+    if 'snapshot_date' not in event:
+        raise ValueError(f"Event '{event_name}' missing required 'snapshot_date' field")
+    snapshot_date = pd.Timestamp(event['snapshot_date'])
+    
+    epochs, year_range = period_epochs(analogue_config, period)
+    
+    gaussian_spec = event.get('gaussian_center', None)
+    if not gaussian_spec:
+        print(f"[WARN] Event '{event_name}' has no gaussian_center; sigma has no effect on the weights.")
+    
+    if verbose:
+        print(f"\n{'='*60}")
+        print(f"Sigma sweep: {event_name}")
+        print(f"{'='*60}")
+        print(f"Dataset: {dataset}")
+        print(f"Snapshot date: {snapshot_date.strftime('%Y-%m-%d')}")
+        print(f"Sigma values (km): {', '.join(f'{s:g}' for s in sigmas_km)}")
+    
+    data_var, reference, actual_snapshot = _load_cube_and_reference(
+        event, dataset, paths, analogue_config, year_range, verbose=verbose
+    )
+    
+    # One weight field per sigma, stacked along a 'weight' dimension
+    weight_stack = xr.concat(
+        [
+            compute_spatial_weights(
+                lat=data_var.lat,
+                lon=data_var.lon,
+                gaussian_center_spec=gaussian_spec,
+                sigma_km=float(sigma)
+            )
+            for sigma in sigmas_km
+        ],
+        dim='weight'
+    ).assign_coords(weight=[float(s) for s in sigmas_km])
+    
+    if verbose:
+        print(f"\nComputing distances for {len(sigmas_km)} sigma values "
+              f"over {len(data_var.time)} time steps in one pass...")
+        sys.stdout.flush()
+    
+    distances = compute_euclidean_distances_multiweight(
+        data_var,
+        reference,
+        weight_stack,
+        cache_dir=norm_cache_dir(paths, analogue_config)
+    )
     
-    return all_distances, past_df, present_df
+    results = {}
+    for k, sigma in enumerate(sigmas_km):
+        all_distances = _distances_to_frame(distances.time.values, distances.values[k])
+        epoch_analogues, _ = select_period_analogues(
+            all_distances, actual_snapshot, analogue_config, epochs
+        )
+        results[float(sigma)] = (all_distances, epoch_analogues)
+        if verbose:
+            best = ', '.join(
+                f"best {name} {df['date'].iloc[0].strftime('%Y-%m-%d') if len(df) > 0 else '-'}"
+                for name, df in epoch_analogues.items()
+            )
+            print(f"  sigma {sigma:g} km: {best}")
+    
+    return results
+
+
+def _table_metadata(
+    event: Dict[str, Any],
+    dataset: str,
+    analogue_config: Dict[str, Any],
+    sigma_km: Optional[float]
+) -> Dict[str, Any]:
+    """Run metadata stored with Parquet output tables."""
+    return {
+        'dataset': dataset,
+        'event': event['name'],
+        'snapshot_date': str(pd.Timestamp(event['snapshot_date']).date()),
+        'match_variable': analogue_config.get('distance', {}).get('match_variable', 'psurf'),
+        'similarity_metric': 'rmse',
+        'sigma_km': sigma_km,
+        'calendar_window_days': analogue_config.get('snapshot_calendar_window', 15),
+        'smoothing_days': analogue_config.get('smoothing', {}).get('window_days', 5),
+        'running_mean_days': running_mean_days(analogue_config),
+        'n_analogues': analogue_config.get('n_analogues', 15),
+        'epochs': {name: list(bounds) for name, bounds in epoch_definitions(analogue_config).items()},
+    }
+
+
+def _manifest_inputs(paths: Dict[str, Path], dataset: str, analogue_config: Dict[str, Any]) -> List[Path]:
+    """Anomaly files the tables derive from (the pre-sliced files are built from them)."""
+    match_var = analogue_config.get('distance', {}).get('match_variable', 'psurf')
+    return anomaly_source_files(paths, dataset, match_var, *slice_year_range(analogue_config))
+
+
+def _run_config(
+    event: Dict[str, Any],
+    dataset: str,
+    analogue_config: Dict[str, Any],
+    period: Optional[str],
+    sigma_km: Optional[float]
+) -> Dict[str, Any]:
+    """Settings that determine a combined analogues table (manifest config)."""
+    return {'stage': 'analogue_weights', 'period': period, 'region': event['region'],
+            **_table_metadata(event, dataset, analogue_config, sigma_km)}
+
+
+def _write_epoch_tables(
+    epoch_analogues: Dict[str, pd.DataFrame],
+    output_dir: Path,
+    tail: str,
+    metadata: Dict[str, Any]
+) -> Dict[str, Path]:
+    """Write <epoch>_analogues<tail> per epoch (e.g. past_analogues_500km.csv); returns the paths."""
+    epoch_files = {}
+    for name, df in epoch_analogues.items():
+        epoch_files[name] = output_dir / f'{name}_analogues{tail}'
+        write_table(df, epoch_files[name], {**metadata, 'epoch': name})
+    return epoch_files
 
 
 def process_event(
@@ -521,10 +564,13 @@ def process_event(
     period: Optional[str] = None,
     skip_existing: bool = True,
     verbose: bool = True,
-    sigma_km_override: Optional[float] = None
+    sigma_km_override: Optional[float] = None,
+    output_format: str = 'csv'
 ) -> bool:
     """
     Process analogue search for a single event and save results.
+
+    Tables are written as CSV, or as Parquet with output_format='parquet'.
     """
     event_name = event['name']
     
@@ -537,16 +583,9 @@ def process_event(
     else:
         sigma_suffix = ""
     suffix = f"_{period}" if period else ""
-    distances_file = output_dir / f'all_distances{sigma_suffix}{suffix}.csv'
-    past_file = output_dir / f'past_analogues{sigma_suffix}{suffix}.csv'
-    present_file = output_dir / f'present_analogues{sigma_suffix}{suffix}.csv'
-    combined_file = output_dir / f'analogues{sigma_suffix}{suffix}.csv'
-    
-    # Check if can skip
-    if skip_existing and combined_file.exists():
-        if verbose:
-            print(f"[{event_name}] Output exists, skipping: {combined_file}")
-        return True
+    ext = table_suffix(output_format)
+    distances_file = output_dir / f'all_distances{sigma_suffix}{suffix}{ext}'
+    combined_file = output_dir / f'analogues{sigma_suffix}{suffix}{ext}'
     
     # Override sigma_km in event config if provided
     if sigma_km_override is not None:
@@ -557,9 +596,28 @@ def process_event(
             event['gaussian_center'] = event['gaussian_center'].copy()
         event['gaussian_center']['sigma_km'] = sigma_km_override
     
+    gaussian_spec = event.get('gaussian_center')
+    sigma_km = None
+    if gaussian_spec:
+        sigma_km = float(gaussian_spec.get('sigma_km', 1000.0)) if isinstance(gaussian_spec, dict) else 1000.0
+    
+    # Check if can skip: the manifest records the output as up to date
+    manifest = manifest_path(paths['data'])
+    inputs = _manifest_inputs(paths, dataset, analogue_config)
+    run_config = _run_config(event, dataset, analogue_config, period, sigma_km)
+    build, status = needs_build(manifest, combined_file, 'analogue_weights', inputs, run_config,
+                                force=not skip_existing)
+    if not build:
+        if verbose:
+            print(f"[{event_name}] Output {status}, skipping: {combined_file}")
+        return True
+    if verbose and status.startswith('stale'):
+        print(f"[{event_name}] Output {status}, recomputing: {combined_file}")
+    
+    start = time.perf_counter()
     try:
         # Find analogues
-        all_distances, past_df, present_df = find_analogues(
+        all_distances, epoch_analogues = find_analogues(
             event=event,
             dataset=dataset,
             paths=paths,
@@ -568,22 +626,21 @@ def process_event(
             verbose=verbose
         )
         
-        # Save results
-        all_distances.to_csv(distances_file, index=False)
-        if not past_df.empty or period != 'present':
-            past_df.to_csv(past_file, index=False)
-        if not present_df.empty or period != 'past':
-            present_df.to_csv(present_file, index=False)
+        # Save results: one <epoch>_analogues file per epoch
+        metadata = _table_metadata(event, dataset, analogue_config, sigma_km)
+        write_table(all_distances, distances_file, metadata)
+        epoch_files = _write_epoch_tables(epoch_analogues, output_dir, f'{sigma_suffix}{suffix}{ext}', metadata)
         
         # Combined analogues file
-        combined = pd.concat([past_df, present_df], ignore_index=True)
-        combined.to_csv(combined_file, index=False)
+        combined = pd.concat(list(epoch_analogues.values()), ignore_index=True)
+        write_table(combined, combined_file, metadata)
+        record(manifest, combined_file, 'analogue_weights', inputs, run_config, time.perf_counter() - start)
         
         if verbose:
             print(f"\n[{event_name}] Results saved to:")
             print(f"  - All distances: {distances_file}")
-            print(f"  - Past analogues: {past_file}")
-            print(f"  - Present analogues: {present_file}")
+            for name, epoch_file in epoch_files.items():
+                print(f"  - {name} analogues: {epoch_file}")
             print(f"  - Combined: {combined_file}")
         
         return True
@@ -595,14 +652,102 @@ def process_event(
         return False
 
 
+def process_event_sigma_sweep(
+    event: Dict[str, Any],
+    dataset: str,
+    paths: Dict[str, Path],
+    analogue_config: Dict[str, Any],
+    sigmas_km: List[float],
+    period: Optional[str] = None,
+    skip_existing: bool = True,
+    verbose: bool = True,
+    output_format: str = 'csv'
+) -> bool:
+    """
+    Run a single-pass sigma sweep for one event and save per-sigma tables.
+
+    Output files use the same names as per-sigma process_event() runs
+    (analogues_<sigma>km.csv or .parquet etc.), so
+    bump_ranking.load_all_sigma_data reads them directly.
+    """
+    event_name = event['name']
+    output_dir = ensure_dir(paths['analogue'] / dataset / event_name)
+    suffix = f"_{period}" if period else ""
+    ext = table_suffix(output_format)
+    
+    def _combined_file(sigma: float) -> Path:
+        return output_dir / f'analogues_{int(sigma)}km{suffix}{ext}'
+    
+    def _sigma_config(sigma: float) -> Dict[str, Any]:
+        sigma_event = {**event, 'gaussian_center': {**(event.get('gaussian_center') or {}), 'sigma_km': sigma}}
+        return _run_config(sigma_event, dataset, analogue_config, period, float(sigma))
+    
+    # Check which sigmas can be skipped: the manifest records them as up to date
+    manifest = manifest_path(paths['data'])
+    inputs = _manifest_inputs(paths, dataset, analogue_config)
+    todo = []
+    for s in sigmas_km:
+        build, status = needs_build(manifest, _combined_file(s), 'analogue_weights', inputs, _sigma_config(s),
+                                    force=not skip_existing)
+        if build:
+            todo.append(s)
+            if verbose and status.startswith('stale'):
+                print(f"[{event_name}] Output {status}, recomputing: {_combined_file(s)}")
+        elif verbose:
+            print(f"[{event_name}] Output {status}, skipping: {_combined_file(s)}")
+    if not todo:
+        return True
+    
+    start = time.perf_counter()
+    try:
+        results = find_analogues_sigma_sweep(
+            event=event,
+            dataset=dataset,
+            paths=paths,
+            analogue_config=analogue_config,
+            sigmas_km=todo,
+            period=period,
+            verbose=verbose
+        )
+        
+        for sigma, (all_distances, epoch_analogues) in results.items():
+            sigma_suffix = f"_{int(sigma)}km"
+            metadata = _table_metadata(event, dataset, analogue_config, float(sigma))
+            write_table(all_distances, output_dir / f'all_distances{sigma_suffix}{suffix}{ext}', metadata)
+            _write_epoch_tables(epoch_analogues, output_dir, f'{sigma_suffix}{suffix}{ext}', metadata)
+            combined = pd.concat(list(epoch_analogues.values()), ignore_index=True)
+            write_table(combined, _combined_file(sigma), metadata)
+        # One pass computes every sigma: record the sweep time per table
+        seconds = time.perf_counter() - start
+        for sigma in results:
+            record(manifest, _combined_file(sigma), 'analogue_weights', inputs, _sigma_config(sigma), seconds)
+        
+        if verbose:
+            print(f"\n[{event_name}] Sigma sweep results saved to: {output_dir}")
+            for sigma in results:
+                print(f"  - {_combined_file(sigma).name}")
+        
+        return True
+        
+    except Exception as e:
+        print(f"[{event_name}] ERROR: {e}", file=sys.stderr)
+        import traceback
+        traceback.print_exc()
+        return False
+
+
 def process_all_events(
     dataset: str,
     period: Optional[str] = None,
     skip_existing: bool = True,
-    verbose: bool = True
+    verbose: bool = True,
+    sigmas_km: Optional[List[float]] = None,
+    output_format: str = 'csv'
 ) -> bool:
     """
     Process analogue search for all events.
+
+    If sigmas_km is given, each event is run as a single-pass sigma sweep.
     """
     # Load configurations
     env = load_env_setting()
@@ -630,15 +775,29 @@ def process_all_events(
     
     all_success = True
     for event in valid_events:
-        success = process_event(
-            event=event,
-            dataset=dataset,
-            paths=paths,
-            analogue_config=analogue_config,
-            period=period,
-            skip_existing=skip_existing,
-            verbose=verbose
-        )
+        if sigmas_km is not None:
+            success = process_event_sigma_sweep(
+                event=event,
+                dataset=dataset,
+                paths=paths,
+                analogue_config=analogue_config,
+                sigmas_km=sigmas_km,
+                period=period,
+                skip_existing=skip_existing,
+                verbose=verbose,
+                output_format=output_format
+            )
+        else:
+            success = process_event(
+                event=event,
+                dataset=dataset,
+                paths=paths,
+                analogue_config=analogue_config,
+                period=period,
+                skip_existing=skip_existing,
+                verbose=verbose,
+                output_format=output_format
+            )
         if not success:
             all_success = False
     
@@ -671,9 +830,9 @@ def main():
     parser.add_argument(
         '--period',
         type=str,
-        choices=['past', 'present'],
         default=None,
-        help='Process only this period (past or present) to save time. If not specified, processes both.'
+        help='Process only this period (any epoch name from the config, e.g. past) to save time. '
+             'If not specified, processes all epochs.'
     )
     parser.add_argument(
         '--force',
@@ -691,6 +850,19 @@ def main():
         default=None,
         help='Override sigma_km for Gaussian weighting (for sensitivity testing)'
     )
+    parser.add_argument(
+        '--sigma_sweep',
+        type=str,
+        default=None,
+        help='Comma-separated sigma_km values computed in a single pass, e.g. 500,600,700 '
+             '(writes analogues_<sigma>km.csv for each)'
+    )
+    parser.add_argument(
+        '--output_format',
+        choices=TABLE_FORMATS,
+        default='csv',
+        help='Table format for all_distances/analogues outputs (parquet needs pyarrow)'
+    )
     args = parser.parse_args()
     
     skip_existing = not args.force
@@ -700,7 +872,18 @@ def main():
     print("Analogue Search Pipeline")
     print("=" * 60)
     print(f"Dataset: {args.dataset}")
-    if args.sigma_km:
+    sigmas_km = None
+    if args.sigma_sweep:
+        try:
+            sigmas_km = [float(v) for v in args.sigma_sweep.split(',') if v.strip()]
+        except ValueError:
+            print(f"Invalid --sigma_sweep value: {args.sigma_sweep}")
+            sys.exit(1)
+        if not sigmas_km:
+            print("--sigma_sweep needs at least one value")
+            sys.exit(1)
+        print(f"Sigma sweep: {', '.join(f'{s:g}' for s in sigmas_km)} km")
+    elif args.sigma_km:
         print(f"Sigma override: {args.sigma_km} km")
     if args.period:
         print(f"Period: {args.period} only")
@@ -728,23 +911,39 @@ def main():
                 print(f"Event '{args.event}' is missing required 'snapshot_date' field")
                 sys.exit(1)
             
-            success = process_event(
-                event=event,
-                dataset=args.dataset,
-                paths=paths,
-                analogue_config=analogue_config,
-                period=args.period,
-                skip_existing=skip_existing,
-                verbose=verbose,
-                sigma_km_override=args.sigma_km
-            )
+            if sigmas_km is not None:
+                success = process_event_sigma_sweep(
+                    event=event,
+                    dataset=args.dataset,
+                    paths=paths,
+                    analogue_config=analogue_config,
+                    sigmas_km=sigmas_km,
+                    period=args.period,
+                    skip_existing=skip_existing,
+                    verbose=verbose,
+                    output_format=args.output_format
+                )
+            else:
+                success = process_event(
+                    event=event,
+                    dataset=args.dataset,
+                    paths=paths,
+                    analogue_config=analogue_config,
+                    period=args.period,
+                    skip_existing=skip_existing,
+                    verbose=verbose,
+                    sigma_km_override=args.sigma_km,
+                    output_format=args.output_format
+                )
         else:
             # Process all events
             success = process_all_events(
                 dataset=args.dataset,
                 period=args.period,
                 skip_existing=skip_existing,
-                verbose=verbose
+                verbose=verbose,
+                sigmas_km=sigmas_km,
+                output_format=args.output_format
             )
         
         sys.exit(0 if success else 1)
@@ -27,8 +27,11 @@ except ImportError:
     raise
 
 from data_utils import load_env_setting, get_data_paths, ensure_dir
+from table_io import read_table
 
 GLOB_PATTERN = "analogues_*km.csv"
+# Parquet outputs (analogue_weights.py --output_format parquet); preferred over CSV
+PARQUET_GLOB_PATTERN = "analogues_*km.parquet"
 
 
 def extract_sigma_km(filepath: Path) -> Optional[int]:
@@ -38,25 +41,29 @@ def extract_sigma_km(filepath: Path) -> Optional[int]:
 
 
 def load_all_sigma_data(data_dir: Path) -> pd.DataFrame:
-    """Load all analogues_*km.csv files from data_dir into a single DataFrame."""
-    files = sorted(data_dir.glob(GLOB_PATTERN), key=lambda p: extract_sigma_km(p) or 0)
+    """Load all analogues_*km.csv / .parquet files from data_dir into a single DataFrame."""
+    parquet_files = list(data_dir.glob(PARQUET_GLOB_PATTERN))
+    parquet_stems = {p.stem for p in parquet_files}
+    csv_files = [p for p in data_dir.glob(GLOB_PATTERN) if p.stem not in parquet_stems]
+    files = sorted(parquet_files + csv_files, key=lambda p: extract_sigma_km(p) or 0)
     if not files:
-        raise FileNotFoundError(f"No files matching {GLOB_PATTERN} in {data_dir}")
+        raise FileNotFoundError(f"No files matching {GLOB_PATTERN} or {PARQUET_GLOB_PATTERN} in {data_dir}")
 
-    records = []
+    frames = []
     for fp in files:
         sigma = extract_sigma_km(fp)
         if sigma is None:
             continue
-        df = pd.read_csv(fp)
-        for _, row in df.iterrows():
-            records.append({
-                "sigma_km": sigma,
-                "date": row["date"],
-                "rank": row["rank"],
-                "period": row["period"],
-            })
-    return pd.DataFrame(records)
+        df = read_table(fp)
+        frames.append(pd.DataFrame({
+            "sigma_km": sigma,
+            "date": df["date"].dt.strftime("%Y-%m-%d"),
+            "rank": df["rank"],
+            "period": df["period"],
+        }))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
 
 
 def date_to_color(date_str: str, year_min: int, year_max: int) -> tuple:
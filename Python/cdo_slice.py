@@ -115,6 +115,7 @@ def create_sliced_anomaly(
     paths: Dict[str, Path],
     n_workers: int = 4,
     verbose: bool = True,
+    out_file: Optional[Path] = None,
 ) -> Path:
     """
     Create pre-sliced anomaly NetCDF using CDO (parallel over years).
@@ -123,7 +124,7 @@ def create_sliced_anomaly(
       - Time: ±snapshot_calendar_window days around snapshot_date
       - Space: event region (lat_min/max, lon_min/max)
 
-    Merges all years and writes to:
+    Merges all years and writes to out_file, by default:
       Data/F02_analogue_search/sliced/{dataset}/{event_name}/anomaly_{var}_sliced.nc
 
     Parameters
@@ -142,6 +143,8 @@ def create_sliced_anomaly(
         Number of parallel CDO processes
     verbose : bool
         Print progress
+    out_file : Path, optional
+        Output path (used by slice_cache to build into a cache entry)
 
     Returns
     -------
@@ -172,13 +175,13 @@ def create_sliced_anomaly(
     if not anom_dir.exists():
         raise FileNotFoundError(f"Anomaly directory not found: {anom_dir}")
 
-    out_dir = paths["data"] / "F02_analogue_search" / "sliced" / dataset / event_name
+    if out_file is None:
+        out_file = paths["data"] / "F02_analogue_search" / "sliced" / dataset / event_name / f"anomaly_{var}_sliced.nc"
+    out_dir = out_file.parent
     out_dir.mkdir(parents=True, exist_ok=True)
-    work_dir = out_dir / "_work"
+    work_dir = out_dir / f"_work_{out_file.stem}"
     work_dir.mkdir(parents=True, exist_ok=True)
 
-    out_file = out_dir / f"anomaly_{var}_sliced.nc"
-
     # Collect (year, input_path, start_date, end_date)
     tasks = []
     for year in range(start_year, end_year + 1):
@@ -244,11 +247,13 @@ def main():
     """CLI for CDO pre-slicing. Run before analogue_search.py."""
     import argparse
     from data_utils import load_env_setting, load_analogue_config, load_events_config, get_data_paths
+    from slice_cache import get_or_create_slice
 
     parser = argparse.ArgumentParser(description="CDO pre-slice anomaly data for analogue search")
     parser.add_argument("--dataset", required=True, choices=["era5", "mswx", "jra3q"])
     parser.add_argument("--event", required=True, help="Event name from extreme_events.yaml")
     parser.add_argument("--workers", type=int, default=4, help="Parallel CDO processes")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if a cached slice with the same inputs exists")
     parser.add_argument("--quiet", action="store_true")
     args = parser.parse_args()
 
@@ -268,16 +273,27 @@ def main():
         raise SystemExit(f"Event '{args.event}' lacks snapshot_date")
 
     match_var = analogue_config.get("distance", {}).get("match_variable", "psurf")
-    # Note: Shell script checks for existing sliced file before calling this script,
-    # so we proceed directly without redundant existence check here.
 
-    create_sliced_anomaly(
+    # Content-addressed: reuses a slice built for any event with the same
+    # domain/window/sources, and rebuilds when anomaly files or config change.
+    get_or_create_slice(
         dataset=args.dataset,
         var=match_var,
         event=event,
         analogue_config=analogue_config,
         paths=paths,
-        n_workers=args.workers,
+        slicer="cdo",
+        build=lambda out_file: create_sliced_anomaly(
+            dataset=args.dataset,
+            var=match_var,
+            event=event,
+            analogue_config=analogue_config,
+            paths=paths,
+            n_workers=args.workers,
+            verbose=not args.quiet,
+            out_file=out_file,
+        ),
+        force=args.force,
         verbose=not args.quiet,
     )
 
@@ -0,0 +1,308 @@
+"""
+Streaming day-of-year climatology and anomalies from yearly files.
+
+CDO's ydaymean needs all years in one file, so the CDO path first merges
+every yearly file into a temporary NetCDF as large as the inputs.  This
+engine reads the yearly files one at a time instead and accumulates, per
+calendar slot and grid point,
+
+    sum[slot]    sum of daily values
+    count[slot]  number of non-missing values
+
+Memory is bounded by the slot arrays (372 slots x grid), independent of
+the number of years.  Slots follow CDO's ydaystat convention,
+slot = (month - 1) * 31 + day - 1, so Feb 29 has its own slot and
+Mar 1 is the same slot in leap and non-leap years.
+
+In the same pass the engine can:
+  * accumulate several baseline periods (each year is read once and added
+    to every baseline that contains it);
+  * fit a smoothed climatology of n annual harmonics.  The fit is the
+    least-squares fit to all daily values, computed from slot means
+    weighted by counts, so it needs no second pass.
+
+Anomalies are then written per year directly against the climatology
+(no ydaysub temp files), in parallel worker processes.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from coord_schema import open_field
+
+N_SLOTS = 372
+# Leap reference year used to place slots on the annual cycle and to date
+# climatology time steps (as CDO does, one time step per calendar day)
+REFERENCE_YEAR = 2000
+
+# Variable encoding keys that pack values (dropped when writing anomalies)
+PACKING_KEYS = ("dtype", "scale_factor", "add_offset", "_FillValue", "missing_value", "_Unsigned")
+
+
+def calendar_slots(times) -> np.ndarray:
+    """CDO-style calendar slot (month - 1) * 31 + day - 1 for each time."""
+    t = pd.DatetimeIndex(times)
+    return ((t.month - 1) * 31 + t.day - 1).to_numpy()
+
+
+def _slot_dates() -> pd.DatetimeIndex:
+    """Every calendar day of the reference year, i.e. one date per valid slot."""
+    return pd.date_range(f"{REFERENCE_YEAR}-01-01", f"{REFERENCE_YEAR}-12-31", freq="D")
+
+
+def new_accumulator(grid_shape: Tuple[int, ...]) -> Dict[str, np.ndarray]:
+    """Empty per-slot sum/count arrays for one baseline."""
+    return {
+        "sum": np.zeros((N_SLOTS,) + tuple(grid_shape), dtype=np.float64),
+        "count": np.zeros((N_SLOTS,) + tuple(grid_shape), dtype=np.int32),
+    }
+
+
+def accumulate(acc: Dict[str, np.ndarray], values: np.ndarray, slots: np.ndarray) -> None:
+    """Add one block of daily values (time first) to the slot sums/counts."""
+    finite = np.isfinite(values)
+    if np.unique(slots).size == slots.size:
+        # One time step per slot (a yearly file): plain fancy indexing
+        acc["sum"][slots] += np.where(finite, values, 0.0)
+        acc["count"][slots] += finite
+    else:
+        # Repeated slots need unbuffered accumulation
+        np.add.at(acc["sum"], slots, np.where(finite, values, 0.0))
+        np.add.at(acc["count"], slots, finite.astype(np.int32))
+
+
+def slot_means(acc: Dict[str, np.ndarray]) -> np.ndarray:
+    """Mean per slot and grid point; NaN where no values were seen."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(acc["count"] > 0, acc["sum"] / np.maximum(acc["count"], 1), np.nan)
+
+
+def harmonic_fit(acc: Dict[str, np.ndarray], n_harmonics: int) -> np.ndarray:
+    """
+    Smoothed climatology: mean plus n annual harmonics, least-squares fit to all values.
+
+    Regressors depend only on the slot, so the fit to every daily value equals
+    the count-weighted fit to the slot means.  Evaluated on slots that had data
+    (NaN elsewhere, e.g. months not processed).
+    """
+    dates = _slot_dates()
+    slots = calendar_slots(dates)
+    phase = 2.0 * np.pi * (dates.dayofyear.to_numpy() - 1) / len(dates)
+    cols = [np.ones_like(phase)]
+    for k in range(1, n_harmonics + 1):
+        cols += [np.cos(k * phase), np.sin(k * phase)]
+    X = np.stack(cols, axis=1)                                   # (n_days, n_coef)
+
+    grid_shape = acc["sum"].shape[1:]
+    w = acc["count"][slots].reshape(len(slots), -1).astype(np.float64)
+    s = acc["sum"][slots].reshape(len(slots), -1)                 # sum = w * mean
+    A = np.einsum("sk,sp,sl->pkl", X, w, X)
+    b = np.einsum("sk,sp->pk", X, s)
+    coef = np.einsum("pkl,pl->pk", np.linalg.pinv(A), b)
+    fitted = X @ coef.T                                          # (n_days, n_points)
+
+    out = np.full(acc["sum"].shape, np.nan)
+    out[slots] = np.where(w > 0, fitted, np.nan).reshape((len(slots),) + grid_shape)
+    return out
+
+
+def stream_climatology(
+    year_files: Dict[int, Path],
+    baselines: Dict[str, Tuple[int, int]],
+    var: Optional[str] = None,
+    n_harmonics: int = 0,
+    verbose: bool = True,
+) -> Dict[str, Any]:
+    """
+    Day-of-year climatologies for several baselines in one pass over the yearly files.
+
+    Parameters
+    ----------
+    year_files : dict
+        year -> yearly file (daily values)
+    baselines : dict
+        name -> (start_year, end_year), inclusive
+    var : str, optional
+        Variable name (default: main variable of the files)
+    n_harmonics : int
+        If > 0, also fit a smoothed climatology with this many annual harmonics
+    verbose : bool
+        Print progress
+
+    Returns
+    -------
+    dict
+        'clim': name -> slot climatology (N_SLOTS, *grid), smoothed if
+        n_harmonics > 0; 'raw': name -> unsmoothed slot means;
+        'years': name -> years used; 'template': DataArray of the first
+        file (coords/attrs for writing); 'schema': its coordinate schema
+    """
+    accs: Dict[str, Dict[str, np.ndarray]] = {}
+    used: Dict[str, List[int]] = {name: [] for name in baselines}
+    template = schema = None
+
+    for year in sorted(year_files):
+        targets = [name for name, (y0, y1) in baselines.items() if y0 <= year <= y1]
+        if not targets:
+            continue
+        path = year_files[year]
+        with xr.open_dataset(path) as ds:
+            data, file_schema = open_field(ds, path, preferred_var=var)
+            data = data.transpose("time", ...)
+            values = data.values.astype(np.float64)
+            slots = calendar_slots(data["time"].values)
+            if template is None:
+                template, schema = data.isel(time=0, drop=True).load(), file_schema
+        if values.shape[1:] != template.shape:
+            raise ValueError(f"{Path(path).name}: grid {values.shape[1:]} differs from {template.shape}")
+        for name in targets:
+            if name not in accs:
+                accs[name] = new_accumulator(values.shape[1:])
+            accumulate(accs[name], values, slots)
+            used[name].append(year)
+        if verbose:
+            print(f"  [CLIM] {Path(path).name}: {len(slots)} days -> {', '.join(targets)}", flush=True)
+
+    missing = [name for name in baselines if name not in accs]
+    if missing:
+        raise ValueError(f"No yearly files inside baseline(s): {', '.join(missing)}")
+
+    raw = {name: slot_means(acc) for name, acc in accs.items()}
+    clim = {name: harmonic_fit(acc, n_harmonics) for name, acc in accs.items()} if n_harmonics > 0 else raw
+    return {"clim": clim, "raw": raw, "years": used, "template": template, "schema": schema}
+
+
+def climatology_dataarray(clim: np.ndarray, template: xr.DataArray, name: str) -> xr.DataArray:
+    """Slot climatology as a (time, ...) DataArray dated in the reference year, slots with data only."""
+    dates = _slot_dates()
+    slots = calendar_slots(dates)
+    keep = np.isfinite(clim[slots]).reshape(len(slots), -1).any(axis=1)
+    return xr.DataArray(
+        clim[slots[keep]].astype(np.float32),
+        coords={"time": dates[keep], **{d: template[d] for d in template.dims}},
+        dims=("time",) + template.dims,
+        attrs=template.attrs,
+        name=name,
+    )
+
+
+def write_climatology(
+    clim: np.ndarray,
+    template: xr.DataArray,
+    schema: Dict[str, Any],
+    out_path: Path,
+    name: str,
+    attrs: Optional[Dict[str, Any]] = None,
+) -> Path:
+    """Write a slot climatology as NetCDF (original coordinate names restored); atomic."""
+    da = climatology_dataarray(clim, template, name)
+    inverse = {v: k for k, v in schema["renames"].items() if v in da.dims or v in da.coords}
+    ds = da.to_dataset().rename(inverse) if inverse else da.to_dataset()
+    ds.attrs.update(attrs or {})
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(f".{out_path.name}.tmp{os.getpid()}")
+    ds.to_netcdf(tmp)
+    os.replace(tmp, out_path)
+    return out_path
+
+
+def read_climatology(path: Path, var: Optional[str] = None) -> np.ndarray:
+    """Read a climatology file (this engine's or CDO ydaymean output) back into slots."""
+    with xr.open_dataset(path) as ds:
+        data, _ = open_field(ds, path, preferred_var=var)
+        data = data.transpose("time", ...)
+        slots = calendar_slots(data["time"].values)
+        out = np.full((N_SLOTS,) + data.shape[1:], np.nan)
+        out[slots] = data.values
+    return out
+
+
+def write_anomaly(
+    src: Path,
+    dst: Path,
+    clim: np.ndarray,
+    var: Optional[str] = None,
+    out_name: Optional[str] = None,
+) -> int:
+    """
+    Write src minus the slot climatology to dst (like cdo ydaysub); atomic.
+
+    Returns
+    -------
+    int
+        Number of time steps written
+    """
+    with xr.open_dataset(src) as ds:
+        data, schema = open_field(ds, src, preferred_var=var)
+        var_name = out_name or schema["var"]
+        data = data.load()
+        time_axis = data.dims.index("time")
+        slots = calendar_slots(data["time"].values)
+        base = np.moveaxis(clim[slots], 0, time_axis)
+        stored = np.dtype(data.encoding.get("dtype", data.dtype))
+        dtype = data.dtype if np.issubdtype(stored, np.floating) else np.float32
+        anom = data.copy(data=(data.values - base).astype(dtype))
+        # Written as plain float like cdo ydaysub: the source's packing
+        # (int16 with scale_factor/add_offset) cannot hold values near zero
+        anom.encoding = {k: v for k, v in data.encoding.items() if k not in PACKING_KEYS}
+        anom.name = var_name
+        inverse = {v: k for k, v in schema["renames"].items()}
+        out = anom.to_dataset().rename(inverse) if inverse else anom.to_dataset()
+        out.attrs.update(ds.attrs)
+        time_name = inverse.get("time", "time")
+        out[time_name].encoding.update(
+            {k: v for k, v in ds[time_name].encoding.items() if k in ("units", "calendar", "dtype")}
+        )
+
+    dst = Path(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(f".{dst.name}.tmp{os.getpid()}")
+    out.to_netcdf(tmp)
+    os.replace(tmp, dst)
+    return len(slots)
+
+
+def _anomaly_task(args: tuple) -> Tuple[str, str, float]:
+    src, dst, clim_path, var, out_name = args
+    start = time.perf_counter()
+    try:
+        clim = read_climatology(clim_path, var=out_name or var)
+        write_anomaly(src, dst, clim, var=var, out_name=out_name)
+        status = "ok"
+    except Exception as e:  # reported per year by the caller
+        status = f"failed: {e}"
+    return str(dst), status, time.perf_counter() - start
+
+
+def write_anomalies(
+    pairs: Sequence[Tuple[Path, Path]],
+    climatology_path: Path,
+    var: Optional[str] = None,
+    out_name: Optional[str] = None,
+    n_workers: int = 1,
+) -> List[Tuple[str, str, float]]:
+    """
+    Anomalies for several (src, dst) yearly files against one climatology file.
+
+    Years are independent, so with n_workers > 1 they run in parallel worker
+    processes (spawned, each reading the small climatology file itself).
+
+    Returns
+    -------
+    list
+        (dst, 'ok' or 'failed: <reason>', seconds) per pair, in input order
+    """
+    tasks = [(Path(s), Path(d), Path(climatology_path), var, out_name) for s, d in pairs]
+    if n_workers <= 1 or len(tasks) <= 1:
+        return [_anomaly_task(t) for t in tasks]
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=get_context("spawn")) as pool:
+        return list(pool.map(_anomaly_task, tasks))
@@ -0,0 +1,257 @@
+"""
+Coordinate normalisation shared by the F02 tools.
+
+Anomaly files come with different coordinate names (latitude/lat,
+valid_time/time, ...), latitude orientation and longitude convention.
+detect_schema inspects a dataset once and records:
+
+    var             main field variable (bounds helpers skipped)
+    renames         coordinate renames to the standard lat/lon/time
+    lat_descending  latitude runs N -> S
+    lon_convention  '0_360' or '-180_180'
+    time_axis       position of time in the variable's dims (None if absent)
+
+Schemas of files opened by path are cached per file signature (path,
+mtime, size) and requested variable: in memory for the process, and as
+small JSON sidecars under Data/cache/coord_schema so later runs skip the
+introspection too.  Sidecars are named by a hash of the key, so a changed
+file gets a new one; stale sidecars are harmless and can be deleted.
+open_field applies a schema and sel_bbox slices with it.
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import xarray as xr
+
+from data_utils import get_root_dir
+
+PathLike = Union[str, Path]
+
+# Schemas kept in memory (one per file signature and requested variable)
+SCHEMA_CACHE_SIZE = 1024
+
+# Sidecar directory for schemas across runs; None keeps them in memory only
+SCHEMA_DIR: Optional[Path] = get_root_dir() / "Data" / "cache" / "coord_schema"
+
+# Bump when the schema layout changes
+SCHEMA_VERSION = 1
+
+_SCHEMAS: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+
+
+def _coord_target(name: str, coord: xr.DataArray) -> Optional[str]:
+    """Standard name (lat/lon/time) a coordinate maps to, from its name or CF attributes."""
+    cl = name.lower()
+    standard_name = str(coord.attrs.get("standard_name", "")).lower()
+    axis = str(coord.attrs.get("axis", "")).lower()
+    units = str(coord.attrs.get("units", "")).lower()
+    if "lat" in cl or standard_name == "latitude" or axis == "y" or "degrees_north" in units:
+        return "lat"
+    if "lon" in cl or standard_name == "longitude" or axis == "x" or "degrees_east" in units:
+        return "lon"
+    if "time" in cl or "valid" in cl or standard_name == "time" or axis == "t":
+        return "time"
+    return None
+
+
+def coord_renames(ds: xr.Dataset) -> Dict[str, str]:
+    """Renames that bring coordinate names to standard lat/lon/time when possible."""
+    renames: Dict[str, str] = {}
+    for name in ds.coords:
+        target = _coord_target(name, ds.coords[name])
+        if target is None or name == target:
+            continue
+        if target in ds.coords or target in ds.dims:
+            continue
+        if target in renames.values():
+            continue
+        renames[name] = target
+    return renames
+
+
+def select_primary_var(ds: xr.Dataset, preferred_var: Optional[str] = None) -> str:
+    """Select the main geophysical variable, avoiding bounds helper variables."""
+    if preferred_var and preferred_var in ds.data_vars:
+        return preferred_var
+
+    scored: List[Tuple[int, int, str]] = []
+    for name, da in ds.data_vars.items():
+        nl = name.lower()
+        if "bnd" in nl or "bound" in nl:
+            continue
+
+        dims_lower = [d.lower() for d in da.dims]
+        has_lat = any("lat" in d for d in dims_lower)
+        has_lon = any("lon" in d for d in dims_lower)
+        has_time = any(("time" in d) or ("valid" in d) for d in dims_lower)
+        score = (3 if has_lat and has_lon else 0) + (1 if has_time else 0) + da.ndim
+        scored.append((score, da.size, name))
+
+    if scored:
+        scored.sort(reverse=True)
+        return scored[0][2]
+
+    non_bounds = [n for n in ds.data_vars if "bnd" not in n.lower() and "bound" not in n.lower()]
+    if non_bounds:
+        return non_bounds[0]
+
+    var_names = list(ds.data_vars)
+    if not var_names:
+        raise ValueError("No data variables found in anomaly files")
+    return var_names[0]
+
+
+def lon_convention(lon: np.ndarray) -> str:
+    """'-180_180' if any longitude is negative, else '0_360'."""
+    return "-180_180" if np.size(lon) and float(np.min(lon)) < 0 else "0_360"
+
+
+def detect_schema(ds: xr.Dataset, preferred_var: Optional[str] = None) -> Dict[str, Any]:
+    """Inspect a dataset and return its schema (see module docstring)."""
+    renames = coord_renames(ds)
+    std = ds.rename(renames) if renames else ds
+    var = select_primary_var(std, preferred_var=preferred_var)
+    data = std[var]
+    if "lat" not in data.coords or "lon" not in data.coords:
+        raise ValueError(
+            f"Selected variable '{var}' has no lat/lon coords. "
+            f"dims={data.dims}, coords={list(data.coords)}"
+        )
+    lat = data["lat"].values
+    lon = data["lon"].values
+    return {
+        "var": var,
+        "renames": renames,
+        "lat_descending": bool(lat.size > 1 and lat[0] > lat[-1]),
+        "lon_convention": lon_convention(lon),
+        "time_axis": data.dims.index("time") if "time" in data.dims else None,
+    }
+
+
+def file_signature(paths: Union[PathLike, Iterable[PathLike]]) -> tuple:
+    """(path, mtime_ns, size) for one file or each of several files."""
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+    sig = []
+    for p in paths:
+        st = os.stat(p)
+        sig.append((os.path.realpath(p), st.st_mtime_ns, st.st_size))
+    return tuple(sig)
+
+
+def _sidecar_path(key: tuple) -> Path:
+    """Sidecar file of a (signature, preferred_var) key."""
+    digest = hashlib.sha1(json.dumps(key).encode()).hexdigest()
+    return SCHEMA_DIR / f"{digest}.json"
+
+
+def load_schema_sidecar(key: tuple) -> Optional[Dict[str, Any]]:
+    """Schema persisted for key, or None if missing, unreadable or outdated."""
+    if SCHEMA_DIR is None:
+        return None
+    try:
+        with open(_sidecar_path(key)) as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Lists on disk: compare with the key as it round-trips through JSON
+    if stored.get("version") != SCHEMA_VERSION or stored.get("key") != json.loads(json.dumps(key)):
+        return None
+    return stored.get("schema")
+
+
+def save_schema_sidecar(key: tuple, schema: Dict[str, Any]) -> None:
+    """Persist a schema atomically; best effort (an unwritable Data/ only costs a re-detect)."""
+    if SCHEMA_DIR is None:
+        return
+    path = _sidecar_path(key)
+    tmp = path.with_name(f".{path.name}.tmp{os.getpid()}")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, "w") as f:
+            json.dump({"version": SCHEMA_VERSION, "key": key, "schema": schema}, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def dataset_schema(
+    ds: xr.Dataset,
+    paths: Union[PathLike, Iterable[PathLike], None] = None,
+    preferred_var: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Schema of ds, cached (in memory and as a sidecar) by the signature of
+    the file(s) it was opened from.
+
+    Parameters
+    ----------
+    ds : xr.Dataset
+        Opened dataset
+    paths : path or list of paths, optional
+        File(s) ds was opened from; None skips the cache
+    preferred_var : str, optional
+        Variable to use when present
+
+    Returns
+    -------
+    dict
+        Schema (see module docstring)
+    """
+    if paths is None:
+        return detect_schema(ds, preferred_var)
+    key = (file_signature(paths), preferred_var)
+    schema = _SCHEMAS.get(key)
+    if schema is None:
+        schema = load_schema_sidecar(key)
+        if schema is None:
+            schema = detect_schema(ds, preferred_var)
+            save_schema_sidecar(key, schema)
+        _SCHEMAS[key] = schema
+        if len(_SCHEMAS) > SCHEMA_CACHE_SIZE:
+            _SCHEMAS.popitem(last=False)
+    else:
+        _SCHEMAS.move_to_end(key)
+    return schema
+
+
+def open_field(
+    ds: xr.Dataset,
+    paths: Union[PathLike, Iterable[PathLike], None] = None,
+    preferred_var: Optional[str] = None,
+) -> Tuple[xr.DataArray, Dict[str, Any]]:
+    """Main variable of ds with standard lat/lon/time coordinate names, and its schema."""
+    schema = dataset_schema(ds, paths, preferred_var)
+    if schema["renames"]:
+        ds = ds.rename(schema["renames"])
+    return ds[schema["var"]], schema
+
+
+def to_lon_convention(lon: float, convention: str) -> float:
+    """Express a longitude in the data's convention ('0_360' or '-180_180')."""
+    if convention == "-180_180":
+        return lon - 360 if lon > 180 else lon
+    return lon + 360 if lon < 0 else lon
+
+
+def sel_bbox(
+    data: xr.DataArray,
+    schema: Dict[str, Any],
+    lat_min: float,
+    lat_max: float,
+    lon_min: float,
+    lon_max: float,
+) -> xr.DataArray:
+    """Slice a standardised field to a bbox using the schema's orientation and lon convention."""
+    lat_slice = slice(lat_max, lat_min) if schema["lat_descending"] else slice(lat_min, lat_max)
+    lon_slice = slice(
+        to_lon_convention(lon_min, schema["lon_convention"]),
+        to_lon_convention(lon_max, schema["lon_convention"]),
+    )
+    return data.sel(lat=lat_slice, lon=lon_slice)
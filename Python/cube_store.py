@@ -0,0 +1,305 @@
+"""
+Memory-mapped cube store for analogue search.
+
+A store is a directory holding one (time, lat, lon) anomaly cube as:
+
+    data.f32    contiguous little-endian float32, C order (time, lat, lon)
+    time.npy    datetime64[ns] time index
+    meta.json   variable name, shape, lat/lon coordinates, attrs, sources
+
+Opening a store is a np.memmap over data.f32, so a query starts without
+decoding netCDF/HDF5, only the pages actually touched are read, and
+concurrent processes on the same node share those pages through the OS page
+cache.  The raw layout also makes appending new days a plain file append.
+
+Stores live next to the sliced netCDF files:
+
+    <data>/F02_analogue_search/store/<dataset>/<event>/<var>/
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from coord_schema import open_field
+
+STORE_DTYPE = np.dtype('<f4')
+DATA_FILE = 'data.f32'
+TIME_FILE = 'time.npy'
+META_FILE = 'meta.json'
+
+# Time steps copied per block while writing
+WRITE_CHUNK = 365
+
+
+def cube_store_path(paths: Dict[str, Path], dataset: str, event_name: str, var: str) -> Path:
+    """Store directory for one dataset / event domain / variable."""
+    return paths['data'] / 'F02_analogue_search' / 'store' / dataset / event_name / var
+
+
+def cube_store_exists(store_dir: Path) -> bool:
+    """True if store_dir holds a complete store."""
+    store_dir = Path(store_dir)
+    return all((store_dir / name).exists() for name in (DATA_FILE, TIME_FILE, META_FILE))
+
+
+def read_store_meta(store_dir: Path) -> Dict[str, Any]:
+    """Return the store's meta.json as a dict."""
+    with open(Path(store_dir) / META_FILE) as f:
+        return json.load(f)
+
+
+def netcdf_signature(nc_path: Path) -> str:
+    """'path:mtime_ns:size' of the file a store is built from (recorded in meta.json sources)."""
+    nc_path = Path(nc_path)
+    st = nc_path.stat()
+    return f"{nc_path.resolve()}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def cube_store_matches(store_dir: Path, nc_path: Path) -> bool:
+    """
+    True if the store was built from (or last appended with) nc_path as it is now.
+
+    Compares the mtime and size recorded in meta.json sources with the
+    file's; the path is not compared, so hard-linked or copied event files
+    (link_into_event fallbacks) still match their cache entry.
+    """
+    try:
+        sources = read_store_meta(store_dir).get('sources', [])
+        current = netcdf_signature(nc_path)
+    except (OSError, ValueError):
+        return False
+    return len(sources) == 1 and sources[0].rsplit(':', 2)[1:] == current.rsplit(':', 2)[1:]
+
+
+def _write_meta(store_dir: Path, meta: Dict[str, Any]) -> None:
+    tmp = store_dir / (META_FILE + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp, store_dir / META_FILE)
+
+
+def _json_attrs(attrs: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only attributes that survive a JSON round trip."""
+    out = {}
+    for key, value in attrs.items():
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, (str, int, float, bool)) or value is None:
+            out[str(key)] = value
+    return out
+
+
+def write_cube_store(
+    data: xr.DataArray,
+    store_dir: Path,
+    sources: Optional[List[str]] = None,
+    verbose: bool = True,
+) -> Path:
+    """
+    Write a (time, lat, lon) DataArray to a store, streaming over time blocks.
+
+    The store is built in a temporary sibling directory and moved into place,
+    so readers never see a partial store.  Values are stored as float32.
+
+    Parameters
+    ----------
+    data : xr.DataArray
+        Cube with dimensions (time, lat, lon); may be dask-backed
+    store_dir : Path
+        Target store directory (replaced if it exists)
+    sources : list of str, optional
+        Provenance recorded in meta.json (e.g. source file signatures)
+    verbose : bool
+        Print progress
+
+    Returns
+    -------
+    Path
+        The store directory
+    """
+    store_dir = Path(store_dir)
+    data = data.transpose('time', 'lat', 'lon')
+    shape = tuple(int(n) for n in data.shape)
+
+    tmp_dir = store_dir.with_name(store_dir.name + f'.tmp{os.getpid()}')
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    if verbose:
+        print(f"  Writing cube store: {store_dir} {shape}", flush=True)
+
+    out = np.memmap(tmp_dir / DATA_FILE, dtype=STORE_DTYPE, mode='w+', shape=shape)
+    for start in range(0, shape[0], WRITE_CHUNK):
+        sl = slice(start, min(start + WRITE_CHUNK, shape[0]))
+        out[sl] = np.asarray(data.isel(time=sl).values, dtype=STORE_DTYPE)
+    out.flush()
+    del out
+
+    np.save(tmp_dir / TIME_FILE, pd.to_datetime(data.time.values).values.astype('datetime64[ns]'))
+    _write_meta(tmp_dir, {
+        'var': str(data.name),
+        'shape': list(shape),
+        'dtype': STORE_DTYPE.str,
+        'lat': np.asarray(data.lat.values, dtype=np.float64).tolist(),
+        'lon': np.asarray(data.lon.values, dtype=np.float64).tolist(),
+        'attrs': _json_attrs(data.attrs),
+        'sources': list(sources or []),
+    })
+
+    if store_dir.exists():
+        shutil.rmtree(store_dir)
+    store_dir.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp_dir, store_dir)
+    return store_dir
+
+
+def open_cube_store(store_dir: Path, mode: str = 'r') -> xr.DataArray:
+    """
+    Open a store as a memory-mapped (time, lat, lon) DataArray.
+
+    encoding['source'] points at the raw data file, so distance_engine's
+    cube_signature (and hence its norm / sorted caches) works on stores
+    exactly as on sliced netCDF files.
+
+    Parameters
+    ----------
+    store_dir : Path
+        Store directory
+    mode : str
+        np.memmap mode ('r' read-only, 'r+' writable)
+
+    Returns
+    -------
+    xr.DataArray
+        Memory-mapped cube
+    """
+    store_dir = Path(store_dir)
+    meta = read_store_meta(store_dir)
+    times = np.load(store_dir / TIME_FILE)
+    shape = tuple(meta['shape'])
+    # time.npy may hold the times of an append interrupted before meta.json was replaced
+    times = times[:shape[0]]
+    if shape[0] != times.shape[0]:
+        raise ValueError(f"Cube store {store_dir} is inconsistent: shape {shape}, {times.shape[0]} times")
+
+    if shape[0] == 0:
+        values = np.empty(shape, dtype=np.dtype(meta['dtype']))
+    else:
+        values = np.memmap(store_dir / DATA_FILE, dtype=np.dtype(meta['dtype']), mode=mode, shape=shape)
+    da = xr.DataArray(
+        values,
+        coords={'time': times, 'lat': np.asarray(meta['lat']), 'lon': np.asarray(meta['lon'])},
+        dims=['time', 'lat', 'lon'],
+        name=meta['var'],
+        attrs=meta.get('attrs', {}),
+    )
+    da.encoding['source'] = str(store_dir / DATA_FILE)
+    return da
+
+
+def append_to_cube_store(
+    data: xr.DataArray,
+    store_dir: Path,
+    sources: Optional[List[str]] = None,
+    verbose: bool = True,
+) -> int:
+    """
+    Append new time steps to an existing store.
+
+    Only time steps later than the store's last one are written; they are
+    written to data.f32 after the frames meta.json records (truncating any
+    bytes an interrupted append left behind), then time.npy and meta.json
+    are replaced.  meta.json is replaced last, so until then readers and
+    later appends still see the old store.  The grid must match the store's.
+
+    Parameters
+    ----------
+    data : xr.DataArray
+        (time, lat, lon) cube on the store's grid; may overlap the store in time
+    store_dir : Path
+        Existing store directory
+    sources : list of str, optional
+        Provenance replacing the store's recorded sources
+    verbose : bool
+        Print progress
+
+    Returns
+    -------
+    int
+        Number of time steps appended
+    """
+    store_dir = Path(store_dir)
+    meta = read_store_meta(store_dir)
+    # meta.json is the commit point: ignore times of an interrupted append
+    n_old = int(meta['shape'][0])
+    times = np.load(store_dir / TIME_FILE)[:n_old]
+    data = data.transpose('time', 'lat', 'lon')
+
+    if (not np.allclose(np.asarray(data.lat.values, dtype=np.float64), meta['lat'])
+            or not np.allclose(np.asarray(data.lon.values, dtype=np.float64), meta['lon'])):
+        raise ValueError(f"Cannot append to {store_dir}: lat/lon grid differs from the store")
+
+    new_times = pd.to_datetime(data.time.values).values.astype('datetime64[ns]')
+    if len(times) > 0:
+        keep = new_times > times[-1]
+        data = data.isel(time=np.flatnonzero(keep))
+        new_times = new_times[keep]
+    n_new = len(new_times)
+    if n_new == 0:
+        if sources is not None:
+            set_store_sources(store_dir, sources)
+        return 0
+
+    if verbose:
+        print(f"  Appending {n_new} time steps to cube store: {store_dir}", flush=True)
+
+    frame_bytes = int(np.prod(meta['shape'][1:])) * np.dtype(meta['dtype']).itemsize
+    with open(store_dir / DATA_FILE, 'r+b') as f:
+        f.truncate(n_old * frame_bytes)
+        f.seek(n_old * frame_bytes)
+        for start in range(0, n_new, WRITE_CHUNK):
+            sl = slice(start, min(start + WRITE_CHUNK, n_new))
+            f.write(np.ascontiguousarray(data.isel(time=sl).values, dtype=STORE_DTYPE).tobytes())
+
+    tmp = store_dir / ('time.tmp.npy')
+    np.save(tmp, np.concatenate([times, new_times]))
+    os.replace(tmp, store_dir / TIME_FILE)
+    meta['shape'][0] += n_new
+    if sources is not None:
+        meta['sources'] = list(sources)
+    _write_meta(store_dir, meta)
+    return n_new
+
+
+def set_store_sources(store_dir: Path, sources: List[str]) -> None:
+    """Replace the provenance recorded in a store's meta.json."""
+    meta = read_store_meta(store_dir)
+    meta['sources'] = list(sources)
+    _write_meta(Path(store_dir), meta)
+
+
+def store_from_netcdf(nc_path: Path, store_dir: Path, var: Optional[str] = None, verbose: bool = True) -> Path:
+    """
+    Build a store from an existing sliced netCDF file (streamed by time chunk).
+
+    The variable and its coordinates go through coord_schema.open_field, as
+    in load_anomaly_data, so latitude/longitude-named inputs give a store
+    with the standard lat/lon/time dimensions.
+    """
+    nc_path = Path(nc_path)
+    with xr.open_dataset(nc_path, chunks={'time': WRITE_CHUNK}) as ds:
+        data, _ = open_field(ds, nc_path, preferred_var=var)
+        return write_cube_store(
+            data,
+            store_dir,
+            sources=[netcdf_signature(nc_path)],
+            verbose=verbose,
+        )
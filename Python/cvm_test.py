@@ -22,21 +22,29 @@ Usage:
 
 import argparse
 import os
-import tempfile
-import zipfile
 from datetime import datetime
 from pathlib import Path
 from typing import List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
-import xarray as xr
 import yaml
 from scipy import stats
 
+from data_slice_io import (
+    MASK_CACHE_DIR,
+    SERIES_CACHE_DIR,
+    bbox_grid,
+    data_slice_file_path,
+    load_domain_mean_series,
+    read_day_domain_mean,
+    series_value,
+)
+from mask_registry import land_mask as load_land_mask
+from table_io import find_table, read_table
+
 # Reuse constants from plot_t2m_boxplot
 K2C = 273.15
-LAND_THRESHOLD = 0.5
 DEFAULT_LSM_PATH = os.environ.get(
     "ERA5_LSM_PATH",
     str(Path(__file__).resolve().parent.parent
@@ -92,139 +100,18 @@ def get_boxplot_bbox(event_cfg: dict) -> tuple:
 
 def load_analogues(csv_path: str, n_members: int) -> Tuple[List, List]:
     """Return (past_list, present_list) of analogue dicts with date, period, rank.
-    Up to n_members per group."""
-    df = pd.read_csv(csv_path)
-    past, present = [], []
-    for _, r in df.iterrows():
-        date = datetime(int(r["year"]), int(r["month"]), int(r["day"]))
-        entry = {"date": date, "period": r["period"], "rank": int(r["rank"])}
-        if r["period"] == "past" and r["rank"] <= n_members:
-            past.append(entry)
-        elif r["period"] == "present" and r["rank"] <= n_members:
-            present.append(entry)
-    past = sorted(past, key=lambda x: x["rank"])[:n_members]
-    present = sorted(present, key=lambda x: x["rank"])[:n_members]
-    return past, present
-
-
-def data_slice_file_path(data_dir: str, d: datetime) -> str:
-    return os.path.join(data_dir, f"{d.year}{d.month:02d}.nc")
-
-
-def open_t2m_dataset(path: str) -> xr.Dataset:
-    """Open data-slice dataset, handling both plain NetCDF and ZIP archives.
-    Data slices can be YYYYMM.nc (NetCDF) or ZIP containing 2m_temperature*.nc"""
-    with open(path, "rb") as f:
-        magic = f.read(4)
-    if magic == b"PK\x03\x04":
-        with zipfile.ZipFile(path, "r") as z:
-            t2m_name = None
-            for n in z.namelist():
-                if "2m_temperature" in n or "t2m" in n.lower():
-                    t2m_name = n
-                    break
-            if t2m_name is None:
-                raise ValueError(f"No 2m_temperature/t2m file in zip {path}")
-            with tempfile.NamedTemporaryFile(suffix=".nc", delete=False) as tmp:
-                tmp.write(z.read(t2m_name))
-                tmp_path = tmp.name
-        try:
-            ds = xr.open_dataset(tmp_path, engine="netcdf4")
-            os.unlink(tmp_path)
-        except Exception:
-            os.unlink(tmp_path)
-            raise
-        return ds
-    return xr.open_dataset(path, engine="netcdf4")
-
-
-def load_land_mask(
-    lsm_path: str,
-    lat_min: float,
-    lat_max: float,
-    lon_min: float,
-    lon_max: float,
-    t2m_template: xr.DataArray,
-) -> np.ndarray:
-    """Return 2D boolean (True=land)."""
-    ds = xr.open_dataset(lsm_path, engine="netcdf4")
-    lsm = ds["lsm"].isel(time=0)
-    if str(lsm.dtype) in ("int16", "int32"):
-        sf = float(getattr(ds["lsm"], "scale_factor", 1.0))
-        ao = float(getattr(ds["lsm"], "add_offset", 0.0))
-        lsm = lsm.astype(np.float64) * sf + ao
-    lon = lsm.coords["longitude"]
-    lat_coord = lsm.coords["latitude"]
-    lon_0_360 = float(lon.min()) >= 0
-    lat_desc = float(lat_coord[0]) > float(lat_coord[-1])
-    # bbox lon is 0–360; convert to LSM convention for selection
-    if lon_0_360:
-        lon_lo, lon_hi = lon_min, lon_max
-    else:
-        # LSM uses -180 to 180; convert bbox 0–360 -> -180–180
-        lon_lo = lon_min - 360 if lon_min > 180 else lon_min
-        lon_hi = lon_max - 360 if lon_max > 180 else lon_max
-    # LSM lat: use slice(lat_max, lat_min) when descending (90 -> -90)
-    lat_slice = slice(lat_max, lat_min) if lat_desc else slice(lat_min, lat_max)
-    lsm_sub = lsm.sel(
-        latitude=lat_slice,
-        longitude=slice(lon_lo, lon_hi),
-    )
-    # reindex_like needs matching lon convention: convert t2m -180-180 -> 0-360
-    # so nearest-neighbor works (xarray does not handle lon wraparound)
-    tpl = t2m_template
-    tpl_lon = tpl.coords["longitude"]
-    if float(tpl_lon.min()) < 0 and lon_0_360:
-        lon_0360 = tpl_lon.where(tpl_lon >= 0, tpl_lon + 360)
-        tpl = tpl.assign_coords(longitude=lon_0360)
-    lsm_aligned = lsm_sub.reindex_like(tpl, method="nearest")
-    land = (lsm_aligned.values >= LAND_THRESHOLD).squeeze()
-    ds.close()
-    return land
-
-
-def get_t2m_snapshot_value(
-    snapshot_date: datetime,
-    data_dir: str,
-    lat_min: float,
-    lat_max: float,
-    lon_min: float,
-    lon_max: float,
-    land_mask: Optional[np.ndarray],
-) -> float:
-    """Return daily max T2m domain mean at snapshot date (°C). One scalar per analogue."""
-    path = data_slice_file_path(data_dir, snapshot_date)
-    if not os.path.isfile(path):
-        raise FileNotFoundError(path)
-    ds = open_t2m_dataset(path)
-    t2m = ds["t2m"]
-    lat_slice = slice(lat_max, lat_min) if lat_max > lat_min else slice(lat_min, lat_max)
-    data_lon = t2m.coords["longitude"]
-    if float(data_lon.min()) < 0:
-        sel_lo = lon_min - 360 if lon_min > 180 else lon_min
-        sel_hi = lon_max - 360 if lon_max > 180 else lon_max
-    else:
-        sel_lo, sel_hi = lon_min, lon_max
-    sub = t2m.sel(
-        latitude=lat_slice,
-        longitude=slice(sel_lo, sel_hi),
-    )
-    vals = (sub.values - K2C).astype(np.float64)
-    if land_mask is not None and land_mask.size > 0:
-        mask_bc = np.broadcast_to(land_mask, vals.shape)
-        vals = np.where(mask_bc, vals, np.nan)
-    # Snapshot date: need the day index for that month
-    day_idx = snapshot_date.day - 1
-    if vals.ndim == 3:  # (time, lat, lon)
-        daily_vals = np.nanmean(vals, axis=(1, 2))
-    else:
-        daily_vals = np.nanmean(vals, axis=tuple(range(1, vals.ndim)))
-    if day_idx >= len(daily_vals):
-        ds.close()
-        return np.nan
-    out = float(np.nanmean(daily_vals[day_idx]))
-    ds.close()
-    return out
+    Up to n_members per group. Reads analogues.csv or analogues.parquet."""
+    df = read_table(find_table(Path(csv_path)))
+    df = df.assign(date=pd.to_datetime(df[["year", "month", "day"]]))
+    groups = []
+    for period in ("past", "present"):
+        sub = df[(df["period"] == period) & (df["rank"] <= n_members)]
+        sub = sub.sort_values("rank", kind="stable").head(n_members)
+        groups.append([
+            {"date": d.to_pydatetime(), "period": period, "rank": int(r)}
+            for d, r in zip(sub["date"], sub["rank"])
+        ])
+    return groups[0], groups[1]
 
 
 def cramer_von_mises_permutation(
@@ -269,6 +156,14 @@ def main():
     parser.add_argument("--no-land-mask", action="store_true", help="Use all points, not land only")
     parser.add_argument("--nperm", type=int, default=10000, help="Permutations for test 2")
     parser.add_argument("--seed", type=int, default=42, help="RNG seed for permutations")
+    parser.add_argument("--series-cache", default=os.environ.get("T2M_SERIES_CACHE"),
+                        help="Directory for cached domain-mean T2m series (default: Data/cache/t2m_series)")
+    parser.add_argument("--no-series-cache", action="store_true",
+                        help="Do not use the cached series; read only the needed days from the monthly files")
+    parser.add_argument("--mask-cache", default=os.environ.get("T2M_MASK_CACHE"),
+                        help="Directory for land masks aligned to the T2m grid (default: Data/cache/masks)")
+    parser.add_argument("--no-mask-cache", action="store_true",
+                        help="Align the land mask from the LSM file without caching")
     args = parser.parse_args()
 
     event_cfg = load_event_config(args.events_yaml, args.event)
@@ -279,39 +174,45 @@ def main():
         print("ERROR: Need at least one past and one present analogue")
         return 1
 
+    # Land mask aligned to the T2m bbox grid once and kept in the mask registry
     land_mask = None
     if not args.no_land_mask:
         path0 = data_slice_file_path(args.data_dir, past_analogues[0]["date"])
-        if os.path.isfile(path0):
-            with open_t2m_dataset(path0) as ds0:
-                t2m0 = ds0["t2m"]
-                lat_slice = slice(lat_max, lat_min) if lat_max > lat_min else slice(lat_min, lat_max)
-                data_lon = t2m0.coords["longitude"]
-                if float(data_lon.min()) < 0:
-                    sel_lo = lon_min - 360 if lon_min > 180 else lon_min
-                    sel_hi = lon_max - 360 if lon_max > 180 else lon_max
-                else:
-                    sel_lo, sel_hi = lon_min, lon_max
-                t2m_sub = t2m0.sel(
-                    latitude=lat_slice,
-                    longitude=slice(sel_lo, sel_hi),
-                )
-                if os.path.isfile(args.lsm_path):
-                    land_mask = load_land_mask(
-                        args.lsm_path, lat_min, lat_max, lon_min, lon_max, t2m_sub
-                    )
-                    if np.sum(land_mask) == 0:
-                        print("WARN: No land points in LSM; using all points")
-                        land_mask = None
+        if os.path.isfile(path0) and os.path.isfile(args.lsm_path):
+            bbox = (lat_min, lat_max, lon_min, lon_max)
+            grid_lat, grid_lon = bbox_grid(path0, *bbox)
+            land_mask = load_land_mask(
+                args.lsm_path, bbox, grid_lat, grid_lon,
+                cache_dir=None if args.no_mask_cache
+                else args.mask_cache or str(MASK_CACHE_DIR),
+            )["mask"]
+            if np.sum(land_mask) == 0:
+                print("WARN: No land points in LSM; using all points")
+                land_mask = None
+
+    # Daily domain-mean T2m for all months, computed once per (bbox, mask);
+    # shared with plot_t2m_boxplot.py for the same data dir, bbox and mask.
+    # Without the cache only the needed days are read (one hyperslab each).
+    if args.no_series_cache:
+        def snapshot_value(d: datetime) -> float:
+            return read_day_domain_mean(
+                args.data_dir, d, lat_min, lat_max, lon_min, lon_max, land_mask,
+            )
+    else:
+        series = load_domain_mean_series(
+            args.data_dir,
+            (lat_min, lat_max, lon_min, lon_max),
+            land_mask,
+            cache_dir=args.series_cache or str(SERIES_CACHE_DIR),
+        )
+
+        def snapshot_value(d: datetime) -> float:
+            return series_value(series, d)
 
     past_vals = []
     for a in past_analogues:
         try:
-            v = get_t2m_snapshot_value(
-                a["date"], args.data_dir,
-                lat_min, lat_max, lon_min, lon_max,
-                land_mask,
-            )
+            v = snapshot_value(a["date"])
             if not np.isnan(v):
                 past_vals.append(v)
         except FileNotFoundError as e:
@@ -319,11 +220,7 @@ def main():
     present_vals = []
     for a in present_analogues:
         try:
-            v = get_t2m_snapshot_value(
-                a["date"], args.data_dir,
-                lat_min, lat_max, lon_min, lon_max,
-                land_mask,
-            )
+            v = snapshot_value(a["date"])
             if not np.isnan(v):
                 present_vals.append(v)
         except FileNotFoundError as e:
@@ -345,15 +242,7 @@ def main():
     snapshot_dt = parse_snapshot_datetime(event_cfg)
     target_t2m = np.nan
     try:
-        target_t2m = get_t2m_snapshot_value(
-            snapshot_dt,
-            args.data_dir,
-            lat_min,
-            lat_max,
-            lon_min,
-            lon_max,
-            land_mask,
-        )
+        target_t2m = snapshot_value(snapshot_dt)
     except FileNotFoundError as e:
         print(f"WARN: Target snapshot file missing for Gaussian tail stats: {e}")
 
@@ -10,15 +10,30 @@ Faster than CDO approach because:
 Slices anomaly data to:
   - Time: ±snapshot_calendar_window days around snapshot_date (for each year)
   - Space: lat/lon bounding box from event region
+
+With --store the slice is also written as a memory-mapped cube store
+(see cube_store.py), which analogue_search.py opens in preference to the
+netCDF file.
+
+With --all-events every event in extreme_events.yaml is sliced in a single
+pass that reads each yearly anomaly file once.
+
+With --incremental, new days in the anomaly archive are appended to the
+event's previous slice (and cube store) instead of rebuilding it.
+
+With --prune, slice cache entries (and the cube stores inside them) that no
+event links to any more are deleted afterwards; --prune alone only prunes.
 """
 
+import os
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 import numpy as np
 import pandas as pd
 import xarray as xr
 
+from coord_schema import open_field, sel_bbox
 
 def compute_calendar_mask(
     times: pd.DatetimeIndex,
@@ -63,90 +78,6 @@ def compute_calendar_mask(
     return mask
 
 
-def _standardize_dataset_coords(ds: xr.Dataset) -> xr.Dataset:
-    """
-    Rename coordinate names to standard lat/lon/time when possible.
-    """
-    coord_renames: Dict[str, str] = {}
-
-    for coord in ds.coords:
-        c = ds.coords[coord]
-        cl = coord.lower()
-        standard_name = str(c.attrs.get("standard_name", "")).lower()
-        axis = str(c.attrs.get("axis", "")).lower()
-        units = str(c.attrs.get("units", "")).lower()
-
-        target = None
-        if (
-            "lat" in cl
-            or standard_name == "latitude"
-            or axis == "y"
-            or "degrees_north" in units
-        ):
-            target = "lat"
-        elif (
-            "lon" in cl
-            or standard_name == "longitude"
-            or axis == "x"
-            or "degrees_east" in units
-        ):
-            target = "lon"
-        elif (
-            "time" in cl
-            or "valid" in cl
-            or standard_name == "time"
-            or axis == "t"
-        ):
-            target = "time"
-
-        if target is None or coord == target:
-            continue
-        if target in ds.coords or target in ds.dims:
-            continue
-        if target in coord_renames.values():
-            continue
-        coord_renames[coord] = target
-
-    if coord_renames:
-        ds = ds.rename(coord_renames)
-    return ds
-
-
-def _select_primary_var(ds: xr.Dataset, preferred_var: Optional[str] = None) -> str:
-    """
-    Select the main geophysical variable, avoiding bounds helper variables.
-    """
-    if preferred_var and preferred_var in ds.data_vars:
-        return preferred_var
-
-    scored = []
-    for name, da in ds.data_vars.items():
-        nl = name.lower()
-        if "bnd" in nl or "bound" in nl:
-            continue
-
-        dims_lower = [d.lower() for d in da.dims]
-        has_lat = any("lat" in d for d in dims_lower)
-        has_lon = any("lon" in d for d in dims_lower)
-        has_time = any(("time" in d) or ("valid" in d) for d in dims_lower)
-
-        score = (3 if has_lat and has_lon else 0) + (1 if has_time else 0) + da.ndim
-        scored.append((score, da.size, name))
-
-    if scored:
-        scored.sort(reverse=True)
-        return scored[0][2]
-
-    non_bounds = [n for n in ds.data_vars if "bnd" not in n.lower() and "bound" not in n.lower()]
-    if non_bounds:
-        return non_bounds[0]
-
-    var_names = list(ds.data_vars)
-    if not var_names:
-        raise ValueError("No data variables in anomaly files")
-    return var_names[0]
-
-
 def create_sliced_anomaly_dask(
     dataset: str,
     var: str,
@@ -155,6 +86,7 @@ def create_sliced_anomaly_dask(
     paths: Dict[str, Path],
     n_workers: int = 8,
     verbose: bool = True,
+    out_file: Optional[Path] = None,
 ) -> Path:
     """
     Create pre-sliced anomaly NetCDF using dask/xarray.
@@ -178,6 +110,8 @@ def create_sliced_anomaly_dask(
         Number of dask workers/threads
     verbose : bool
         Print progress
+    out_file : Path, optional
+        Output path (default: sliced/<dataset>/<event>/anomaly_<var>_sliced.nc)
 
     Returns
     -------
@@ -207,9 +141,9 @@ def create_sliced_anomaly_dask(
     if not anom_dir.exists():
         raise FileNotFoundError(f"Anomaly directory not found: {anom_dir}")
 
-    out_dir = paths["data"] / "F02_analogue_search" / "sliced" / dataset / event_name
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_file = out_dir / f"anomaly_{var}_sliced.nc"
+    if out_file is None:
+        out_file = paths["data"] / "F02_analogue_search" / "sliced" / dataset / event_name / f"anomaly_{var}_sliced.nc"
+    out_file.parent.mkdir(parents=True, exist_ok=True)
 
     # Collect anomaly files
     anom_files = []
@@ -239,17 +173,9 @@ def create_sliced_anomaly_dask(
         engine='netcdf4',
     )
     
-    ds = _standardize_dataset_coords(ds)
-
     # Select the requested variable when available; avoid bounds vars like time_bnds.
-    selected_var = _select_primary_var(ds, preferred_var=var)
-    data_var = ds[selected_var]
-
-    if "lat" not in data_var.coords or "lon" not in data_var.coords:
-        raise ValueError(
-            f"Selected variable '{selected_var}' has no lat/lon coords. "
-            f"dims={data_var.dims}, coords={list(data_var.coords)}"
-        )
+    data_var, schema = open_field(ds, anom_files, preferred_var=var)
+    selected_var = schema["var"]
     
     if verbose:
         print(f"  Using variable: {selected_var}", flush=True)
@@ -259,11 +185,8 @@ def create_sliced_anomaly_dask(
     if verbose:
         print("  Slicing to bbox...", flush=True)
     
-    # Handle lat direction (could be N->S or S->N)
-    if data_var.lat[0] > data_var.lat[-1]:
-        data_var = data_var.sel(lat=slice(lat_max, lat_min), lon=slice(lon_min, lon_max))
-    else:
-        data_var = data_var.sel(lat=slice(lat_min, lat_max), lon=slice(lon_min, lon_max))
+    # Lat direction (N->S or S->N) and lon convention come from the schema
+    data_var = sel_bbox(data_var, schema, lat_min, lat_max, lon_min, lon_max)
     
     if verbose:
         print(f"  After bbox: {dict(data_var.sizes)}", flush=True)
@@ -289,8 +212,9 @@ def create_sliced_anomaly_dask(
     if verbose:
         print("  Writing to NetCDF (this may take a while)...", flush=True)
     
-    # Convert to dataset for writing
-    out_ds = data_var.to_dataset(name=selected_var)
+    # Convert to dataset for writing; named var like the sequential and multi
+    # slicers, so all Python slicers produce the same cached file
+    out_ds = data_var.to_dataset(name=var)
     
     # Compute time/lat/lon sizes safely
     n_time = data_var.sizes.get('time', len(data_var.time))
@@ -299,7 +223,7 @@ def create_sliced_anomaly_dask(
     
     # Use compression for smaller file
     encoding = {
-        selected_var: {
+        var: {
             'zlib': True,
             'complevel': 4,
             'chunksizes': (min(365, n_time), n_lat, n_lon),
@@ -318,6 +242,143 @@ def create_sliced_anomaly_dask(
     return out_file
 
 
+def _lazy_year_slice(
+    ds: xr.Dataset,
+    f: Path,
+    var: str,
+    region: Dict[str, float],
+    snapshot_date: pd.Timestamp,
+    window_days: int,
+) -> xr.DataArray:
+    """Cut an open yearly anomaly dataset to the event bbox and calendar window (lazy)."""
+    lat_min, lat_max = region["lat_min"], region["lat_max"]
+    lon_min, lon_max = region["lon_min"], region["lon_max"]
+
+    try:
+        data, schema = open_field(ds, f, preferred_var=var)
+    except ValueError as e:
+        raise ValueError(f"{f.name}: {e}") from None
+
+    # Slice to bbox
+    data = sel_bbox(data, schema, lat_min, lat_max, lon_min, lon_max)
+
+    # Slice to calendar window
+    times = pd.to_datetime(data.time.values)
+    mask = compute_calendar_mask(times, snapshot_date, window_days)
+    return data.isel(time=mask)
+
+
+def _slice_year_file(
+    f: Path,
+    var: str,
+    region: Dict[str, float],
+    snapshot_date: pd.Timestamp,
+    window_days: int,
+) -> xr.DataArray:
+    """Load one yearly anomaly file cut to the event bbox and calendar window."""
+    with xr.open_dataset(f) as ds:
+        # Load into memory
+        return _lazy_year_slice(ds, f, var, region, snapshot_date, window_days).load()
+
+
+# Time encoding carried from the source files to the sliced file
+_TIME_ENCODING_KEYS = ("units", "calendar", "dtype")
+
+
+def _year_layout(
+    f: Path,
+    var: str,
+    region: Dict[str, float],
+    snapshot_date: pd.Timestamp,
+    window_days: int,
+) -> Dict[str, Any]:
+    """
+    Shape and coordinates of one year's slice, read from metadata only.
+
+    Runs in a worker process; returns plain arrays/dicts so it pickles cheaply.
+    """
+    with xr.open_dataset(f) as ds:
+        data = _lazy_year_slice(ds, f, var, region, snapshot_date, window_days)
+        return {
+            "times": np.sort(data.time.values),
+            "lat": data.lat.values,
+            "lon": data.lon.values,
+            "dims": data.dims,
+            "dtype": data.dtype.str,
+            "attrs": dict(data.attrs),
+            "time_encoding": {k: v for k, v in data.time.encoding.items() if k in _TIME_ENCODING_KEYS},
+        }
+
+
+def _slice_year_into(
+    f: Path,
+    var: str,
+    region: Dict[str, float],
+    snapshot_date: pd.Timestamp,
+    window_days: int,
+    buffer_file: Path,
+    dtype: str,
+    shape: tuple,
+    offset: int,
+) -> int:
+    """
+    Slice one year and write it into rows [offset, offset + n) of a raw buffer file.
+
+    Runs in a worker process: each worker opens its own netCDF file and the
+    shared buffer as a memmap, so there is no HDF5 state shared between
+    processes and only one year is held in memory per worker.
+    """
+    data = _slice_year_file(f, var, region, snapshot_date, window_days).sortby("time")
+    n = data.sizes["time"]
+    if n > 0:
+        out = np.memmap(buffer_file, dtype=np.dtype(dtype), mode="r+", shape=shape)
+        out[offset:offset + n] = data.transpose("time", "lat", "lon").values
+        out.flush()
+        del out
+    return n
+
+
+def _run_year_tasks(func, tasks: List[tuple], n_workers: int) -> List[Any]:
+    """Run func(*task) for every task, in spawned worker processes if n_workers > 1."""
+    if n_workers <= 1 or len(tasks) <= 1:
+        return [func(*t) for t in tasks]
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    # spawn: workers start clean, with no HDF5/netCDF state inherited from the parent
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=ctx) as ex:
+        futures = [ex.submit(func, *t) for t in tasks]
+        return [fut.result() for fut in futures]
+
+
+def _write_buffer_netcdf(
+    buffer_file: Path,
+    layout: Dict[str, Any],
+    shape: tuple,
+    times: np.ndarray,
+    var: str,
+    out_file: Path,
+) -> None:
+    """Stream a raw (time, lat, lon) buffer to a compressed netCDF in time chunks."""
+    import dask.array as dsa
+
+    # Only one chunk is in memory at a time
+    buf = np.memmap(buffer_file, dtype=np.dtype(layout["dtype"]), mode="r", shape=shape)
+    combined = xr.DataArray(
+        dsa.from_array(buf, chunks=(365, shape[1], shape[2])),
+        coords={"time": times, "lat": layout["lat"], "lon": layout["lon"]},
+        dims=("time", "lat", "lon"),
+        attrs=layout["attrs"],
+    )
+    combined.time.encoding.update(layout["time_encoding"])
+
+    # Write with compression
+    out_ds = combined.to_dataset(name=var)
+    out_ds.to_netcdf(out_file, encoding={var: {'zlib': True, 'complevel': 4}})
+    del combined, out_ds, buf
+
+
 def create_sliced_anomaly_sequential(
     dataset: str,
     var: str,
@@ -325,11 +386,20 @@ def create_sliced_anomaly_sequential(
     analogue_config: Dict[str, Any],
     paths: Dict[str, Path],
     verbose: bool = True,
+    out_file: Optional[Path] = None,
+    n_workers: int = 1,
 ) -> Path:
     """
-    Create pre-sliced anomaly NetCDF by processing files sequentially.
+    Create pre-sliced anomaly NetCDF by processing year files independently.
     
-    Safer fallback that avoids threading issues - processes year by year.
+    Safer alternative to the dask slicer that avoids threading issues: each
+    year file is opened on its own, optionally in a pool of n_workers spawned
+    processes.  A first pass reads only metadata to fix every year's row
+    offset; years are then sliced straight into a preallocated on-disk buffer,
+    which is streamed to the output in time chunks.  Memory is bounded by
+    n_workers years plus one write chunk, independent of the number of years.
+
+    Writes to out_file if given, else sliced/<dataset>/<event>/anomaly_<var>_sliced.nc.
     """
     event_name = event["name"]
     snapshot_date = pd.Timestamp(event["snapshot_date"])
@@ -345,80 +415,72 @@ def create_sliced_anomaly_sequential(
     lon_min, lon_max = region["lon_min"], region["lon_max"]
 
     anom_dir = paths["data"] / "F01_preprocess" / dataset / "anomaly"
-    out_dir = paths["data"] / "F02_analogue_search" / "sliced" / dataset / event_name
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_file = out_dir / f"anomaly_{var}_sliced.nc"
+    if out_file is None:
+        out_file = paths["data"] / "F02_analogue_search" / "sliced" / dataset / event_name / f"anomaly_{var}_sliced.nc"
+    out_file.parent.mkdir(parents=True, exist_ok=True)
 
     if verbose:
-        print(f"Sequential slicing: years {start_year}-{end_year}")
+        print(f"Sequential slicing: years {start_year}-{end_year}, {max(n_workers, 1)} worker process(es)")
         print(f"  Time window: ±{window_days} days around {snapshot_date.strftime('%m-%d')}")
         print(f"  Region: lat[{lat_min},{lat_max}], lon[{lon_min},{lon_max}]")
         print(f"  Output: {out_file}", flush=True)
 
-    sliced_arrays = []
-    
+    files = []
     for year in range(start_year, end_year + 1):
         f = anom_dir / f"anomaly_{var}_{year}.nc"
         if not f.exists():
             if verbose:
                 print(f"  Year {year}: file not found, skipping", flush=True)
             continue
-        
+        files.append(f)
+
+    # Pass 1: per-year row counts and coordinates (metadata only)
+    layouts = _run_year_tasks(
+        _year_layout, [(f, var, region, snapshot_date, window_days) for f in files], n_workers
+    )
+    kept = [(f, lay) for f, lay in zip(files, layouts) if len(lay["times"]) > 0]
+    if not kept:
+        raise ValueError("No data found after slicing")
+
+    first = kept[0][1]
+    for f, lay in kept[1:]:
+        if not (np.array_equal(lay["lat"], first["lat"]) and np.array_equal(lay["lon"], first["lon"])):
+            raise ValueError(f"{f.name}: lat/lon grid differs from {kept[0][0].name}")
+
+    counts = [len(lay["times"]) for _, lay in kept]
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(int)
+    times = np.concatenate([lay["times"] for _, lay in kept])
+    shape = (int(sum(counts)), len(first["lat"]), len(first["lon"]))
+    if np.any(np.diff(times) <= np.timedelta64(0, "ns")):
+        raise ValueError("Year files overlap in time; cannot place years by offset")
+
+    # Pass 2: slice each year into its rows of a raw buffer next to the output
+    buffer_file = out_file.with_name(f".{out_file.stem}.buf{os.getpid()}")
+    try:
+        buf = np.memmap(buffer_file, dtype=np.dtype(first["dtype"]), mode="w+", shape=shape)
+        del buf
+        written = _run_year_tasks(
+            _slice_year_into,
+            [
+                (f, var, region, snapshot_date, window_days, buffer_file, first["dtype"], shape, int(off))
+                for (f, _), off in zip(kept, offsets)
+            ],
+            n_workers,
+        )
         if verbose:
-            print(f"  Year {year}: processing...", end=" ", flush=True)
-        
-        # Load single file
-        ds = xr.open_dataset(f)
-        ds = _standardize_dataset_coords(ds)
-        var_name = _select_primary_var(ds, preferred_var=var)
-        data = ds[var_name]
-
-        if "lat" not in data.coords or "lon" not in data.coords:
-            raise ValueError(
-                f"{f.name}: selected variable '{var_name}' has no lat/lon coords. "
-                f"dims={data.dims}, coords={list(data.coords)}"
-            )
-        
-        # Slice to bbox
-        if data.lat[0] > data.lat[-1]:
-            data = data.sel(lat=slice(lat_max, lat_min), lon=slice(lon_min, lon_max))
-        else:
-            data = data.sel(lat=slice(lat_min, lat_max), lon=slice(lon_min, lon_max))
-        
-        # Slice to calendar window
-        times = pd.to_datetime(data.time.values)
-        mask = compute_calendar_mask(times, snapshot_date, window_days)
-        data = data.isel(time=mask)
-        
-        # Load into memory
-        data = data.load()
-        
-        n_days = len(data.time)
+            for (f, _), n in zip(kept, written):
+                print(f"  {f.name}: {n} days", flush=True)
+        if list(written) != counts:
+            raise RuntimeError("Sliced day counts differ from the metadata pass")
+
         if verbose:
-            print(f"{n_days} days", flush=True)
-        
-        if n_days > 0:
-            sliced_arrays.append(data)
-        
-        ds.close()
-    
-    if not sliced_arrays:
-        raise ValueError("No data found after slicing")
-    
-    if verbose:
-        print(f"  Concatenating {len(sliced_arrays)} years...", flush=True)
-    
-    # Concatenate all years
-    combined = xr.concat(sliced_arrays, dim='time')
-    combined = combined.sortby('time')
-    
-    if verbose:
-        print(f"  Final shape: {dict(combined.sizes)}", flush=True)
-        print(f"  Writing to {out_file.name}...", flush=True)
-    
-    # Write with compression
-    out_ds = combined.to_dataset(name=var)
-    out_ds.to_netcdf(out_file, encoding={var: {'zlib': True, 'complevel': 4}})
+            print(f"  Final shape: {dict(zip(('time', 'lat', 'lon'), shape))}", flush=True)
+            print(f"  Writing to {out_file.name}...", flush=True)
+
+        _write_buffer_netcdf(buffer_file, first, shape, times, var, out_file)
+    finally:
+        if buffer_file.exists():
+            buffer_file.unlink()
     
     if verbose:
         size_mb = out_file.stat().st_size / (1024 * 1024)
@@ -427,20 +489,362 @@ def create_sliced_anomaly_sequential(
     return out_file
 
 
+def create_sliced_anomaly_multi(
+    dataset: str,
+    var: str,
+    events: List[Dict[str, Any]],
+    analogue_config: Dict[str, Any],
+    paths: Dict[str, Path],
+    force: bool = False,
+    verbose: bool = True,
+) -> Dict[str, Path]:
+    """
+    Slice many events in a single pass over the yearly anomaly files.
+
+    Each anomaly_<var>_<year>.nc is read once.  The union of all events'
+    bounding boxes and calendar windows is read from it, and every event's
+    slice is cut from that block and written into a per-slice on-disk buffer
+    (sized by a metadata-only first pass, as in
+    create_sliced_anomaly_sequential).  Memory is bounded by one year's union
+    block plus one write chunk, independent of the number of events; the
+    buffers need disk space for the uncompressed slices.  Events whose slice
+    is already in the content-addressed cache (see slice_cache.py) are only
+    linked, and events with identical domain/window share one output.
+
+    Parameters
+    ----------
+    dataset : str
+        Dataset name (era5, mswx, jra3q)
+    var : str
+        Variable name (e.g. psurf)
+    events : list of dict
+        Event configs with name, snapshot_date, region
+    analogue_config : dict
+        analogue_config.yaml with periods, snapshot_calendar_window
+    paths : dict
+        Data paths from get_data_paths()
+    force : bool
+        Rebuild cached slices
+    verbose : bool
+        Print progress
+
+    Returns
+    -------
+    Dict[str, Path]
+        Event name -> per-event sliced file (link into the cache)
+    """
+    from slice_cache import slice_plan, is_cached, finalize_slice, link_into_event
+
+    window_days = analogue_config.get("snapshot_calendar_window", 15)
+
+    # One output per distinct cache key; events with the same key share it
+    plans = {}
+    key_events: Dict[str, List[Dict[str, Any]]] = {}
+    for event in events:
+        plan = slice_plan(dataset, var, event, analogue_config, paths, slicer="python")
+        plans[event["name"]] = plan
+        key_events.setdefault(plan["key"], []).append(event)
+
+    todo = {
+        key: group for key, group in key_events.items()
+        if force or not is_cached(plans[group[0]["name"]])
+    }
+
+    if verbose:
+        print(f"Multi-event slicing: {len(events)} events, {len(key_events)} distinct slices, "
+              f"{len(todo)} to build", flush=True)
+
+    if todo:
+        first_plan = plans[next(iter(todo.values()))[0]["name"]]
+        start_year, end_year = first_plan["request"]["years"]
+
+        # Union of the bounding boxes of the slices to build
+        regions = {key: group[0]["region"] for key, group in todo.items()}
+        snapshots = {key: pd.Timestamp(group[0]["snapshot_date"]) for key, group in todo.items()}
+        u_lat_min = min(r["lat_min"] for r in regions.values())
+        u_lat_max = max(r["lat_max"] for r in regions.values())
+        u_lon_min = min(r["lon_min"] for r in regions.values())
+        u_lon_max = max(r["lon_max"] for r in regions.values())
+
+        if verbose:
+            print(f"  Union region: lat[{u_lat_min},{u_lat_max}], lon[{u_lon_min},{u_lon_max}]")
+            for key, group in todo.items():
+                names = ", ".join(e["name"] for e in group)
+                print(f"  Slice {key}: ±{window_days} days around {snapshots[key].strftime('%m-%d')} <- {names}")
+
+        anom_dir = paths["data"] / "F01_preprocess" / dataset / "anomaly"
+        files = []
+        for year in range(start_year, end_year + 1):
+            f = anom_dir / f"anomaly_{var}_{year}.nc"
+            if not f.exists():
+                if verbose:
+                    print(f"  Year {year}: file not found, skipping", flush=True)
+                continue
+            files.append(f)
+
+        def _year_block(ds: xr.Dataset, f: Path):
+            """Union bbox of one year, per-slice calendar masks and their union."""
+            try:
+                data, schema = open_field(ds, f, preferred_var=var)
+            except ValueError as e:
+                raise ValueError(f"{f.name}: {e}") from None
+            data = sel_bbox(data, schema, u_lat_min, u_lat_max, u_lon_min, u_lon_max)
+            times = pd.to_datetime(data.time.values)
+            masks = {key: compute_calendar_mask(times, snapshots[key], window_days) for key in todo}
+            return data, schema, masks, np.logical_or.reduce(list(masks.values()))
+
+        def _cut(block: xr.DataArray, schema: Dict[str, Any], mask: np.ndarray, key: str) -> xr.DataArray:
+            r = regions[key]
+            sub = block.isel(time=mask)
+            return sel_bbox(sub, schema, r["lat_min"], r["lat_max"], r["lon_min"], r["lon_max"])
+
+        # Pass 1: per-slice day counts and coordinates (metadata only), so
+        # every slice can be written straight to an on-disk buffer
+        layouts: Dict[str, Dict[str, Any]] = {}
+        year_times: Dict[str, list] = {key: [] for key in todo}
+        for f in files:
+            with xr.open_dataset(f) as ds:
+                data, schema, masks, _ = _year_block(ds, f)
+                for key in todo:
+                    sub = _cut(data, schema, masks[key], key)
+                    year_times[key].append(np.sort(sub.time.values))
+                    lay = {
+                        "lat": sub.lat.values,
+                        "lon": sub.lon.values,
+                        "dtype": sub.dtype.str,
+                        "attrs": dict(sub.attrs),
+                        "time_encoding": {k: v for k, v in sub.time.encoding.items() if k in _TIME_ENCODING_KEYS},
+                    }
+                    first = layouts.setdefault(key, lay)
+                    if not (np.array_equal(lay["lat"], first["lat"]) and np.array_equal(lay["lon"], first["lon"])):
+                        raise ValueError(f"{f.name}: lat/lon grid differs from earlier years")
+
+        shapes, times_all = {}, {}
+        for key, group in todo.items():
+            times_all[key] = np.concatenate(year_times[key]) if year_times[key] else np.array([], dtype="datetime64[ns]")
+            if len(times_all[key]) == 0:
+                raise ValueError(f"No data found after slicing for {', '.join(e['name'] for e in group)}")
+            if np.any(np.diff(times_all[key]) <= np.timedelta64(0, "ns")):
+                raise ValueError("Year files overlap in time; cannot place years by offset")
+            shapes[key] = (len(times_all[key]), len(layouts[key]["lat"]), len(layouts[key]["lon"]))
+
+        # Pass 2: read each year's union block once and write every slice's
+        # rows into its buffer; memory is one year block, not all slices
+        buffers = {}
+        try:
+            for key, group in todo.items():
+                plan = plans[group[0]["name"]]
+                plan["entry"].mkdir(parents=True, exist_ok=True)
+                buffers[key] = plan["tmp_file"].with_name(f".{plan['tmp_file'].name}.buf{os.getpid()}")
+                buf = np.memmap(buffers[key], dtype=np.dtype(layouts[key]["dtype"]), mode="w+", shape=shapes[key])
+                del buf
+
+            offsets = {key: 0 for key in todo}
+            for f in files:
+                if verbose:
+                    print(f"  {f.name}: processing...", end=" ", flush=True)
+                with xr.open_dataset(f) as ds:
+                    data, schema, masks, union = _year_block(ds, f)
+                    block = data.isel(time=union).load()
+                counts = []
+                for key in todo:
+                    sub = _cut(block, schema, masks[key][union], key).sortby("time")
+                    n = sub.sizes["time"]
+                    if n > 0:
+                        out = np.memmap(buffers[key], dtype=np.dtype(layouts[key]["dtype"]),
+                                        mode="r+", shape=shapes[key])
+                        out[offsets[key]:offsets[key] + n] = sub.transpose("time", "lat", "lon").values
+                        out.flush()
+                        del out
+                    offsets[key] += n
+                    counts.append(str(n))
+                del block
+                if verbose:
+                    print(f"{int(union.sum())} days read, per slice: {'/'.join(counts)}", flush=True)
+
+            for key, group in todo.items():
+                plan = plans[group[0]["name"]]
+                if offsets[key] != shapes[key][0]:
+                    raise RuntimeError("Sliced day counts differ from the metadata pass")
+                try:
+                    _write_buffer_netcdf(buffers[key], layouts[key], shapes[key], times_all[key],
+                                         var, plan["tmp_file"])
+                    finalize_slice(plan)
+                finally:
+                    if plan["tmp_file"].exists():
+                        plan["tmp_file"].unlink()
+                buffers.pop(key).unlink()
+                if verbose:
+                    size_mb = plan["cached_file"].stat().st_size / (1024 * 1024)
+                    print(f"  Wrote slice {key}: {dict(zip(('time', 'lat', 'lon'), shapes[key]))} "
+                          f"({size_mb:.1f} MB)", flush=True)
+        finally:
+            for buffer_file in buffers.values():
+                if buffer_file.exists():
+                    buffer_file.unlink()
+
+    results = {}
+    for event in events:
+        plan = plans[event["name"]]
+        link_into_event(plan["cached_file"], plan["event_file"])
+        results[event["name"]] = plan["event_file"]
+    return results
+
+
+def extend_sliced_anomaly(
+    dataset: str,
+    var: str,
+    event: Dict[str, Any],
+    analogue_config: Dict[str, Any],
+    paths: Dict[str, Path],
+    verbose: bool = True,
+) -> Optional[Path]:
+    """
+    Bring an event's cached slice up to date by appending new days only.
+
+    When anomaly files have gained time steps (e.g. a new month of ERA5), the
+    slice's cache key changes.  Instead of re-reading the whole archive, only
+    the new or modified yearly files are sliced; their days that are not yet
+    in the previous slice are appended to it and the result is stored under
+    the new key.  A cube store in the previous entry is moved along and
+    appended to in place.
+
+    Days already in the previous slice are assumed unchanged; use --force to
+    rebuild after an upstream reprocessing of past data.
+
+    Returns
+    -------
+    Path or None
+        Per-event sliced file, or None if there is no previous slice that
+        can be extended (the caller should do a full build)
+    """
+    from cube_store import cube_store_exists, append_to_cube_store, netcdf_signature, set_store_sources
+    from slice_cache import slice_plan, is_cached, finalize_slice, link_into_event, previous_slice
+
+    plan = slice_plan(dataset, var, event, analogue_config, paths, slicer="python")
+    if is_cached(plan):
+        if verbose:
+            print(f"Slice cache hit ({plan['key']}): {plan['cached_file']}", flush=True)
+        link_into_event(plan["cached_file"], plan["event_file"])
+        return plan["event_file"]
+
+    prev = previous_slice(plan)
+    if prev is None:
+        if verbose:
+            print("No compatible previous slice to extend; a full build is needed.", flush=True)
+        return None
+
+    snapshot_date = pd.Timestamp(event["snapshot_date"])
+    window_days = analogue_config.get("snapshot_calendar_window", 15)
+    anom_dir = paths["data"] / "F01_preprocess" / dataset / "anomaly"
+
+    with xr.open_dataset(prev["cached_file"]) as ds:
+        # Older dask-built slices are named after the file variable, not var
+        old, _ = open_field(ds, prev["cached_file"], preferred_var=var)
+        old = old.load()
+    old_times = old.time.values
+
+    if verbose:
+        print(f"Extending slice {prev['entry'].name} -> {plan['key']}: "
+              f"{len(prev['changed_sources'])} new/modified source file(s)", flush=True)
+
+    pieces = []
+    for name in prev["changed_sources"]:
+        data = _slice_year_file(anom_dir / name, var, event["region"], snapshot_date, window_days)
+        data = data.isel(time=~np.isin(data.time.values, old_times))
+        if verbose:
+            print(f"  {name}: {len(data.time)} new days", flush=True)
+        if len(data.time) > 0:
+            pieces.append(data)
+
+    new = xr.concat(pieces, dim="time").sortby("time") if pieces else None
+    combined = old if new is None else xr.concat([old, new], dim="time").sortby("time")
+
+    plan["entry"].mkdir(parents=True, exist_ok=True)
+    try:
+        combined.to_dataset(name=var).to_netcdf(
+            plan["tmp_file"], encoding={var: {"zlib": True, "complevel": 4}}
+        )
+        finalize_slice(plan)
+    finally:
+        if plan["tmp_file"].exists():
+            plan["tmp_file"].unlink()
+
+    # Carry the cube store over; a pure append needs all new days after the old ones
+    old_store = prev["entry"] / f"store_{var}"
+    new_store = plan["entry"] / f"store_{var}"
+    if cube_store_exists(old_store) and not new_store.exists():
+        if new is None or new.time.values[0] > old_times[-1]:
+            os.replace(old_store, new_store)
+            sources = [netcdf_signature(plan["cached_file"])]
+            if new is not None:
+                append_to_cube_store(new, new_store, sources=sources, verbose=verbose)
+            else:
+                set_store_sources(new_store, sources)
+        elif verbose:
+            print("  New days are not all after the slice end; cube store will be rebuilt.", flush=True)
+
+    if verbose:
+        print(f"  Slice now {dict(combined.sizes)}: {plan['cached_file']}", flush=True)
+
+    link_into_event(plan["cached_file"], plan["event_file"])
+    return plan["event_file"]
+
+
+def _link_event_store(
+    event_file: Path,
+    paths: Dict[str, Path],
+    dataset: str,
+    event_name: str,
+    var: str,
+    force: bool = False,
+    verbose: bool = True,
+) -> Path:
+    """Build the cube store next to the cached slice and link it for the event."""
+    from cube_store import cube_store_exists, cube_store_matches, cube_store_path, store_from_netcdf
+    from slice_cache import link_into_event
+
+    # Store is kept inside the cache entry, so events sharing a slice share the store
+    cached_store = event_file.resolve().parent / f"store_{var}"
+    if force or not cube_store_exists(cached_store) or not cube_store_matches(cached_store, event_file):
+        store_from_netcdf(event_file, cached_store, var=var, verbose=verbose)
+    elif verbose:
+        print(f"Cube store exists: {cached_store}")
+    store_dir = cube_store_path(paths, dataset, event_name, var)
+    link_into_event(cached_store, store_dir)
+    return store_dir
+
+
 def main():
     """CLI for dask-based pre-slicing."""
     import argparse
     import sys
     from data_utils import load_env_setting, load_analogue_config, load_events_config, get_data_paths
+    from slice_cache import get_or_create_slice, prune_slice_cache
 
     parser = argparse.ArgumentParser(description="Pre-slice anomaly data for analogue search")
     parser.add_argument("--dataset", required=True, choices=["era5", "mswx", "jra3q"])
-    parser.add_argument("--event", required=True, help="Event name from extreme_events.yaml")
-    parser.add_argument("--workers", type=int, default=4, help="Number of dask threads (default: 4)")
-    parser.add_argument("--sequential", action="store_true", help="Use sequential processing (safer, avoids threading issues)")
-    parser.add_argument("--force", action="store_true", help="Overwrite existing output")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--event", help="Event name from extreme_events.yaml")
+    target.add_argument("--all-events", action="store_true",
+                        help="Slice every event with snapshot_date in one pass over the anomaly files")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Number of dask threads, or worker processes with --sequential (default: 4)")
+    parser.add_argument("--sequential", action="store_true",
+                        help="Slice year files independently in worker processes (safer, avoids threading issues)")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if a cached slice with the same inputs exists")
+    parser.add_argument("--incremental", action="store_true",
+                        help="If the anomaly files gained new days, append them to the event's previous slice "
+                             "instead of rebuilding it")
+    parser.add_argument("--store", action="store_true",
+                        help="Also write a memory-mapped cube store (built from an existing slice if present)")
+    parser.add_argument("--prune", action="store_true",
+                        help="Afterwards delete cache entries (and their stores) no event links to; "
+                             "can be used without --event/--all-events")
     parser.add_argument("--quiet", action="store_true")
     args = parser.parse_args()
+    if not (args.event or args.all_events or args.prune):
+        parser.error("one of --event, --all-events or --prune is required")
 
     print(f"dask_slice.py starting...", flush=True)
     
@@ -453,6 +857,44 @@ def main():
         print(f"Error loading config: {e}", file=sys.stderr)
         sys.exit(1)
 
+    match_var = analogue_config.get("distance", {}).get("match_variable", "psurf")
+    verbose = not args.quiet
+
+    def prune() -> None:
+        if args.prune:
+            prune_slice_cache(paths, args.dataset, verbose=verbose)
+
+    if not (args.event or args.all_events):
+        prune()
+        return
+
+    if args.all_events:
+        events = [e for e in events_config.get("events", []) if "snapshot_date" in e]
+        if not events:
+            print("No events with snapshot_date in extreme_events.yaml", file=sys.stderr)
+            sys.exit(1)
+        try:
+            event_files = create_sliced_anomaly_multi(
+                dataset=args.dataset,
+                var=match_var,
+                events=events,
+                analogue_config=analogue_config,
+                paths=paths,
+                force=args.force,
+                verbose=verbose,
+            )
+            if args.store:
+                for event_name, event_file in event_files.items():
+                    _link_event_store(event_file, paths, args.dataset, event_name, match_var,
+                                      force=args.force, verbose=verbose)
+        except Exception as e:
+            print(f"Error during slicing: {e}", file=sys.stderr)
+            import traceback
+            traceback.print_exc()
+            sys.exit(1)
+        prune()
+        return
+
     event = None
     for e in events_config.get("events", []):
         if e["name"] == args.event:
@@ -465,41 +907,64 @@ def main():
         print(f"Event '{args.event}' lacks snapshot_date", file=sys.stderr)
         sys.exit(1)
 
-    match_var = analogue_config.get("distance", {}).get("match_variable", "psurf")
-    out_file = paths["data"] / "F02_analogue_search" / "sliced" / args.dataset / args.event / f"anomaly_{match_var}_sliced.nc"
-    
-    if out_file.exists() and not args.force:
-        print(f"Sliced file exists, skipping: {out_file.name}")
-        print(f"Use --force to overwrite.")
-        return
-
-    try:
+    # Python slicers (dask and sequential) produce the same slice, so they share cache entries
+    def build(out_file: Path) -> Path:
         if args.sequential:
             # Safer sequential processing
-            create_sliced_anomaly_sequential(
+            return create_sliced_anomaly_sequential(
                 dataset=args.dataset,
                 var=match_var,
                 event=event,
                 analogue_config=analogue_config,
                 paths=paths,
-                verbose=not args.quiet,
+                verbose=verbose,
+                out_file=out_file,
+                n_workers=args.workers,
             )
-        else:
-            # Dask-based processing
-            create_sliced_anomaly_dask(
+        # Dask-based processing
+        return create_sliced_anomaly_dask(
+            dataset=args.dataset,
+            var=match_var,
+            event=event,
+            analogue_config=analogue_config,
+            paths=paths,
+            n_workers=args.workers,
+            verbose=verbose,
+            out_file=out_file,
+        )
+
+    try:
+        event_file = None
+        if args.incremental and not args.force:
+            event_file = extend_sliced_anomaly(
                 dataset=args.dataset,
                 var=match_var,
                 event=event,
                 analogue_config=analogue_config,
                 paths=paths,
-                n_workers=args.workers,
-                verbose=not args.quiet,
+                verbose=verbose,
             )
+        # Reuses an existing slice with the same content key; rebuilds if sources/config changed
+        event_file = event_file or get_or_create_slice(
+            dataset=args.dataset,
+            var=match_var,
+            event=event,
+            analogue_config=analogue_config,
+            paths=paths,
+            slicer="python",
+            build=build,
+            force=args.force,
+            verbose=verbose,
+        )
+        if args.store:
+            _link_event_store(event_file, paths, args.dataset, args.event, match_var,
+                              force=args.force, verbose=verbose)
     except Exception as e:
         print(f"Error during slicing: {e}", file=sys.stderr)
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    prune()
 
 
 if __name__ == "__main__":
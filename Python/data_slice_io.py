@@ -0,0 +1,383 @@
+"""
+Access to the monthly T2m data slices (data_slice/YYYYMM.nc) used by F03 tools.
+
+plot_t2m_boxplot.py and cvm_test.py only need one number per day: the T2m
+mean over a bbox, optionally restricted to a land or domain mask.  Instead
+of reopening monthly files for every analogue and every background year,
+load_domain_mean_series builds that daily series for all months in the
+data directory in one pass and caches it as a small array:
+
+    values[month, day]   domain-mean T2m (°C), NaN where the file has no such day
+
+keyed by (data_dir, bbox, mask).  Each month's source file signature is
+stored with it, so only new or modified monthly files are reprocessed on
+the next call.  Window and snapshot lookups are then array indexing.
+Months whose file cannot be read are skipped with a warning and treated
+as missing (retried on the next call).  Caches default to Data/cache/, not
+the data_slice directory.
+
+When only a few days are needed and no cached series is available,
+read_day_domain_mean / read_window_domain_means read just those days and
+the bbox as one netCDF hyperslab per monthly file instead of loading the
+whole month.
+"""
+
+import hashlib
+import json
+import os
+import re
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import netCDF4
+import numpy as np
+import xarray as xr
+
+from coord_schema import lon_convention, to_lon_convention
+from data_utils import get_root_dir
+from zip_nc import is_zip, open_zip_dataset, open_zip_nc
+
+K2C = 273.15
+
+# Bump when the series computation changes
+SERIES_CACHE_VERSION = 1
+MAX_DAYS = 31
+MONTH_FILE_RE = re.compile(r"^(\d{4})(\d{2})\.nc$")
+
+# Default cache directories (the data_slice directory is input only)
+SERIES_CACHE_DIR = get_root_dir() / "Data" / "cache" / "t2m_series"
+MASK_CACHE_DIR = get_root_dir() / "Data" / "cache" / "masks"
+
+
+def data_slice_file_path(data_dir: str, d: datetime) -> str:
+    """Return path to monthly slice file for given date."""
+    return os.path.join(data_dir, f"{d.year}{d.month:02d}.nc")
+
+
+def _is_t2m_member(name: str) -> bool:
+    return "2m_temperature" in name or "t2m" in name.lower()
+
+
+def open_t2m_dataset(path: str) -> xr.Dataset:
+    """Open data-slice dataset, handling both plain NetCDF and ZIP archives.
+    Data slices can be YYYYMM.nc (NetCDF) or ZIP containing 2m_temperature*.nc;
+    ZIP members are opened from memory (see zip_nc.py)."""
+    if is_zip(path):
+        return open_zip_dataset(path, _is_t2m_member)
+    return xr.open_dataset(path, engine="netcdf4")
+
+
+def subset_bbox(
+    t2m: xr.DataArray,
+    lat_min: float,
+    lat_max: float,
+    lon_min: float,
+    lon_max: float,
+) -> xr.DataArray:
+    """Subset T2m to a bbox given in 0–360 longitude; handles -180–180 data."""
+    lat_slice = slice(lat_max, lat_min) if lat_max > lat_min else slice(lat_min, lat_max)
+    conv = lon_convention(t2m.coords["longitude"].values)
+    return t2m.sel(
+        latitude=lat_slice,
+        longitude=slice(to_lon_convention(lon_min, conv), to_lon_convention(lon_max, conv)),
+    )
+
+
+def daily_domain_means(
+    path: str,
+    lat_min: float,
+    lat_max: float,
+    lon_min: float,
+    lon_max: float,
+    mask: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Domain-mean T2m (°C) for every time step of one monthly file."""
+    ds = open_t2m_dataset(path)
+    try:
+        sub = subset_bbox(ds["t2m"], lat_min, lat_max, lon_min, lon_max)
+        vals = (sub.values - K2C).astype(np.float64)
+    finally:
+        ds.close()
+    if mask is not None and mask.size > 0:
+        vals = np.where(np.broadcast_to(mask, vals.shape), vals, np.nan)
+    return np.nanmean(vals, axis=tuple(range(1, vals.ndim)))
+
+
+def _open_t2m_nc(path: str) -> netCDF4.Dataset:
+    """Open a data slice with netCDF4 (ZIP members are opened from memory)."""
+    if is_zip(path):
+        return open_zip_nc(path, _is_t2m_member)
+    return netCDF4.Dataset(path, mode="r")
+
+
+def _coord_range(values: np.ndarray, lo: float, hi: float) -> slice:
+    """Index range of a monotonic coordinate within [lo, hi] (inclusive, like .sel)."""
+    idx = np.flatnonzero((values >= min(lo, hi)) & (values <= max(lo, hi)))
+    if idx.size == 0:
+        return slice(0, 0)
+    return slice(int(idx[0]), int(idx[-1]) + 1)
+
+
+def bbox_hyperslab(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    lat_min: float,
+    lat_max: float,
+    lon_min: float,
+    lon_max: float,
+) -> Tuple[slice, slice]:
+    """
+    (lat, lon) index slices selecting the same points as subset_bbox.
+
+    bbox longitude is 0–360; converted when the data uses -180–180.
+    """
+    conv = lon_convention(lon)
+    lon_lo, lon_hi = to_lon_convention(lon_min, conv), to_lon_convention(lon_max, conv)
+    return _coord_range(lat, lat_min, lat_max), _coord_range(lon, lon_lo, lon_hi)
+
+
+def bbox_grid(
+    path: str,
+    lat_min: float,
+    lat_max: float,
+    lon_min: float,
+    lon_max: float,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """(latitude, longitude) of the bbox subset of a data slice (coordinates only)."""
+    with _open_t2m_nc(path) as nc:
+        lat = np.asarray(nc.variables["latitude"][:])
+        lon = np.asarray(nc.variables["longitude"][:])
+    lat_s, lon_s = bbox_hyperslab(lat, lon, lat_min, lat_max, lon_min, lon_max)
+    return lat[lat_s], lon[lon_s]
+
+
+def read_days_domain_mean(
+    path: str,
+    first_day: int,
+    ndays: int,
+    lat_min: float,
+    lat_max: float,
+    lon_min: float,
+    lon_max: float,
+    mask: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Domain-mean T2m (°C) for days first_day .. first_day+ndays-1 (0-based) of one monthly file.
+
+    Reads a single hyperslab (those time steps, bbox only).  Days beyond the
+    end of the file are NaN.
+    """
+    out = np.full(ndays, np.nan, dtype=np.float64)
+    with _open_t2m_nc(path) as nc:
+        var = nc.variables["t2m"]
+        lat_s, lon_s = bbox_hyperslab(
+            nc.variables["latitude"][:], nc.variables["longitude"][:],
+            lat_min, lat_max, lon_min, lon_max,
+        )
+        stop = min(first_day + ndays, var.shape[0])
+        if stop <= first_day:
+            return out
+        index = [slice(first_day, stop)]
+        for dim in var.dimensions[1:]:
+            index.append(lat_s if dim == "latitude" else lon_s if dim == "longitude" else slice(None))
+        raw = np.ma.filled(var[tuple(index)], np.nan)
+    vals = (raw - K2C).astype(np.float64)
+    if mask is not None and mask.size > 0:
+        vals = np.where(np.broadcast_to(mask, vals.shape), vals, np.nan)
+    out[: stop - first_day] = np.nanmean(vals, axis=tuple(range(1, vals.ndim)))
+    return out
+
+
+def read_day_domain_mean(
+    data_dir: str,
+    date: datetime,
+    lat_min: float,
+    lat_max: float,
+    lon_min: float,
+    lon_max: float,
+    mask: Optional[np.ndarray] = None,
+) -> float:
+    """Domain-mean T2m (°C) on one day, read as a one-day hyperslab."""
+    path = data_slice_file_path(data_dir, date)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(path)
+    return float(read_days_domain_mean(
+        path, date.day - 1, 1, lat_min, lat_max, lon_min, lon_max, mask,
+    )[0])
+
+
+def read_window_domain_means(
+    data_dir: str,
+    start_date: datetime,
+    ndays: int,
+    lat_min: float,
+    lat_max: float,
+    lon_min: float,
+    lon_max: float,
+    mask: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Domain-mean T2m (°C) for ndays from start_date; one hyperslab per monthly file."""
+    out = np.full(ndays, np.nan, dtype=np.float64)
+    i = 0
+    while i < ndays:
+        d = start_date + timedelta(days=i)
+        # Run of consecutive days in the same month
+        n = 1
+        while i + n < ndays and (start_date + timedelta(days=i + n)).month == d.month:
+            n += 1
+        path = data_slice_file_path(data_dir, d)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(path)
+        out[i:i + n] = read_days_domain_mean(
+            path, d.day - 1, n, lat_min, lat_max, lon_min, lon_max, mask,
+        )
+        i += n
+    return out
+
+
+def _month_index(year: int, month: int) -> int:
+    return year * 12 + (month - 1)
+
+
+def _month_files(data_dir: str) -> Dict[int, Path]:
+    """Month index -> YYYYMM.nc path for every monthly file in data_dir."""
+    files = {}
+    for p in Path(data_dir).iterdir():
+        m = MONTH_FILE_RE.match(p.name)
+        if m:
+            files[_month_index(int(m.group(1)), int(m.group(2)))] = p
+    return files
+
+
+def _file_signature(p: Path) -> str:
+    st = p.stat()
+    return f"{p.name}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def series_key(
+    data_dir: str,
+    bbox: Tuple[float, float, float, float],
+    mask: Optional[np.ndarray],
+) -> str:
+    """Cache key for a (data_dir, bbox, mask) domain-mean series."""
+    mask_id = None
+    if mask is not None and mask.size > 0:
+        m = np.ascontiguousarray(mask, dtype=bool)
+        mask_id = f"{m.shape}:{hashlib.sha1(np.packbits(m).tobytes()).hexdigest()}"
+    blob = json.dumps({
+        "version": SERIES_CACHE_VERSION,
+        "data_dir": str(Path(data_dir).resolve()),
+        "bbox": [round(float(v), 6) for v in bbox],
+        "mask": mask_id,
+    }, sort_keys=True).encode()
+    return hashlib.sha1(blob).hexdigest()[:16]
+
+
+def load_domain_mean_series(
+    data_dir: str,
+    bbox: Tuple[float, float, float, float],
+    mask: Optional[np.ndarray] = None,
+    cache_dir: Optional[str] = None,
+    verbose: bool = True,
+) -> Dict[str, Any]:
+    """
+    Daily domain-mean T2m for every monthly file in data_dir, built once and cached.
+
+    Parameters
+    ----------
+    data_dir : str
+        data_slice directory with YYYYMM.nc monthly files
+    bbox : tuple
+        (lat_min, lat_max, lon_min, lon_max), longitude 0–360
+    mask : np.ndarray, optional
+        2D boolean mask on the bbox grid (land or named domain); None = all points
+    cache_dir : str, optional
+        Where to keep the cached series; None disables caching
+    verbose : bool
+        Print progress
+
+    Returns
+    -------
+    dict
+        data_dir, base (month index of row 0), values (n_months, 31) in °C,
+        present (n_months,) True where the monthly file exists and was read
+    """
+    lat_min, lat_max, lon_min, lon_max = bbox
+    files = _month_files(data_dir)
+    if not files:
+        raise FileNotFoundError(f"No YYYYMM.nc files in {data_dir}")
+    sigs = {idx: _file_signature(p) for idx, p in files.items()}
+
+    cached: Dict[int, Tuple[str, np.ndarray]] = {}
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = Path(cache_dir) / f"t2m_series_{series_key(data_dir, bbox, mask)}.npz"
+        if cache_file.exists():
+            with np.load(cache_file) as z:
+                for idx, sig, row in zip(z["months"], z["sigs"], z["values"]):
+                    cached[int(idx)] = (str(sig), row)
+
+    todo = [idx for idx in sorted(files) if idx not in cached or cached[idx][0] != sigs[idx]]
+    if verbose:
+        if todo:
+            print(f"T2m series: {len(files) - len(todo)} months cached, processing {len(todo)}")
+        else:
+            print(f"T2m series: all {len(files)} months cached")
+
+    rows = {idx: row for idx, (sig, row) in cached.items() if idx in files and idx not in todo}
+    failed = []
+    for idx in todo:
+        try:
+            daily = daily_domain_means(str(files[idx]), lat_min, lat_max, lon_min, lon_max, mask)
+        except (OSError, KeyError, ValueError, RuntimeError) as e:
+            # One bad month should not fail a series over decades
+            print(f"[WARN] Skipping unreadable {files[idx]}: {e}")
+            failed.append(idx)
+            continue
+        row = np.full(MAX_DAYS, np.nan)
+        n = min(len(daily), MAX_DAYS)
+        row[:n] = daily[:n]
+        rows[idx] = row
+    if not rows:
+        raise FileNotFoundError(f"No readable YYYYMM.nc files in {data_dir}")
+
+    months = np.array(sorted(rows), dtype=np.int64)
+    values = np.stack([rows[idx] for idx in months])
+
+    if cache_file is not None and (len(todo) > len(failed) or set(cached) != set(rows)):
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_name(cache_file.name + f".tmp{os.getpid()}")
+        with open(tmp, "wb") as f:
+            np.savez(f, months=months, values=values, sigs=np.array([sigs[idx] for idx in months]))
+        os.replace(tmp, cache_file)
+
+    base = int(months[0])
+    n_months = int(months[-1]) - base + 1
+    full = np.full((n_months, MAX_DAYS), np.nan)
+    present = np.zeros(n_months, dtype=bool)
+    full[months - base] = values
+    present[months - base] = True
+    return {"data_dir": str(data_dir), "base": base, "values": full, "present": present}
+
+
+def series_window(series: Dict[str, Any], start_date: datetime, ndays: int) -> np.ndarray:
+    """
+    Domain-mean T2m (°C) for ndays consecutive days from start_date.
+
+    Raises FileNotFoundError if a needed monthly file is missing, like
+    reading the files directly would.
+    """
+    out = np.full(ndays, np.nan, dtype=np.float64)
+    for i in range(ndays):
+        d = start_date + timedelta(days=i)
+        row = _month_index(d.year, d.month) - series["base"]
+        if row < 0 or row >= len(series["present"]) or not series["present"][row]:
+            raise FileNotFoundError(data_slice_file_path(series["data_dir"], d))
+        out[i] = series["values"][row, d.day - 1]
+    return out
+
+
+def series_value(series: Dict[str, Any], date: datetime) -> float:
+    """Domain-mean T2m (°C) on one day (NaN if the monthly file lacks that day)."""
+    return float(series_window(series, date, 1)[0])
@@ -0,0 +1,805 @@
+"""
+Distance engine for analogue search.
+
+Provides a norm-expanded weighted Euclidean distance kernel:
+
+    d(t) = sum_ij w_ij (x_ij(t) - r_ij)^2
+         = ||x(t)||^2_w - 2 <x(t), r>_w + ||r||^2_w
+
+The cross term is a single weighted matrix-vector product per time chunk,
+so peak memory is one chunk of the cube instead of three full-size
+(time, lat, lon) temporaries.  The per-day weighted norms ||x(t)||^2_w only
+depend on the cube and the weight field, so they are kept in an on-disk
+cache and reused by repeat queries on the same domain.
+
+For the Wasserstein metric the same idea applies to the sorted daily
+fields: W1(u, v) = mean(|sort(u) - sort(v)|), and sort(x(t)) does not depend
+on the reference.  The sorted cube is written once per domain and a query
+is a single mean(|Q - q_ref|) reduction over it.  A reduced table of m
+quantiles per day gives a faster approximate W1 with a known error bound.
+
+Multi-day smoothing is applied to the loaded cube with prefix sums along
+time (running_means): O(T * space) for any window, and several windows
+from one pass, so changing the window needs no CDO runmean rebuild.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import xarray as xr
+
+# Matches the chunks={'time': 365} used when opening anomaly files.
+DEFAULT_TIME_CHUNK = 365
+
+
+def iter_time_chunks(
+    data: xr.DataArray,
+    chunk_size: int = DEFAULT_TIME_CHUNK,
+    dtype: Optional[np.dtype] = np.float64,
+) -> Iterator[Tuple[slice, np.ndarray]]:
+    """
+    Yield consecutive time blocks of a (time, lat, lon) cube as 2-D arrays.
+
+    Only one block is materialised at a time, so dask-backed cubes are read
+    chunk by chunk instead of being forced into RAM in one go.
+
+    Parameters
+    ----------
+    data : xr.DataArray
+        Data array with dimensions (time, lat, lon)
+    chunk_size : int
+        Number of time steps per block
+    dtype : np.dtype, optional
+        Output dtype (default float64); None keeps the cube's own dtype
+
+    Yields
+    ------
+    Tuple[slice, np.ndarray]
+        Time slice and the block flattened to (n_time_block, n_spatial)
+    """
+    data = data.transpose('time', 'lat', 'lon')
+    n_time = data.sizes['time']
+    n_spatial = data.sizes['lat'] * data.sizes['lon']
+    for start in range(0, n_time, chunk_size):
+        sl = slice(start, min(start + chunk_size, n_time))
+        block = np.asarray(data.isel(time=sl).values, dtype=dtype)
+        yield sl, block.reshape(block.shape[0], n_spatial)
+
+
+def _file_signature(path: Path) -> str:
+    """Return 'path:mtime_ns:size' for a file, or an empty string if missing."""
+    try:
+        st = path.stat()
+    except OSError:
+        return ""
+    return f"{path.resolve()}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def cube_signature(data: xr.DataArray) -> Optional[str]:
+    """
+    Return a hash identifying the cube, or None if it cannot be identified.
+
+    The signature combines the source file (path, mtime, size) with the
+    time/lat/lon coordinates (and the running-mean window of a smoothed
+    cube), so any rewrite of the sliced file, change of domain or smoothing
+    yields a new key.  Cubes without a single source file (e.g. the
+    open_mfdataset fallback) return None and are not cached.
+    """
+    source = data.encoding.get('source')
+    if not source:
+        return None
+    file_sig = _file_signature(Path(source))
+    if not file_sig:
+        return None
+
+    h = hashlib.sha1()
+    h.update(file_sig.encode())
+    h.update(str(data.name).encode())
+    if data.attrs.get('running_mean_days'):
+        h.update(f"runmean{data.attrs['running_mean_days']}".encode())
+    for coord in ('time', 'lat', 'lon'):
+        h.update(np.ascontiguousarray(data[coord].values).tobytes())
+    return h.hexdigest()
+
+
+def weights_signature(spatial_weights: xr.DataArray) -> str:
+    """Return a hash of a (lat, lon) weight field."""
+    w = np.ascontiguousarray(spatial_weights.transpose('lat', 'lon').values, dtype=np.float64)
+    return hashlib.sha1(w.tobytes()).hexdigest()
+
+
+def _norm_cache_file(cache_dir: Path, cube_key: str, weights_key: str) -> Path:
+    return cache_dir / f"norms_{cube_key[:16]}_{weights_key[:16]}.npz"
+
+
+def _load_norm_table(path: Path, n_time: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Load a cached (norms, has_nan) table; None if missing or inconsistent."""
+    if not path.exists():
+        return None
+    try:
+        with np.load(path) as npz:
+            norms = npz['norms']
+            has_nan = npz['has_nan']
+    except (OSError, KeyError, ValueError):
+        return None
+    if norms.shape != (n_time,) or has_nan.shape != (n_time,):
+        return None
+    return norms, has_nan
+
+
+def _save_norm_table(path: Path, norms: np.ndarray, has_nan: np.ndarray) -> None:
+    """Write the norm table atomically (best-effort; never fatal)."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + f".tmp{os.getpid()}")
+        with open(tmp, 'wb') as f:
+            np.savez(f, norms=norms, has_nan=has_nan)
+        os.replace(tmp, path)
+    except OSError:
+        return
+
+
+def compute_euclidean_distances_batch(
+    data: xr.DataArray,
+    references: xr.DataArray,
+    spatial_weights: xr.DataArray,
+    cache_dir: Optional[Path] = None,
+    chunk_size: int = DEFAULT_TIME_CHUNK,
+) -> xr.DataArray:
+    """
+    Weighted squared Euclidean distance from many references to every time step.
+
+    All reference-vs-candidate distances are computed in one blocked pass
+    over the cube: per time chunk the cross terms for every reference are a
+    single (n_time_block, n_spatial) x (n_spatial, n_ref) matrix product.
+    Gives the same result as the direct sum_ij(w_ij * (x(t,i,j) - r(i,j))^2)
+    per reference (NaNs are skipped in the spatial sum).  Days
+    containing NaNs, and references containing NaNs, are evaluated with the
+    direct formula so the missing-value semantics are unchanged.
+
+    Parameters
+    ----------
+    data : xr.DataArray
+        Data array with dimensions (time, lat, lon)
+    references : xr.DataArray
+        Reference patterns with dimensions (ref, lat, lon)
+    spatial_weights : xr.DataArray
+        Normalized spatial weights with dims (lat, lon), sum == 1
+    cache_dir : Path, optional
+        Directory for the per-day weighted norm table.  If None, or if the
+        cube has no identifiable source file, norms are not cached.
+    chunk_size : int
+        Number of time steps per block
+
+    Returns
+    -------
+    xr.DataArray
+        Distances with dimensions (ref, time)
+    """
+    n_time = data.sizes['time']
+    w = np.asarray(spatial_weights.transpose('lat', 'lon').values, dtype=np.float64).ravel()
+    refs = np.asarray(references.transpose('ref', 'lat', 'lon').values, dtype=np.float64)
+    refs = refs.reshape(refs.shape[0], -1)                    # (n_ref, n_spatial)
+
+    # References with gaps change which points enter every sum; the expansion
+    # does not apply to them, so they are evaluated directly.
+    ref_has_nan = np.isnan(refs).any(axis=1)
+    exp_idx = np.flatnonzero(~ref_has_nan)
+    direct_idx = np.flatnonzero(ref_has_nan)
+
+    wr = (refs[exp_idx] * w).T                               # (n_spatial, n_exp)
+    ref_norms = np.einsum('ij,ij->i', refs[exp_idx] * w, refs[exp_idx])
+
+    cache_file = None
+    table = None
+    if cache_dir is not None and exp_idx.size:
+        cube_key = cube_signature(data)
+        if cube_key is not None:
+            cache_file = _norm_cache_file(Path(cache_dir), cube_key, weights_signature(spatial_weights))
+            table = _load_norm_table(cache_file, n_time)
+
+    if table is not None:
+        norms, has_nan = table
+    else:
+        norms = np.empty(n_time, dtype=np.float64)
+        has_nan = np.zeros(n_time, dtype=bool)
+
+    distances = np.empty((refs.shape[0], n_time), dtype=np.float64)
+    for sl, block in iter_time_chunks(data, chunk_size):
+        if table is None:
+            has_nan[sl] = np.isnan(block).any(axis=1)
+        clean = np.nan_to_num(block, nan=0.0) if has_nan[sl].any() else block
+        if table is None:
+            norms[sl] = (clean * clean) @ w
+
+        if exp_idx.size:
+            d = norms[sl][:, np.newaxis] - 2.0 * (clean @ wr) + ref_norms[np.newaxis, :]
+            nan_rows = np.flatnonzero(has_nan[sl])
+            for row in nan_rows:
+                d[row] = np.nansum(w * (block[row] - refs[exp_idx]) ** 2, axis=1)
+            distances[exp_idx, sl] = d.T
+
+        for j in direct_idx:
+            distances[j, sl] = np.nansum(w * (block - refs[j]) ** 2, axis=1)
+
+    if table is None and cache_file is not None:
+        _save_norm_table(cache_file, norms, has_nan)
+
+    # Cancellation can leave tiny negative values for near-identical days.
+    np.maximum(distances, 0.0, out=distances)
+    return xr.DataArray(
+        distances,
+        coords={'ref': references['ref'].values, 'time': data.time},
+        dims=['ref', 'time'],
+    )
+
+
+def compute_euclidean_distances_expanded(
+    data: xr.DataArray,
+    reference: xr.DataArray,
+    spatial_weights: xr.DataArray,
+    cache_dir: Optional[Path] = None,
+    chunk_size: int = DEFAULT_TIME_CHUNK,
+) -> xr.DataArray:
+    """
+    Weighted squared Euclidean distance via the norm expansion.
+
+    Single-reference form of compute_euclidean_distances_batch.
+
+    Parameters
+    ----------
+    data : xr.DataArray
+        Data array with dimensions (time, lat, lon)
+    reference : xr.DataArray
+        Reference pattern with dimensions (lat, lon)
+    spatial_weights : xr.DataArray
+        Normalized spatial weights with dims (lat, lon), sum == 1
+    cache_dir : Path, optional
+        Directory for the per-day weighted norm table
+    chunk_size : int
+        Number of time steps per block
+
+    Returns
+    -------
+    xr.DataArray
+        Distance for each time step, dimension (time,)
+    """
+    references = reference.drop_vars('time', errors='ignore').expand_dims(ref=[0])
+    distances = compute_euclidean_distances_batch(
+        data, references, spatial_weights, cache_dir=cache_dir, chunk_size=chunk_size
+    )
+    return distances.isel(ref=0, drop=True)
+
+
+def compute_euclidean_distances_multiweight(
+    data: xr.DataArray,
+    reference: xr.DataArray,
+    weight_stack: xr.DataArray,
+    cache_dir: Optional[Path] = None,
+    chunk_size: int = DEFAULT_TIME_CHUNK,
+) -> xr.DataArray:
+    """
+    Weighted squared Euclidean distance for a stack of weight fields in one pass.
+
+    For weights w_k the distance expands to
+
+        d_k(t) = <x(t)^2, w_k> - 2 <x(t), w_k r> + <r^2, w_k>
+
+    so per time chunk all weight fields are handled by two matrix products,
+    (x^2) @ W^T and x @ (W r)^T.  Used for sigma sensitivity sweeps where only
+    the Gaussian width of the weights changes.  Norms already cached for a
+    weight field are reused; missing ones are computed in the same pass and
+    written back.
+
+    Parameters
+    ----------
+    data : xr.DataArray
+        Data array with dimensions (time, lat, lon)
+    reference : xr.DataArray
+        Reference pattern with dimensions (lat, lon)
+    weight_stack : xr.DataArray
+        Normalized spatial weights with dims (weight, lat, lon), each sum == 1
+    cache_dir : Path, optional
+        Directory for the per-day weighted norm tables
+    chunk_size : int
+        Number of time steps per block
+
+    Returns
+    -------
+    xr.DataArray
+        Distances with dimensions (weight, time)
+    """
+    n_time = data.sizes['time']
+    W = np.asarray(weight_stack.transpose('weight', 'lat', 'lon').values, dtype=np.float64)
+    n_weight = W.shape[0]
+    W = W.reshape(n_weight, -1)                               # (n_weight, n_spatial)
+    r = np.asarray(reference.transpose('lat', 'lon').values, dtype=np.float64).ravel()
+
+    distances = np.empty((n_weight, n_time), dtype=np.float64)
+
+    if np.isnan(r).any():
+        # Reference gaps change which points enter every sum; evaluate directly.
+        for sl, block in iter_time_chunks(data, chunk_size):
+            sq = np.nan_to_num((block - r) ** 2, nan=0.0)
+            distances[:, sl] = (sq @ W.T).T
+        return xr.DataArray(
+            distances,
+            coords={'weight': weight_stack['weight'].values, 'time': data.time},
+            dims=['weight', 'time'],
+        )
+
+    WrT = (W * r).T                                           # (n_spatial, n_weight)
+    ref_norms = W @ (r * r)                                   # (n_weight,)
+
+    # Per-weight norm tables: reuse cached ones, compute the rest in this pass.
+    norms = np.empty((n_weight, n_time), dtype=np.float64)
+    has_nan = np.zeros(n_time, dtype=bool)
+    have_nan_flags = False
+    cache_files = [None] * n_weight
+    missing = list(range(n_weight))
+    if cache_dir is not None:
+        cube_key = cube_signature(data)
+        if cube_key is not None:
+            missing = []
+            for k in range(n_weight):
+                cache_files[k] = _norm_cache_file(
+                    Path(cache_dir), cube_key, weights_signature(weight_stack.isel(weight=k))
+                )
+                table = _load_norm_table(cache_files[k], n_time)
+                if table is None:
+                    missing.append(k)
+                else:
+                    norms[k], has_nan = table
+                    have_nan_flags = True
+
+    for sl, block in iter_time_chunks(data, chunk_size):
+        if not have_nan_flags:
+            has_nan[sl] = np.isnan(block).any(axis=1)
+        clean = np.nan_to_num(block, nan=0.0) if has_nan[sl].any() else block
+        if missing:
+            norms[missing, sl] = ((clean * clean) @ W[missing].T).T
+
+        d = norms[:, sl] - 2.0 * (clean @ WrT).T + ref_norms[:, np.newaxis]
+        for row in np.flatnonzero(has_nan[sl]):
+            sq = np.nan_to_num((block[row] - r) ** 2, nan=0.0)
+            d[:, row] = W @ sq
+        distances[:, sl] = d
+
+    for k in missing:
+        if cache_files[k] is not None:
+            _save_norm_table(cache_files[k], norms[k], has_nan)
+
+    # Cancellation can leave tiny negative values for near-identical days.
+    np.maximum(distances, 0.0, out=distances)
+    return xr.DataArray(
+        distances,
+        coords={'weight': weight_stack['weight'].values, 'time': data.time},
+        dims=['weight', 'time'],
+    )
+
+
+# ---------------------------------------------------------------------------
+# Sorted / quantile cache for the Wasserstein metric
+# ---------------------------------------------------------------------------
+
+def _sorted_cache_file(cache_dir: Path, cube_key: str, n_quantiles: Optional[int] = None) -> Path:
+    if n_quantiles is None:
+        return cache_dir / f"sorted_{cube_key[:16]}.npy"
+    return cache_dir / f"sorted_{cube_key[:16]}_q{n_quantiles}.npy"
+
+
+def _open_sorted_table(path: Path, shape: Tuple[int, int]) -> Optional[np.ndarray]:
+    """Memory-map a cached sorted table; None if missing or inconsistent."""
+    if not path.exists():
+        return None
+    try:
+        table = np.load(path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    if table.shape != shape:
+        return None
+    return table
+
+
+def _write_table(path: Path, shape: Tuple[int, int], dtype: np.dtype, blocks) -> Optional[np.ndarray]:
+    """
+    Stream (slice, rows) blocks into a .npy file and return it memory-mapped.
+
+    Written to a temporary name and renamed, so readers never see a partial
+    table.  Returns None if the cache directory is not writable.
+    """
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + f".tmp{os.getpid()}")
+        out = np.lib.format.open_memmap(tmp, mode='w+', dtype=dtype, shape=shape)
+    except OSError:
+        return None
+    for sl, rows in blocks:
+        out[sl] = rows
+    out.flush()
+    del out
+    os.replace(tmp, path)
+    return np.load(path, mmap_mode='r')
+
+
+def _sorted_blocks(data: xr.DataArray, chunk_size: int):
+    """Yield (slice, sorted rows) per time chunk; NaNs count as zero anomaly."""
+    for sl, block in iter_time_chunks(data, chunk_size, dtype=None):
+        yield sl, np.sort(np.nan_to_num(block, nan=0.0), axis=1)
+
+
+def quantile_bins(n_spatial: int, n_quantiles: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Split n_spatial sorted values into n_quantiles near-equal probability bins.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        Index of the sample kept per bin (its midpoint) and the bin
+        probability mass (bin size / n_spatial).
+    """
+    edges = np.round(np.linspace(0, n_spatial, n_quantiles + 1)).astype(np.int64)
+    sizes = np.diff(edges)
+    return edges[:-1] + (sizes - 1) // 2, sizes / n_spatial
+
+
+def wasserstein_error_bound(value_range: Union[float, np.ndarray], n_spatial: int, n_quantiles: int) -> np.ndarray:
+    """
+    Upper bound on |W1_approx - W1| when W1 is evaluated on n_quantiles bins.
+
+    Within a bin both quantile functions are monotone, so replacing them by
+    their midpoint value costs at most the bin mass times the spread of u and
+    v inside the bin.  Summed over bins this is at most
+    max_bin_mass * (range(u) + range(v)), with value_range = range(u) + range(v).
+    """
+    max_bin = int(np.ceil(n_spatial / n_quantiles))
+    return np.asarray(value_range) * max_bin / n_spatial
+
+
+def quantiles_for_error(value_range: float, n_spatial: int, max_error: float) -> int:
+    """Smallest number of quantile bins whose error bound is <= max_error."""
+    if value_range <= 0 or max_error <= 0:
+        return n_spatial if max_error <= 0 else 1
+    max_bin = int(np.floor(max_error * n_spatial / value_range))
+    if max_bin < 1:
+        return n_spatial
+    return min(n_spatial, int(np.ceil(n_spatial / max_bin)))
+
+
+def load_sorted_cube(
+    data: xr.DataArray,
+    cache_dir: Path,
+    chunk_size: int = DEFAULT_TIME_CHUNK,
+) -> Optional[np.ndarray]:
+    """
+    Return the memory-mapped sorted cube, shape (time, n_spatial).
+
+    The table holds each day's flattened field sorted (NaNs counted as 0),
+    in the cube's dtype.  It is built chunk by chunk on first use and
+    memory-mapped on later calls.
+
+    Parameters
+    ----------
+    data : xr.DataArray
+        Data array with dimensions (time, lat, lon)
+    cache_dir : Path
+        Directory for the sorted table
+    chunk_size : int
+        Number of time steps per block while building
+
+    Returns
+    -------
+    np.ndarray or None
+        Memory-mapped table, or None if the cube has no identifiable source
+        file or the cache directory is not writable
+    """
+    cube_key = cube_signature(data)
+    if cube_key is None:
+        return None
+    shape = (data.sizes['time'], data.sizes['lat'] * data.sizes['lon'])
+    path = _sorted_cache_file(Path(cache_dir), cube_key)
+    table = _open_sorted_table(path, shape)
+    if table is None:
+        table = _write_table(path, shape, data.dtype, _sorted_blocks(data, chunk_size))
+    return table
+
+
+def _table_blocks(table: np.ndarray, chunk_size: int):
+    """Yield (slice, rows) time blocks of a (possibly memory-mapped) table."""
+    n_time = table.shape[0]
+    for start in range(0, n_time, chunk_size):
+        sl = slice(start, min(start + chunk_size, n_time))
+        yield sl, np.asarray(table[sl])
+
+
+def _load_quantile_table(
+    data: xr.DataArray,
+    sorted_cube: np.ndarray,
+    sample_idx: np.ndarray,
+    cache_dir: Path,
+    chunk_size: int,
+) -> Optional[np.ndarray]:
+    """Memory-mapped (time, n_quantiles) table sampled from the sorted cube."""
+    shape = (sorted_cube.shape[0], sample_idx.size)
+    path = _sorted_cache_file(Path(cache_dir), cube_signature(data), sample_idx.size)
+    table = _open_sorted_table(path, shape)
+    if table is None:
+        blocks = ((sl, rows[:, sample_idx]) for sl, rows in _table_blocks(sorted_cube, chunk_size))
+        table = _write_table(path, shape, sorted_cube.dtype, blocks)
+    return table
+
+
+def compute_wasserstein_distances_sorted(
+    data: xr.DataArray,
+    references: xr.DataArray,
+    cache_dir: Optional[Path] = None,
+    n_quantiles: Optional[int] = None,
+    max_error: Optional[float] = None,
+    chunk_size: int = DEFAULT_TIME_CHUNK,
+) -> xr.DataArray:
+    """
+    W1 distances from many references to every time step.
+
+    Exact by default: W1 = mean(|sort(u) - sort(v)|) over all grid points,
+    the cube's days sorted once per chunk (or read from the cache).  If
+    n_quantiles is set (or derived from max_error), days are compared on a
+    reduced set of quantiles and the result is approximate, with absolute
+    error at most wasserstein_error_bound(range(u) + range(v), ...).
+
+    With a cache_dir the sorted (and quantile) tables are read from disk;
+    otherwise each time chunk is sorted on the fly.  Either way only one
+    chunk is held in memory.
+
+    Parameters
+    ----------
+    data : xr.DataArray
+        Data array with dimensions (time, lat, lon)
+    references : xr.DataArray
+        Reference patterns with dimensions (ref, lat, lon)
+    cache_dir : Path, optional
+        Directory for the sorted / quantile tables
+    n_quantiles : int, optional
+        Number of quantile bins for approximate W1
+    max_error : float, optional
+        Target absolute error on W1; picks n_quantiles from the value ranges.
+        Ignored if n_quantiles is given.
+    chunk_size : int
+        Number of time steps per block
+
+    Returns
+    -------
+    xr.DataArray
+        W1 distances with dimensions (ref, time)
+    """
+    n_time = data.sizes['time']
+    refs = np.nan_to_num(references.transpose('ref', 'lat', 'lon').values, nan=0.0)
+    n_ref = refs.shape[0]
+    refs_sorted = np.sort(refs.reshape(n_ref, -1), axis=1)   # (ref, n_spatial)
+    n_spatial = refs_sorted.shape[1]
+
+    sorted_cube = None
+    if cache_dir is not None:
+        sorted_cube = load_sorted_cube(data, cache_dir, chunk_size=chunk_size)
+
+    if n_quantiles is None and max_error is not None:
+        day_range = 0.0
+        if sorted_cube is not None:
+            for _, Q in _table_blocks(sorted_cube, chunk_size):
+                day_range = max(day_range, float(np.max(Q[:, -1] - Q[:, 0])))
+        else:
+            for _, block in iter_time_chunks(data, chunk_size, dtype=None):
+                block = np.nan_to_num(block, nan=0.0)
+                day_range = max(day_range, float(np.max(block.max(axis=1) - block.min(axis=1))))
+        ref_range = float(np.max(refs_sorted[:, -1] - refs_sorted[:, 0]))
+        n_quantiles = quantiles_for_error(day_range + ref_range, n_spatial, max_error)
+
+    if sorted_cube is not None:
+        blocks = _table_blocks(sorted_cube, chunk_size)
+    else:
+        blocks = _sorted_blocks(data, chunk_size)
+
+    if n_quantiles is None or n_quantiles >= n_spatial:
+        # Same arithmetic (and dtype) as the direct sort-per-query path
+        distances = np.empty((n_ref, n_time), dtype=np.result_type(data.dtype, refs.dtype, np.float32))
+        for sl, Q in blocks:
+            for j in range(n_ref):
+                distances[j, sl] = np.mean(np.abs(Q - refs_sorted[j][np.newaxis, :]), axis=1)
+    else:
+        distances = np.empty((n_ref, n_time), dtype=np.float64)
+        sample_idx, mass = quantile_bins(n_spatial, int(n_quantiles))
+        table = None
+        if sorted_cube is not None:
+            table = _load_quantile_table(data, sorted_cube, sample_idx, cache_dir, chunk_size)
+        if table is not None:
+            blocks = _table_blocks(table, chunk_size)
+        else:
+            blocks = ((sl, Q[:, sample_idx]) for sl, Q in blocks)
+        q_refs = refs_sorted[:, sample_idx].astype(np.float64)
+        for sl, Q in blocks:
+            Q = Q.astype(np.float64)
+            for j in range(n_ref):
+                distances[j, sl] = np.abs(Q - q_refs[j][np.newaxis, :]) @ mass
+
+    return xr.DataArray(
+        distances,
+        coords={'ref': references['ref'].values, 'time': data.time},
+        dims=['ref', 'time'],
+    )
+
+
+# Block size (bytes of float64 prefix sums) for running_means
+RUNNING_MEAN_BLOCK_BYTES = 256 * 2**20
+
+
+def time_segments(times: np.ndarray) -> np.ndarray:
+    """
+    Label runs of consecutive days in a sorted time axis.
+
+    Calendar-window slices hold one run per year; a running mean must not
+    average across the gap between two runs.
+
+    Returns
+    -------
+    np.ndarray
+        Segment id per time step (0, 0, ..., 1, 1, ...)
+    """
+    days = np.asarray(times).astype('datetime64[D]').astype(np.int64)
+    return np.concatenate([[0], np.cumsum(np.diff(days) != 1)]) if days.size else days
+
+
+def _running_mean_cache_file(cache_dir: Path, cube_key: str, window: int) -> Path:
+    return cache_dir / f"runmean_{cube_key[:16]}_{window}d.npy"
+
+
+def _open_output_table(path: Path, shape: Tuple[int, ...], dtype: np.dtype) -> Optional[Tuple[Path, np.ndarray]]:
+    """Writable .npy memmap at a temporary name next to path; None if not writable."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + f".tmp{os.getpid()}")
+        return tmp, np.lib.format.open_memmap(tmp, mode='w+', dtype=dtype, shape=shape)
+    except OSError:
+        return None
+
+
+def running_means(
+    data: xr.DataArray,
+    windows: Sequence[int],
+    cache_dir: Optional[Path] = None,
+) -> Dict[int, xr.DataArray]:
+    """
+    N-day running means of a (time, lat, lon) cube for several N in one pass.
+
+    With S the prefix sum of the cube along time, the mean over days
+    [t - (N-1)//2, t + N//2] is (S[t + N//2 + 1] - S[t - (N-1)//2]) / N, so
+    every window costs O(T * space) and all windows share one cumulative
+    sum.  The cube is processed in latitude blocks of at most
+    RUNNING_MEAN_BLOCK_BYTES of prefix sums, so dask-backed and
+    memory-mapped cubes are read once, block by block.
+
+    With cache_dir, each smoothed cube is streamed into a .npy table keyed
+    by the source cube's signature and window, and returned memory-mapped:
+    RAM use stays at one block however many windows are built, and later
+    calls on the same cube reuse the tables.  Without cache_dir (or for
+    cubes without an identifiable source file) the results are in-memory
+    arrays.
+
+    Windows never span a gap in the time axis (see time_segments); days
+    without a full window inside their segment are dropped, as CDO runmean
+    drops the ends of a series.  NaNs are left out of the mean (a day is
+    NaN only where its whole window is).
+
+    Parameters
+    ----------
+    data : xr.DataArray
+        Daily data with dimensions (time, lat, lon), time ascending
+    windows : sequence of int
+        Window lengths in days; N <= 1 returns the cube unchanged
+    cache_dir : Path, optional
+        Directory for memory-mapped smoothed tables
+
+    Returns
+    -------
+    dict
+        N -> smoothed cube (time: window centres), in the cube's dtype.
+        Smoothed cubes keep the source encoding and carry the window in
+        attrs['running_mean_days'], so the distance caches key them apart
+        from the unsmoothed cube.
+    """
+    data = data.transpose('time', 'lat', 'lon')
+    results = {int(n): data for n in windows if int(n) <= 1}
+    todo = sorted({int(n) for n in windows if int(n) > 1})
+    if not todo:
+        return results
+
+    n_time, n_lat, n_lon = data.sizes['time'], data.sizes['lat'], data.sizes['lon']
+    segment = time_segments(data.time.values)
+    idx = np.arange(n_time)
+    seg_start = np.searchsorted(segment, segment, side='left')
+    seg_end = np.searchsorted(segment, segment, side='right')
+    cube_key = cube_signature(data) if cache_dir is not None else None
+
+    def wrap(n: int, values: np.ndarray, centre: np.ndarray) -> xr.DataArray:
+        smoothed = xr.DataArray(
+            values,
+            coords={'time': data.time.values[centre], 'lat': data.lat, 'lon': data.lon},
+            dims=('time', 'lat', 'lon'),
+            name=data.name,
+            attrs={**data.attrs, 'running_mean_days': n},
+        )
+        smoothed.encoding['source'] = data.encoding.get('source')
+        return smoothed
+
+    keep, out, pending = {}, {}, {}
+    for n in todo:
+        before, after = (n - 1) // 2, n // 2
+        centre = idx[(idx - before >= seg_start) & (idx + after < seg_end)]
+        shape = (centre.size, n_lat, n_lon)
+        if cube_key is not None:
+            path = _running_mean_cache_file(Path(cache_dir), cube_key, n)
+            table = _open_sorted_table(path, shape)
+            if table is not None:
+                results[n] = wrap(n, table, centre)
+                continue
+            opened = _open_output_table(path, shape, data.dtype)
+            if opened is not None:
+                pending[n] = (path,) + opened
+                out[n] = opened[1]
+        if n not in out:
+            out[n] = np.empty(shape, dtype=data.dtype)
+        keep[n] = (centre, centre - before, centre + after + 1)
+
+    if keep:
+        rows = max(1, RUNNING_MEAN_BLOCK_BYTES // (16 * (n_time + 1) * n_lon))
+        for start in range(0, n_lat, rows):
+            sl = slice(start, min(start + rows, n_lat))
+            block = np.asarray(data.isel(lat=sl).values, dtype=np.float64)
+            finite = np.isfinite(block)
+            sums = np.zeros((n_time + 1,) + block.shape[1:])
+            np.cumsum(np.where(finite, block, 0.0), axis=0, out=sums[1:])
+            counts = np.zeros((n_time + 1,) + block.shape[1:], dtype=np.int32)
+            np.cumsum(finite, axis=0, out=counts[1:])
+            del block, finite
+            for n, (_, lo, hi) in keep.items():
+                count = counts[hi] - counts[lo]
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    out[n][:, sl] = np.where(count > 0, (sums[hi] - sums[lo]) / count, np.nan)
+
+    for n, (centre, _, _) in keep.items():
+        if n in pending:
+            path, tmp, _ = pending.pop(n)
+            out.pop(n).flush()
+            os.replace(tmp, path)
+            results[n] = wrap(n, np.load(path, mmap_mode='r'), centre)
+        else:
+            results[n] = wrap(n, out[n], centre)
+    return results
+
+
+def running_mean_days(analogue_config: Dict) -> int:
+    """Running-mean window applied to the loaded cube (1 = unsmoothed; smoothing.in_search: false)."""
+    smoothing = analogue_config.get('smoothing', {}) or {}
+    if not smoothing.get('in_search', True):
+        return 1
+    return max(1, int(smoothing.get('window_days', 5)))
+
+
+def norm_cache_dir(paths: Dict[str, Path], analogue_config: Dict) -> Optional[Path]:
+    """Directory for cached per-day weighted norms, or None if distance.cache_norms is false."""
+    if (analogue_config.get('distance', {}) or {}).get('cache_norms', True):
+        return paths['analogue'] / 'cache' / 'norms'
+    return None
+
+
+def running_mean_cache_dir(paths: Dict[str, Path], analogue_config: Dict) -> Optional[Path]:
+    """Directory for memory-mapped smoothed cubes, or None if smoothing.cache_smoothed is false."""
+    if (analogue_config.get('smoothing', {}) or {}).get('cache_smoothed', True):
+        return paths['analogue'] / 'cache' / 'smoothed'
+    return None
+
+
+def running_mean(data: xr.DataArray, window: int, cache_dir: Optional[Path] = None) -> xr.DataArray:
+    """N-day running mean of a (time, lat, lon) cube; see running_means."""
+    return running_means(data, [window], cache_dir)[int(window)]
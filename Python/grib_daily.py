@@ -0,0 +1,379 @@
+"""
+Daily means straight from 6-hourly JRA-3Q GRIB files (ecCodes).
+
+The CDO path hands every anl_surf125.YYYYMMDDHH file of a month to
+mergetime, which parses and concatenates all messages of all files into a
+temporary month before selname/daymean.  This reader instead:
+
+  * reads only the wanted message (prmsl) of each file, by byte offset;
+  * decodes it, cuts the bbox and adds it to a per-day sum/count;
+  * writes the month of daily means as NetCDF directly.
+
+The offsets come from a small per-month index (JSON, one entry per file
+with its mtime/size, message offset/length and valid date/time).  Files
+whose signature matches the index are read without scanning their
+messages; new or changed files are scanned and the index updated.
+
+The bbox follows CDO sellonlatbox (inclusive bounds, longitudes shifted
+to start at lon_min) and latitudes are written south to north, as the
+CDO chain's -invertlat does for the north-to-south JRA-3Q grid.  Each
+daily value is stamped at 00:00 of its day.
+
+ecCodes is optional (pip install eccodes, or conda install -c conda-forge
+eccodes); the CDO path needs nothing extra.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+# Bump when the index layout changes
+GRIB_INDEX_VERSION = 1
+
+# ecCodes is not built thread-safe by default: handles are created and
+# decoded under this lock.  File reads happen outside it: messages are
+# framed in Python (raw_messages) and handed over as bytes.
+_ECCODES_LOCK = threading.Lock()
+
+
+def require_eccodes():
+    """The eccodes module, or ImportError with install instructions."""
+    try:
+        import eccodes
+    except ImportError:
+        raise ImportError(
+            "The eccodes GRIB reader needs ecCodes. Install: pip install eccodes "
+            "(or use --grib-reader cdo)"
+        ) from None
+    return eccodes
+
+
+def grid_from_handle(eccodes, h) -> Dict[str, np.ndarray]:
+    """Latitudes/longitudes of a regular_ll message (as stored, scanning order)."""
+    grid_type = eccodes.codes_get(h, "gridType")
+    if grid_type != "regular_ll":
+        raise ValueError(f"Unsupported GRIB grid {grid_type!r} (need regular_ll)")
+    if eccodes.codes_get(h, "iScansNegatively") or eccodes.codes_get(h, "jPointsAreConsecutive"):
+        raise ValueError("Unsupported GRIB scanning mode")
+    ni, nj = eccodes.codes_get(h, "Ni"), eccodes.codes_get(h, "Nj")
+    lat0 = eccodes.codes_get(h, "latitudeOfFirstGridPointInDegrees")
+    lat1 = eccodes.codes_get(h, "latitudeOfLastGridPointInDegrees")
+    lon0 = eccodes.codes_get(h, "longitudeOfFirstGridPointInDegrees")
+    lon1 = eccodes.codes_get(h, "longitudeOfLastGridPointInDegrees")
+    if lon1 < lon0:
+        lon1 += 360.0
+    return {"lat": np.linspace(lat0, lat1, nj), "lon": np.linspace(lon0, lon1, ni)}
+
+
+def bbox_index(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    lon_min: float,
+    lon_max: float,
+    lat_min: float,
+    lat_max: float,
+) -> Dict[str, np.ndarray]:
+    """
+    Grid indices of a bbox, like CDO sellonlatbox.
+
+    Returns
+    -------
+    dict
+        lat_idx (south to north), lon_idx (eastwards from lon_min) and the
+        selected lat/lon values (lon shifted into [lon_min, lon_min + 360))
+    """
+    lat_idx = np.flatnonzero((lat >= lat_min) & (lat <= lat_max))
+    lat_idx = lat_idx[np.argsort(lat[lat_idx], kind="stable")]
+
+    lon_shifted = lon_min + np.mod(lon - lon_min, 360.0)
+    east = lon_max if lon_max >= lon_min else lon_max + 360.0
+    lon_idx = np.flatnonzero(lon_shifted <= east)
+    lon_idx = lon_idx[np.argsort(lon_shifted[lon_idx], kind="stable")]
+
+    if not len(lat_idx) or not len(lon_idx):
+        raise ValueError(f"bbox lon[{lon_min}, {lon_max}] lat[{lat_min}, {lat_max}] selects no grid points")
+    return {"lat_idx": lat_idx, "lon_idx": lon_idx, "lat": lat[lat_idx], "lon": lon_shifted[lon_idx]}
+
+
+def raw_messages(f):
+    """
+    (offset, bytes) of each GRIB message in an open binary file.
+
+    Messages are framed from the indicator section ("GRIB", total length,
+    edition) in plain Python, so no ecCodes call touches the file.  Yields
+    (offset, None) for a GRIB1 message with the large-message length flag,
+    whose true length only ecCodes can work out.
+    """
+    pos = 0
+    while True:
+        f.seek(pos)
+        head = f.read(16)
+        if len(head) < 16:
+            return
+        if head[:4] != b"GRIB":
+            # Padding between messages: skip to the next indicator
+            skip = (head + f.read()).find(b"GRIB")
+            if skip < 0:
+                return
+            pos += skip
+            continue
+        edition = head[7]
+        if edition == 1:
+            length = int.from_bytes(head[4:7], "big")
+            if length & 0x800000:
+                yield pos, None
+                return
+        elif edition == 2:
+            length = int.from_bytes(head[8:16], "big")
+        else:
+            raise ValueError(f"Unsupported GRIB edition {edition} at byte {pos} of {getattr(f, 'name', '?')}")
+        f.seek(pos)
+        yield pos, f.read(length)
+        pos += length
+
+
+def message_entry(eccodes, h, offset: int, length: int) -> Dict[str, Any]:
+    """Index entry (offset/length, valid date/time) of a decoded message."""
+    return {
+        "offset": offset,
+        "length": length,
+        "date": int(eccodes.codes_get(h, "dataDate")),
+        "time": int(eccodes.codes_get(h, "dataTime")),
+    }
+
+
+def scan_file(path: Path, short_name: str) -> Optional[Dict[str, Any]]:
+    """Offset/length and valid date/time of the first short_name message in a GRIB file."""
+    eccodes = require_eccodes()
+    with open(path, "rb") as f:
+        for offset, raw in raw_messages(f):
+            if raw is None:
+                return scan_file_eccodes(path, short_name)
+            with _ECCODES_LOCK:
+                h = eccodes.codes_new_from_message(raw)
+                try:
+                    if eccodes.codes_get(h, "shortName") == short_name:
+                        return message_entry(eccodes, h, offset, len(raw))
+                finally:
+                    eccodes.codes_release(h)
+    return None
+
+
+def scan_file_eccodes(path: Path, short_name: str) -> Optional[Dict[str, Any]]:
+    """scan_file fallback letting ecCodes read the file (under the lock)."""
+    eccodes = require_eccodes()
+    with open(path, "rb") as f:
+        while True:
+            with _ECCODES_LOCK:
+                h = eccodes.codes_grib_new_from_file(f)
+                if h is None:
+                    return None
+                try:
+                    if eccodes.codes_get(h, "shortName") == short_name:
+                        return message_entry(
+                            eccodes, h,
+                            int(eccodes.codes_get(h, "offset")),
+                            int(eccodes.codes_get(h, "totalLength")),
+                        )
+                finally:
+                    eccodes.codes_release(h)
+
+
+def load_index(index_path: Optional[Path], short_name: str) -> Dict[str, Dict[str, Any]]:
+    """File name -> index entry, or {} if missing, outdated or for another parameter."""
+    if index_path is None or not index_path.exists():
+        return {}
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except ValueError:
+        return {}
+    if index.get("version") != GRIB_INDEX_VERSION or index.get("short_name") != short_name:
+        return {}
+    return index.get("files", {})
+
+
+def save_index(index_path: Path, short_name: str, files: Dict[str, Dict[str, Any]]) -> None:
+    """Write a month index atomically."""
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = index_path.with_name(f".{index_path.name}.tmp{os.getpid()}")
+    with open(tmp, "w") as f:
+        json.dump({"version": GRIB_INDEX_VERSION, "short_name": short_name, "files": files}, f)
+    os.replace(tmp, index_path)
+
+
+def index_messages(
+    grib_files: List[Path],
+    short_name: str,
+    index_path: Optional[Path] = None,
+) -> Tuple[List[Tuple[Path, Dict[str, Any]]], int]:
+    """
+    Message location of short_name in each file, from the index where still valid.
+
+    Returns
+    -------
+    (list, int)
+        (path, entry) per file holding the message, in input order, and the
+        number of files that had to be scanned
+    """
+    cached = load_index(index_path, short_name)
+    entries: Dict[str, Dict[str, Any]] = {}
+    located: List[Tuple[Path, Dict[str, Any]]] = []
+    scanned = 0
+    for path in grib_files:
+        st = os.stat(path)
+        entry = cached.get(path.name)
+        if entry is None or (entry["mtime_ns"], entry["size"]) != (st.st_mtime_ns, st.st_size):
+            scanned += 1
+            found = scan_file(path, short_name)
+            entry = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "message": found}
+        entries[path.name] = entry
+        if entry["message"] is not None:
+            located.append((path, entry["message"]))
+    if index_path is not None and (scanned or set(entries) != set(cached)):
+        save_index(index_path, short_name, entries)
+    return located, scanned
+
+
+def read_message(path: Path, message: Dict[str, Any]):
+    """Read one GRIB message by offset; returns (values as stored 2D, grid, attrs)."""
+    eccodes = require_eccodes()
+    with open(path, "rb") as f:
+        f.seek(message["offset"])
+        raw = f.read(message["length"])
+    with _ECCODES_LOCK:
+        h = eccodes.codes_new_from_message(raw)
+        try:
+            grid = grid_from_handle(eccodes, h)
+            values = np.asarray(eccodes.codes_get_values(h), dtype=np.float64)
+            if eccodes.codes_get(h, "bitmapPresent"):
+                values[values == eccodes.codes_get(h, "missingValue")] = np.nan
+            attrs = {
+                "long_name": eccodes.codes_get(h, "name"),
+                "units": eccodes.codes_get(h, "units"),
+            }
+        finally:
+            eccodes.codes_release(h)
+    return values.reshape(len(grid["lat"]), len(grid["lon"])), grid, attrs
+
+
+def daily_means(
+    grib_files: List[Path],
+    short_name: str,
+    lon_min: float,
+    lon_max: float,
+    lat_min: float,
+    lat_max: float,
+    index_path: Optional[Path] = None,
+) -> Dict[str, Any]:
+    """
+    Daily means of one GRIB parameter over a bbox.
+
+    Returns
+    -------
+    dict
+        'time' (DatetimeIndex, one per day with data), 'data' (time, lat, lon)
+        float32, 'lat', 'lon', 'attrs', 'n_messages', 'n_scanned'
+    """
+    located, scanned = index_messages(grib_files, short_name, index_path)
+    if not located:
+        raise ValueError(f"No {short_name} messages in {len(grib_files)} GRIB file(s)")
+
+    sums: Dict[pd.Timestamp, np.ndarray] = {}
+    counts: Dict[pd.Timestamp, np.ndarray] = {}
+    box = attrs = None
+    for path, message in located:
+        values, grid, msg_attrs = read_message(path, message)
+        if box is None:
+            box = bbox_index(grid["lat"], grid["lon"], lon_min, lon_max, lat_min, lat_max)
+            attrs = msg_attrs
+        sub = values[np.ix_(box["lat_idx"], box["lon_idx"])]
+        day = pd.Timestamp(str(message["date"]))
+        if day not in sums:
+            sums[day] = np.zeros(sub.shape)
+            counts[day] = np.zeros(sub.shape, dtype=np.int32)
+        finite = np.isfinite(sub)
+        sums[day] += np.where(finite, sub, 0.0)
+        counts[day] += finite
+
+    days = sorted(sums)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        data = np.stack([np.where(counts[d] > 0, sums[d] / np.maximum(counts[d], 1), np.nan) for d in days])
+    return {
+        "time": pd.DatetimeIndex(days),
+        "data": data.astype(np.float32),
+        "lat": box["lat"],
+        "lon": box["lon"],
+        "attrs": attrs,
+        "n_messages": len(located),
+        "n_scanned": scanned,
+    }
+
+
+def write_daily_netcdf(result: Dict[str, Any], dst: Path, name: str) -> Path:
+    """Write daily_means output as NetCDF (time, lat, lon); atomic."""
+    time = result["time"]
+    ds = xr.Dataset(
+        {name: (("time", "lat", "lon"), result["data"], result["attrs"])},
+        coords={
+            "time": time,
+            "lat": ("lat", result["lat"], {"standard_name": "latitude", "units": "degrees_north"}),
+            "lon": ("lon", result["lon"], {"standard_name": "longitude", "units": "degrees_east"}),
+        },
+    )
+    ds["time"].encoding.update({
+        "units": f"hours since {time[0]:%Y-%m-%d} 00:00:00",
+        "calendar": "standard",
+        "dtype": "float64",
+    })
+    dst = Path(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(f".{dst.name}.tmp{os.getpid()}")
+    ds.to_netcdf(tmp)
+    os.replace(tmp, dst)
+    return dst
+
+
+def grib_month_to_daily(
+    grib_files: List[Path],
+    dst: Path,
+    lon_min: float,
+    lon_max: float,
+    lat_min: float,
+    lat_max: float,
+    short_name: str = "prmsl",
+    out_name: str = "psurf",
+    index_path: Optional[Path] = None,
+) -> Dict[str, Any]:
+    """
+    One month of 6-hourly GRIB files -> NetCDF of daily bbox means.
+
+    Parameters
+    ----------
+    grib_files : list of Path
+        GRIB files of the month (any order)
+    dst : Path
+        Output NetCDF
+    lon_min, lon_max, lat_min, lat_max : float
+        Bbox (CDO sellonlatbox semantics)
+    short_name : str
+        GRIB parameter to read
+    out_name : str
+        Variable name in the output
+    index_path : Path, optional
+        Month index (JSON) of message offsets; None scans every file
+
+    Returns
+    -------
+    dict
+        'n_days', 'n_messages', 'n_scanned'
+    """
+    result = daily_means(grib_files, short_name, lon_min, lon_max, lat_min, lat_max, index_path)
+    write_daily_netcdf(result, dst, out_name)
+    return {"n_days": len(result["time"]), "n_messages": result["n_messages"], "n_scanned": result["n_scanned"]}
@@ -9,7 +9,8 @@ Usage:
     --outdir path/to/output_dir [--target-date YYYY-MM-DD]
 
 This script:
- - reads analogues.csv (CSV with rows like: date,timer,year,month,day,rank,period)
+ - reads analogues.csv (CSV with rows like: date,timer,year,month,day,rank,period),
+   or an analogues.parquet table
  - parses monthly index files (robust to leading headers; finds lines starting with 4-digit year)
  - linearly interpolates monthly values to daily resolution using the 15th of
    each month as the anchor point, so that analogue snapshots (which are daily)
@@ -170,7 +171,16 @@ def read_analogues(path):
     Expect CSV with at least columns:
     date_str, someval, year, month, day, rank, period
     Returns list of dicts with 'date', 'year', 'month', 'day', 'period'.
+    A .parquet analogue table (analogue_search.py --output_format parquet)
+    is read by column name instead.
     """
+    if path.endswith('.parquet'):
+        from table_io import read_table  # pandas/pyarrow only needed for Parquet input
+        df = read_table(path)
+        return [
+            {'date': d.strftime("%Y-%m-%d"), 'year': int(y), 'month': int(m), 'day': int(dd), 'period': str(p)}
+            for d, y, m, dd, p in zip(df['date'], df['year'], df['month'], df['day'], df['period'])
+        ]
     rows = []
     with open(path, 'r', encoding='utf-8', errors='ignore') as f:
         reader = csv.reader(f)
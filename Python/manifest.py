@@ -0,0 +1,297 @@
+"""
+Processing manifest: one SQLite table of produced artifacts for skip decisions.
+
+Every stage used to decide "already done?" on its own (output exists, output
+larger than 1000 bytes, combined file present), so an output built from
+since-changed inputs or settings was never rebuilt.  Stages now record each
+artifact they write:
+
+    path        output file (absolute)
+    stage       producing stage (e.g. 'era5_slice', 'event_bbox')
+    inputs      sha1 of the input signatures (path, mtime_ns, size)
+    config      sha1 of the settings that determine the output
+    size, mtime_ns  output file stat when recorded
+    seconds     wall time of the build
+
+and consult it before building.  An artifact is current when its row
+exists, the input and config hashes match and the output still has the
+recorded size and mtime: one indexed lookup plus a stat of the output and
+its inputs, no directory scans.  Inputs are identified by stat signature
+rather than content hash; hashing multi-GB NetCDF inputs would cost more
+than most rebuilds.
+
+Outputs that exist but were written before the manifest (no row) are
+adopted as current if no input is newer than the output, so introducing
+the manifest does not trigger a full rebuild; an untracked output older
+than any of its inputs is rebuilt.  --force rebuilds everything.
+
+The database is $PIPELINE_MANIFEST or <Data>/manifest.sqlite.  Each call
+opens its own short-lived connection, so the functions can be used from
+worker threads and processes; SQLite's locking serialises the writes.
+
+Usage:
+    python3 manifest.py                 # artifacts and build time per stage
+    python3 manifest.py --stage era5_slice --list
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+PathLike = Union[str, Path]
+
+MANIFEST_ENV = "PIPELINE_MANIFEST"
+# Seconds to wait for another writer's lock
+BUSY_TIMEOUT = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    path        TEXT PRIMARY KEY,
+    stage       TEXT NOT NULL,
+    inputs      TEXT NOT NULL,
+    n_inputs    INTEGER NOT NULL,
+    config      TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    seconds     REAL,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_stage ON artifacts (stage);
+"""
+
+
+def manifest_path(data_dir: PathLike) -> Path:
+    """Manifest database: $PIPELINE_MANIFEST, else <data_dir>/manifest.sqlite."""
+    return Path(os.environ.get(MANIFEST_ENV) or Path(data_dir) / "manifest.sqlite")
+
+
+def connect(db: PathLike) -> sqlite3.Connection:
+    """Open (and create if needed) the manifest database."""
+    Path(db).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db), timeout=BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _key(path: PathLike) -> str:
+    return os.path.abspath(path)
+
+
+def config_hash(config: Dict[str, Any]) -> str:
+    """sha1 of the settings (JSON, sorted keys)."""
+    blob = json.dumps(config, sort_keys=True, default=str).encode()
+    return hashlib.sha1(blob).hexdigest()
+
+
+def inputs_hash(inputs: Iterable[PathLike]) -> Tuple[str, int]:
+    """sha1 of the (path, mtime_ns, size) signatures of the inputs, and their number."""
+    h = hashlib.sha1()
+    n = 0
+    for p in inputs:
+        try:
+            st = os.stat(p)
+            sig = f"{os.path.abspath(p)}:{st.st_mtime_ns}:{st.st_size}"
+        except FileNotFoundError:
+            sig = f"{os.path.abspath(p)}:missing"
+        h.update(sig.encode() + b"\n")
+        n += 1
+    return h.hexdigest(), n
+
+
+def lookup(db: PathLike, output: PathLike) -> Optional[Dict[str, Any]]:
+    """Manifest row of an output, or None."""
+    with closing(connect(db)) as conn:
+        row = conn.execute("SELECT * FROM artifacts WHERE path = ?", (_key(output),)).fetchone()
+    return dict(row) if row is not None else None
+
+
+def record(
+    db: PathLike,
+    output: PathLike,
+    stage: str,
+    inputs: Iterable[PathLike],
+    config: Dict[str, Any],
+    seconds: Optional[float] = None,
+) -> None:
+    """Record a freshly written output (call after it is in place)."""
+    digest, n_inputs = inputs_hash(inputs)
+    st = os.stat(output)
+    with closing(connect(db)) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (_key(output), stage, digest, n_inputs, config_hash(config),
+             st.st_size, st.st_mtime_ns, seconds, time.time()),
+        )
+
+
+def recorded_outputs(db: PathLike, stage: str, config: Dict[str, Any]) -> set:
+    """
+    Outputs (absolute paths) recorded for a stage with these settings.
+
+    One query and no stat calls: the fast resume path for callers that
+    trust the manifest (e.g. preprocess_era5.py --resume).  Changed inputs
+    or outputs are not detected.
+    """
+    if not Path(db).exists():
+        return set()
+    with closing(connect(db)) as conn:
+        rows = conn.execute(
+            "SELECT path FROM artifacts WHERE stage = ? AND config = ?", (stage, config_hash(config))
+        ).fetchall()
+    return {row["path"] for row in rows}
+
+
+def forget(db: PathLike, output: PathLike) -> None:
+    """Drop an output's row (e.g. after deleting the file)."""
+    with closing(connect(db)) as conn, conn:
+        conn.execute("DELETE FROM artifacts WHERE path = ?", (_key(output),))
+
+
+def newer_inputs(output: PathLike, inputs: Iterable[PathLike]) -> List[str]:
+    """Inputs modified after the output was written (missing inputs are not counted)."""
+    out_mtime = os.stat(output).st_mtime_ns
+    newer = []
+    for p in inputs:
+        try:
+            if os.stat(p).st_mtime_ns > out_mtime:
+                newer.append(str(p))
+        except FileNotFoundError:
+            continue
+    return newer
+
+
+def artifact_status(
+    db: PathLike,
+    output: PathLike,
+    inputs: Iterable[PathLike],
+    config: Dict[str, Any],
+) -> str:
+    """
+    Whether an output is up to date.
+
+    Returns
+    -------
+    str
+        'current', 'missing' (no output file), 'untracked' (file without a
+        row), 'stale: output changed', 'stale: inputs changed' or
+        'stale: config changed'
+    """
+    try:
+        st = os.stat(output)
+    except FileNotFoundError:
+        return "missing"
+    row = lookup(db, output)
+    if row is None:
+        return "untracked"
+    if (row["size"], row["mtime_ns"]) != (st.st_size, st.st_mtime_ns):
+        return "stale: output changed"
+    if row["config"] != config_hash(config):
+        return "stale: config changed"
+    if row["inputs"] != inputs_hash(inputs)[0]:
+        return "stale: inputs changed"
+    return "current"
+
+
+def needs_build(
+    db: Optional[PathLike],
+    output: PathLike,
+    stage: str,
+    inputs: Iterable[PathLike],
+    config: Dict[str, Any],
+    force: bool = False,
+    adopt: bool = True,
+) -> Tuple[bool, str]:
+    """
+    Skip/rebuild decision for one output.
+
+    Parameters
+    ----------
+    db : path or None
+        Manifest database; None falls back to "build if the output is missing"
+    output : path
+        Output file
+    stage : str
+        Producing stage (stored when an untracked output is adopted)
+    inputs : iterable of paths
+        Files the output is built from
+    config : dict
+        Settings that determine the output
+    force : bool
+        Always build
+    adopt : bool
+        Record an existing output that has no row as current instead of
+        rebuilding it, unless one of its inputs is newer than the output
+
+    Returns
+    -------
+    (bool, str)
+        Whether to build, and the artifact status (or 'forced')
+    """
+    if force:
+        return True, "forced"
+    if db is None:
+        return (False, "current") if Path(output).exists() else (True, "missing")
+    inputs = list(inputs)
+    status = artifact_status(db, output, inputs, config)
+    if status == "untracked" and adopt:
+        if newer_inputs(output, inputs):
+            return True, "stale: untracked, inputs newer"
+        record(db, output, stage, inputs, config)
+        return False, "adopted"
+    return status != "current", status
+
+
+def stage_summary(db: PathLike) -> List[Dict[str, Any]]:
+    """Artifacts, total size and total recorded build time per stage."""
+    with closing(connect(db)) as conn:
+        rows = conn.execute(
+            "SELECT stage, COUNT(*) AS n, SUM(size) AS bytes, SUM(seconds) AS seconds "
+            "FROM artifacts GROUP BY stage ORDER BY stage"
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def main():
+    root = Path(__file__).resolve().parent.parent
+    parser = argparse.ArgumentParser(description="Inspect the processing manifest")
+    parser.add_argument("--db", default=None,
+                        help="Manifest database (default: $PIPELINE_MANIFEST or Data/manifest.sqlite)")
+    parser.add_argument("--stage", default=None, help="Only this stage")
+    parser.add_argument("--list", action="store_true", help="List artifacts instead of the per-stage summary")
+    args = parser.parse_args()
+
+    db = Path(args.db) if args.db else manifest_path(root / "Data")
+    if not db.exists():
+        print(f"No manifest at {db}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.list:
+        with closing(connect(db)) as conn:
+            query = "SELECT path, stage, size, seconds FROM artifacts"
+            params: tuple = ()
+            if args.stage:
+                query += " WHERE stage = ?"
+                params = (args.stage,)
+            for row in conn.execute(query + " ORDER BY path", params):
+                seconds = f"{row['seconds']:.1f}s" if row["seconds"] is not None else "-"
+                print(f"{row['stage']:<18} {row['size']:>14,d} {seconds:>9}  {row['path']}")
+        return
+
+    print(f"Manifest: {db}")
+    for row in stage_summary(db):
+        if args.stage and row["stage"] != args.stage:
+            continue
+        print(f"  {row['stage']:<18} {row['n']:>7d} artifacts  {row['bytes'] / 1e9:9.2f} GB  "
+              f"{(row['seconds'] or 0.0) / 3600:8.2f} h build time")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Land and analysis-domain masks aligned to the T2m data_slice grid, cached.
+
+F03 tools average T2m over land (ERA5 LSM) or over a named domain from
+peninsula_domain_masks.nc.  Aligning either source to the T2m bbox grid
+means opening the source file, subsetting it and a nearest-neighbour
+reindex_like with longitude-convention handling.  The result only depends
+on the source file, the bbox and the target grid, so it is done once and
+stored under a key built from:
+
+    kind, source file (path, mtime, size), variable, threshold, bbox,
+    grid fingerprint (sha1 of the target latitude/longitude values)
+
+Each cache entry (mask_<key>.npz) holds the 2D boolean mask on the target
+grid and its flat index array (np.flatnonzero), so later runs load it
+without touching the source file.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+import xarray as xr
+
+# Bump when the alignment changes
+MASK_CACHE_VERSION = 1
+LAND_THRESHOLD = 0.5
+MASK_THRESHOLD = 0.5
+
+
+def coord_name(obj, candidates: tuple[str, ...]) -> str:
+    """Return the first matching coordinate/dimension name from candidates."""
+    names = set(getattr(obj, "coords", {})) | set(getattr(obj, "dims", ()))
+    for candidate in candidates:
+        if candidate in names:
+            return candidate
+    lower_lookup = {name.lower(): name for name in names}
+    for candidate in candidates:
+        match = lower_lookup.get(candidate.lower())
+        if match is not None:
+            return match
+    raise KeyError(f"Could not find any of {candidates!r} in {names!r}")
+
+
+def grid_fingerprint(lat: np.ndarray, lon: np.ndarray) -> str:
+    """sha1 of the target grid coordinates (float64, in order)."""
+    h = hashlib.sha1()
+    for values in (lat, lon):
+        arr = np.ascontiguousarray(values, dtype=np.float64)
+        h.update(str(arr.shape).encode())
+        h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+def _grid_template(lat: np.ndarray, lon: np.ndarray) -> xr.DataArray:
+    """Coordinate-only DataArray for reindex_like."""
+    return xr.DataArray(
+        np.zeros((len(lat), len(lon)), dtype=np.int8),
+        coords={"latitude": np.asarray(lat), "longitude": np.asarray(lon)},
+        dims=("latitude", "longitude"),
+    )
+
+
+def align_land_mask(
+    lsm_path: str,
+    lat_min: float,
+    lat_max: float,
+    lon_min: float,
+    lon_max: float,
+    t2m_template: xr.DataArray,
+    threshold: float = LAND_THRESHOLD,
+) -> np.ndarray:
+    """Load ERA5 LSM, subset to bbox, align to T2m grid. Return 2D boolean (True=land)."""
+    ds = xr.open_dataset(lsm_path, engine="netcdf4")
+    try:
+        lsm = ds["lsm"].isel(time=0)
+        if str(lsm.dtype) in ("int16", "int32"):
+            sf = float(getattr(ds["lsm"], "scale_factor", 1.0))
+            ao = float(getattr(ds["lsm"], "add_offset", 0.0))
+            lsm = lsm.astype(np.float64) * sf + ao
+        lon = lsm.coords["longitude"]
+        lat_coord = lsm.coords["latitude"]
+        lon_0_360 = float(lon.min()) >= 0
+        lat_desc = float(lat_coord[0]) > float(lat_coord[-1])
+        # bbox lon is 0–360; convert to LSM convention for selection
+        if lon_0_360:
+            lon_lo, lon_hi = lon_min, lon_max
+        else:
+            # LSM uses -180 to 180; convert bbox 0–360 -> -180–180
+            lon_lo = lon_min - 360 if lon_min > 180 else lon_min
+            lon_hi = lon_max - 360 if lon_max > 180 else lon_max
+        # LSM lat: use slice(lat_max, lat_min) when descending (90 -> -90)
+        lat_slice = slice(lat_max, lat_min) if lat_desc else slice(lat_min, lat_max)
+        lsm_sub = lsm.sel(
+            latitude=lat_slice,
+            longitude=slice(lon_lo, lon_hi),
+        )
+        # reindex_like needs matching lon convention: convert t2m -180-180 -> 0-360
+        # so nearest-neighbor works (xarray does not handle lon wraparound)
+        tpl = t2m_template
+        tpl_lon = tpl.coords["longitude"]
+        if float(tpl_lon.min()) < 0 and lon_0_360:
+            lon_0360 = tpl_lon.where(tpl_lon >= 0, tpl_lon + 360)
+            tpl = tpl.assign_coords(longitude=lon_0360)
+        lsm_aligned = lsm_sub.reindex_like(tpl, method="nearest")
+        return (lsm_aligned.values >= threshold).squeeze()
+    finally:
+        ds.close()
+
+
+def align_domain_mask(
+    mask_path: str,
+    mask_var: str,
+    lat_min: float,
+    lat_max: float,
+    lon_min: float,
+    lon_max: float,
+    t2m_template: xr.DataArray,
+    threshold: float = MASK_THRESHOLD,
+) -> np.ndarray:
+    """Load a named analysis-domain mask and align it to the T2m subset grid."""
+    ds = xr.open_dataset(mask_path)
+    try:
+        if mask_var not in ds:
+            raise KeyError(f"Mask variable {mask_var!r} not found in {mask_path}")
+        mask = ds[mask_var]
+        mask_lat = coord_name(mask, ("latitude", "lat"))
+        mask_lon = coord_name(mask, ("longitude", "lon"))
+
+        if float(mask[mask_lon].min()) < 0:
+            mask = mask.assign_coords({mask_lon: np.mod(mask[mask_lon], 360.0)})
+            mask = mask.sortby(mask_lon)
+
+        lat_desc = float(mask[mask_lat][0]) > float(mask[mask_lat][-1])
+        lat_slice = slice(lat_max, lat_min) if lat_desc else slice(lat_min, lat_max)
+        mask_sub = mask.sel(
+            {
+                mask_lat: lat_slice,
+                mask_lon: slice(lon_min, lon_max),
+            }
+        )
+
+        tpl = t2m_template
+        tpl_lat = coord_name(tpl, ("latitude", "lat"))
+        tpl_lon = coord_name(tpl, ("longitude", "lon"))
+        if float(tpl[tpl_lon].min()) < 0 and float(mask_sub[mask_lon].min()) >= 0:
+            lon_0360 = tpl[tpl_lon].where(tpl[tpl_lon] >= 0, tpl[tpl_lon] + 360)
+            tpl = tpl.assign_coords({tpl_lon: lon_0360})
+
+        renames = {}
+        if mask_lat != tpl_lat:
+            renames[mask_lat] = tpl_lat
+        if mask_lon != tpl_lon:
+            renames[mask_lon] = tpl_lon
+        if renames:
+            mask_sub = mask_sub.rename(renames)
+
+        mask_aligned = mask_sub.reindex_like(tpl, method="nearest")
+        return (mask_aligned.values > threshold).squeeze()
+    finally:
+        ds.close()
+
+
+def mask_key(
+    kind: str,
+    source_path: str,
+    variable: str,
+    threshold: float,
+    bbox: Tuple[float, float, float, float],
+    lat: np.ndarray,
+    lon: np.ndarray,
+) -> str:
+    """Cache key for a mask aligned to one target grid."""
+    real = os.path.realpath(source_path)
+    st = os.stat(real)
+    blob = json.dumps({
+        "version": MASK_CACHE_VERSION,
+        "kind": kind,
+        "source": [real, st.st_mtime_ns, st.st_size],
+        "variable": variable,
+        "threshold": float(threshold),
+        "bbox": [round(float(v), 6) for v in bbox],
+        "grid": grid_fingerprint(lat, lon),
+    }, sort_keys=True).encode()
+    return hashlib.sha1(blob).hexdigest()[:16]
+
+
+def _registered_mask(
+    key: str,
+    build: Callable[[], np.ndarray],
+    cache_dir: Optional[str],
+) -> Dict[str, Any]:
+    cache_file = Path(cache_dir) / f"mask_{key}.npz" if cache_dir is not None else None
+    if cache_file is not None and cache_file.exists():
+        with np.load(cache_file) as z:
+            return {"key": key, "mask": z["mask"], "flat_index": z["flat_index"]}
+
+    mask = np.asarray(build(), dtype=bool)
+    entry = {"key": key, "mask": mask, "flat_index": np.flatnonzero(mask)}
+    if cache_file is not None:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_name(cache_file.name + f".tmp{os.getpid()}")
+        with open(tmp, "wb") as f:
+            np.savez(f, mask=entry["mask"], flat_index=entry["flat_index"])
+        os.replace(tmp, cache_file)
+    return entry
+
+
+def land_mask(
+    lsm_path: str,
+    bbox: Tuple[float, float, float, float],
+    lat: np.ndarray,
+    lon: np.ndarray,
+    cache_dir: Optional[str] = None,
+    threshold: float = LAND_THRESHOLD,
+) -> Dict[str, Any]:
+    """
+    ERA5 land mask on the target grid, from the registry or aligned and stored.
+
+    Parameters
+    ----------
+    lsm_path : str
+        ERA5 land-sea mask NetCDF (variable lsm)
+    bbox : tuple
+        (lat_min, lat_max, lon_min, lon_max), longitude 0–360
+    lat, lon : np.ndarray
+        Target grid coordinates (the T2m bbox subset)
+    cache_dir : str, optional
+        Registry directory; None aligns without caching
+    threshold : float
+        LSM fraction counted as land
+
+    Returns
+    -------
+    dict
+        key, mask (2D bool, True=land), flat_index (indices of True cells)
+    """
+    key = mask_key("land", lsm_path, "lsm", threshold, bbox, lat, lon)
+    return _registered_mask(
+        key,
+        lambda: align_land_mask(lsm_path, *bbox, _grid_template(lat, lon), threshold),
+        cache_dir,
+    )
+
+
+def domain_mask(
+    mask_path: str,
+    mask_var: str,
+    bbox: Tuple[float, float, float, float],
+    lat: np.ndarray,
+    lon: np.ndarray,
+    cache_dir: Optional[str] = None,
+    threshold: float = MASK_THRESHOLD,
+) -> Dict[str, Any]:
+    """Named domain mask on the target grid; same registry and return value as land_mask."""
+    key = mask_key("domain", mask_path, mask_var, threshold, bbox, lat, lon)
+    return _registered_mask(
+        key,
+        lambda: align_domain_mask(mask_path, mask_var, *bbox, _grid_template(lat, lon), threshold),
+        cache_dir,
+    )
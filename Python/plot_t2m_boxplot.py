@@ -3,7 +3,9 @@
 T2m box-and-whisker plot by lead time for analogue members.
 
 Uses pre-sliced T2m data (Data/data_slice) for fast loading. Domain mean
-over the slice (Antarctic Peninsula). Per lead day: box = 25th–75th percentile,
+over the slice (Antarctic Peninsula). The daily domain-mean series for all
+months is built once per (bbox, mask) and cached (see data_slice_io.py), so
+members and background years are array lookups. Per lead day: box = 25th–75th percentile,
 whiskers = min–max. Blue = past analogues, red = present analogues, black dot = target.
 
 Usage:
@@ -14,7 +16,7 @@ Usage:
 
 Reads:
   - extreme_events.yaml (event start/end, snapshot_date)
-  - analogues.csv (analogue dates, period, rank)
+  - analogues.csv or analogues.parquet (analogue dates, period, rank)
   - data_slice/YYYYMM.nc (T2m, monthly files)
 """
 import argparse
@@ -29,11 +31,21 @@ import xarray as xr
 import yaml
 import matplotlib.pyplot as plt
 
+from data_slice_io import (
+    MASK_CACHE_DIR,
+    SERIES_CACHE_DIR,
+    bbox_grid,
+    data_slice_file_path,
+    load_domain_mean_series,
+    read_window_domain_means,
+    series_window,
+)
+from mask_registry import MASK_THRESHOLD, coord_name, domain_mask, land_mask
+from table_io import find_table, read_table
+
 K2C = 273.15
 DEFAULT_NTOP = 5
 DEFAULT_LEAD_DAYS = 15
-LAND_THRESHOLD = 0.5
-MASK_THRESHOLD = 0.5
 PAST_RANGE = (1948, 1987)
 PRESENT_RANGE = (1988, 2026)
 DEFAULT_LSM_PATH = os.environ.get(
@@ -64,20 +76,6 @@ def get_boxplot_bbox(event_cfg: dict) -> tuple:
     return lat_min, lat_max, lon_min, lon_max
 
 
-def coord_name(obj, candidates: tuple[str, ...]) -> str:
-    """Return the first matching coordinate/dimension name from candidates."""
-    names = list(obj.coords) + list(obj.dims)
-    for candidate in candidates:
-        if candidate in names:
-            return candidate
-    lower_lookup = {name.lower(): name for name in names}
-    for candidate in candidates:
-        match = lower_lookup.get(candidate.lower())
-        if match is not None:
-            return match
-    raise KeyError(f"Could not find any of {candidates!r} in {names!r}")
-
-
 def get_domain_mask_bbox(mask_path: str, mask_var: str) -> tuple:
     """Return the smallest 0-360 lat/lon bbox containing non-zero mask cells."""
     ds = xr.open_dataset(mask_path)
@@ -110,125 +108,19 @@ def load_analogues(csv_path: str, n_top: int, exclude_dates: Optional[set] = Non
     Each list has top n_top analogues by rank, after excluding any exact dates
     reserved for the highlighted target event."""
     exclude_dates = set(exclude_dates or [])
-    df = pd.read_csv(csv_path)
-    past = []
-    present = []
-    for _, r in df.iterrows():
-        date = datetime(int(r["year"]), int(r["month"]), int(r["day"]))
-        if date.date() in exclude_dates:
-            continue
-        entry = {"date": date, "period": r["period"], "rank": int(r["rank"])}
-        if r["period"] == "past":
-            past.append(entry)
-        elif r["period"] == "present":
-            present.append(entry)
-    # Sort by rank and take top n_top
-    past = sorted(past, key=lambda x: x["rank"])[:n_top]
-    present = sorted(present, key=lambda x: x["rank"])[:n_top]
-    return past, present
-
-
-def data_slice_file_path(data_dir: str, d: datetime) -> str:
-    """Return path to monthly slice file for given date."""
-    return os.path.join(data_dir, f"{d.year}{d.month:02d}.nc")
-
-
-def load_land_mask(
-    lsm_path: str,
-    lat_min: float,
-    lat_max: float,
-    lon_min: float,
-    lon_max: float,
-    t2m_template: xr.DataArray,
-) -> np.ndarray:
-    """Load ERA5 LSM, subset to bbox, align to T2m grid. Return 2D boolean (True=land)."""
-    ds = xr.open_dataset(lsm_path)
-    lsm = ds["lsm"].isel(time=0)
-    if str(lsm.dtype) in ("int16", "int32"):
-        sf = float(getattr(ds["lsm"], "scale_factor", 1.0))
-        ao = float(getattr(ds["lsm"], "add_offset", 0.0))
-        lsm = lsm.astype(np.float64) * sf + ao
-    lon = lsm.coords["longitude"]
-    lat_coord = lsm.coords["latitude"]
-    lon_0_360 = float(lon.min()) >= 0
-    lat_desc = float(lat_coord[0]) > float(lat_coord[-1])
-    # bbox lon is 0–360; convert to LSM convention for selection
-    if lon_0_360:
-        lon_lo, lon_hi = lon_min, lon_max
-    else:
-        # LSM uses -180 to 180; convert bbox 0–360 -> -180–180
-        lon_lo = lon_min - 360 if lon_min > 180 else lon_min
-        lon_hi = lon_max - 360 if lon_max > 180 else lon_max
-    # LSM lat: use slice(lat_max, lat_min) when descending (90 -> -90)
-    lat_slice = slice(lat_max, lat_min) if lat_desc else slice(lat_min, lat_max)
-    lsm_sub = lsm.sel(
-        latitude=lat_slice,
-        longitude=slice(lon_lo, lon_hi),
-    )
-    # reindex_like needs matching lon convention: convert t2m -180-180 -> 0-360
-    # so nearest-neighbor works (xarray does not handle lon wraparound)
-    tpl = t2m_template
-    tpl_lon = tpl.coords["longitude"]
-    if float(tpl_lon.min()) < 0 and lon_0_360:
-        lon_0360 = tpl_lon.where(tpl_lon >= 0, tpl_lon + 360)
-        tpl = tpl.assign_coords(longitude=lon_0360)
-    lsm_aligned = lsm_sub.reindex_like(tpl, method="nearest")
-    land = (lsm_aligned.values >= LAND_THRESHOLD).squeeze()
-    ds.close()
-    return land
-
-
-def load_domain_mask(
-    mask_path: str,
-    mask_var: str,
-    lat_min: float,
-    lat_max: float,
-    lon_min: float,
-    lon_max: float,
-    t2m_template: xr.DataArray,
-) -> np.ndarray:
-    """Load a named analysis-domain mask and align it to the T2m subset grid."""
-    ds = xr.open_dataset(mask_path)
-    try:
-        if mask_var not in ds:
-            raise KeyError(f"Mask variable {mask_var!r} not found in {mask_path}")
-        mask = ds[mask_var]
-        mask_lat = coord_name(mask, ("latitude", "lat"))
-        mask_lon = coord_name(mask, ("longitude", "lon"))
-
-        if float(mask[mask_lon].min()) < 0:
-            mask = mask.assign_coords({mask_lon: np.mod(mask[mask_lon], 360.0)})
-            mask = mask.sortby(mask_lon)
-
-        lat_desc = float(mask[mask_lat][0]) > float(mask[mask_lat][-1])
-        lat_slice = slice(lat_max, lat_min) if lat_desc else slice(lat_min, lat_max)
-        mask_sub = mask.sel(
-            {
-                mask_lat: lat_slice,
-                mask_lon: slice(lon_min, lon_max),
-            }
-        )
-
-        tpl = t2m_template
-        tpl_lat = coord_name(tpl, ("latitude", "lat"))
-        tpl_lon = coord_name(tpl, ("longitude", "lon"))
-        if float(tpl[tpl_lon].min()) < 0 and float(mask_sub[mask_lon].min()) >= 0:
-            lon_0360 = tpl[tpl_lon].where(tpl[tpl_lon] >= 0, tpl[tpl_lon] + 360)
-            tpl = tpl.assign_coords({tpl_lon: lon_0360})
-
-        renames = {}
-        if mask_lat != tpl_lat:
-            renames[mask_lat] = tpl_lat
-        if mask_lon != tpl_lon:
-            renames[mask_lon] = tpl_lon
-        if renames:
-            mask_sub = mask_sub.rename(renames)
-
-        mask_aligned = mask_sub.reindex_like(tpl, method="nearest")
-        domain_mask = (mask_aligned.values > MASK_THRESHOLD).squeeze()
-        return domain_mask
-    finally:
-        ds.close()
+    df = read_table(find_table(Path(csv_path)))
+    df = df.assign(date=pd.to_datetime(df[["year", "month", "day"]]))
+    if exclude_dates:
+        df = df[~df["date"].dt.date.isin(list(exclude_dates))]
+    groups = []
+    for period in ("past", "present"):
+        # Sort by rank and take top n_top
+        sub = df[df["period"] == period].sort_values("rank", kind="stable").head(n_top)
+        groups.append([
+            {"date": d.to_pydatetime(), "period": period, "rank": int(r)}
+            for d, r in zip(sub["date"], sub["rank"])
+        ])
+    return groups[0], groups[1]
 
 
 def get_t2m_domain_mean_series(
@@ -241,54 +133,13 @@ def get_t2m_domain_mean_series(
     lon_max: float,
     land_mask: Optional[np.ndarray] = None,
 ) -> np.ndarray:
-    """Load T2m from data_slice monthly files; subset to bbox; mean over land if mask given.
-    Return 1D array in °C."""
-    months_needed = sorted(
-        set(
-            (
-                (start_date + timedelta(days=i)).year,
-                (start_date + timedelta(days=i)).month,
-            )
-            for i in range(ndays)
-        )
+    """Read T2m for the window straight from data_slice monthly files (bbox and days only);
+    mean over land if mask given. Return 1D array in °C."""
+    return read_window_domain_means(
+        data_dir, start_date, ndays,
+        lat_min, lat_max, lon_min, lon_max,
+        land_mask,
     )
-    monthly_data = {}
-    for (year, month) in months_needed:
-        path = data_slice_file_path(data_dir, datetime(year, month, 1))
-        if not os.path.isfile(path):
-            raise FileNotFoundError(path)
-        ds = xr.open_dataset(path)
-        t2m = ds["t2m"]
-        # Subset to bounding box (Layer 1: lat/lon domain)
-        lat_slice = slice(lat_max, lat_min) if lat_max > lat_min else slice(lat_min, lat_max)
-        # Longitude: bbox is 0–360; convert if data uses -180–180
-        data_lon = t2m.coords["longitude"]
-        if float(data_lon.min()) < 0:
-            sel_lo = lon_min - 360 if lon_min > 180 else lon_min
-            sel_hi = lon_max - 360 if lon_max > 180 else lon_max
-        else:
-            sel_lo, sel_hi = lon_min, lon_max
-        sub = t2m.sel(
-            latitude=lat_slice,
-            longitude=slice(sel_lo, sel_hi),
-        )
-        vals = (sub.values - K2C).astype(np.float64)
-        # Layer 2: land mask (skip if land_mask is None)
-        if land_mask is not None and land_mask.size > 0:
-            mask_bc = np.broadcast_to(land_mask, vals.shape)
-            vals = np.where(mask_bc, vals, np.nan)
-        daily_means = np.nanmean(vals, axis=tuple(range(1, vals.ndim)))
-        monthly_data[(year, month)] = daily_means
-        ds.close()
-
-    out = np.full(ndays, np.nan, dtype=np.float64)
-    for i in range(ndays):
-        d = start_date + timedelta(days=i)
-        key = (d.year, d.month)
-        day_idx = d.day - 1
-        if key in monthly_data and day_idx < len(monthly_data[key]):
-            out[i] = monthly_data[key][day_idx]
-    return out
 
 
 def compute_background_series(
@@ -300,33 +151,32 @@ def compute_background_series(
     lon_min: float,
     lon_max: float,
     land_mask: Optional[np.ndarray] = None,
+    series: Optional[dict] = None,
 ):
     """
     Mean T2m over past half and present half for the same calendar window as the event.
     Uses event's calendar window (e.g. Feb 1–15) for each year in past/present ranges.
+    With a cached domain-mean series (load_domain_mean_series) no files are opened.
     """
+    def window(ref_start: datetime) -> np.ndarray:
+        if series is not None:
+            return series_window(series, ref_start, lead_days)
+        return get_t2m_domain_mean_series(
+            ref_start, lead_days, data_dir,
+            lat_min, lat_max, lon_min, lon_max,
+            land_mask,
+        )
+
     past_series = []
     for year in range(PAST_RANGE[0], PAST_RANGE[1] + 1):
         try:
-            ref_start = start_date.replace(year=year)
-            s = get_t2m_domain_mean_series(
-                ref_start, lead_days, data_dir,
-                lat_min, lat_max, lon_min, lon_max,
-                land_mask,
-            )
-            past_series.append(s)
+            past_series.append(window(start_date.replace(year=year)))
         except (FileNotFoundError, ValueError):
             pass
     present_series = []
     for year in range(PRESENT_RANGE[0], PRESENT_RANGE[1] + 1):
         try:
-            ref_start = start_date.replace(year=year)
-            s = get_t2m_domain_mean_series(
-                ref_start, lead_days, data_dir,
-                lat_min, lat_max, lon_min, lon_max,
-                land_mask,
-            )
-            present_series.append(s)
+            present_series.append(window(start_date.replace(year=year)))
         except (FileNotFoundError, ValueError):
             pass
     past_mean = (
@@ -423,6 +273,26 @@ def main():
         default=None,
         help="Suffix inserted into the PNG filename before _topN.",
     )
+    parser.add_argument(
+        "--series-cache",
+        default=os.environ.get("T2M_SERIES_CACHE"),
+        help="Directory for cached domain-mean T2m series (default: Data/cache/t2m_series)",
+    )
+    parser.add_argument(
+        "--no-series-cache",
+        action="store_true",
+        help="Do not use the cached series; read only the needed windows from the monthly files",
+    )
+    parser.add_argument(
+        "--mask-cache",
+        default=os.environ.get("T2M_MASK_CACHE"),
+        help="Directory for land/domain masks aligned to the T2m grid (default: Data/cache/masks)",
+    )
+    parser.add_argument(
+        "--no-mask-cache",
+        action="store_true",
+        help="Align the land/domain mask from its source file without caching",
+    )
     args = parser.parse_args()
 
     plt.rcParams.update({
@@ -455,33 +325,20 @@ def main():
     else:
         lat_min, lat_max, lon_min, lon_max = get_boxplot_bbox(event_cfg)
 
+    # Masks are aligned to the T2m bbox grid once and kept in the mask registry
+    mask_cache = None
+    if not args.no_mask_cache:
+        mask_cache = args.mask_cache or str(MASK_CACHE_DIR)
+    bbox = (lat_min, lat_max, lon_min, lon_max)
     spatial_mask = None
     if use_domain_mask:
         path0 = data_slice_file_path(args.data_dir, target_start)
         if not os.path.isfile(path0):
             raise FileNotFoundError(path0)
-        with xr.open_dataset(path0) as ds0:
-            t2m0 = ds0["t2m"]
-            lat_slice = slice(lat_max, lat_min) if lat_max > lat_min else slice(lat_min, lat_max)
-            data_lon = t2m0.coords["longitude"]
-            if float(data_lon.min()) < 0:
-                sel_lo = lon_min - 360 if lon_min > 180 else lon_min
-                sel_hi = lon_max - 360 if lon_max > 180 else lon_max
-            else:
-                sel_lo, sel_hi = lon_min, lon_max
-            t2m_sub = t2m0.sel(
-                latitude=lat_slice,
-                longitude=slice(sel_lo, sel_hi),
-            )
-            spatial_mask = load_domain_mask(
-                domain_mask_path,
-                domain_var,
-                lat_min,
-                lat_max,
-                lon_min,
-                lon_max,
-                t2m_sub,
-            )
+        grid_lat, grid_lon = bbox_grid(path0, *bbox)
+        spatial_mask = domain_mask(
+            domain_mask_path, domain_var, bbox, grid_lat, grid_lon, cache_dir=mask_cache,
+        )["mask"]
         n_mask = int(np.sum(spatial_mask)) if spatial_mask is not None else 0
         if n_mask == 0:
             raise ValueError(
@@ -491,30 +348,18 @@ def main():
     elif not args.no_land_mask:
         path0 = data_slice_file_path(args.data_dir, target_start)
         if os.path.isfile(path0):
-            with xr.open_dataset(path0) as ds0:
-                t2m0 = ds0["t2m"]
-                lat_slice = slice(lat_max, lat_min) if lat_max > lat_min else slice(lat_min, lat_max)
-                data_lon = t2m0.coords["longitude"]
-                if float(data_lon.min()) < 0:
-                    sel_lo = lon_min - 360 if lon_min > 180 else lon_min
-                    sel_hi = lon_max - 360 if lon_max > 180 else lon_max
-                else:
-                    sel_lo, sel_hi = lon_min, lon_max
-                t2m_sub = t2m0.sel(
-                    latitude=lat_slice,
-                    longitude=slice(sel_lo, sel_hi),
-                )
-                if os.path.isfile(args.lsm_path):
-                    spatial_mask = load_land_mask(
-                        args.lsm_path, lat_min, lat_max, lon_min, lon_max, t2m_sub
-                    )
-                    if np.sum(spatial_mask) == 0:
-                        print("No land points in LSM for this bbox; using all points")
-                        spatial_mask = None
-                    else:
-                        print("Using land-sea mask: land only")
+            if os.path.isfile(args.lsm_path):
+                grid_lat, grid_lon = bbox_grid(path0, *bbox)
+                spatial_mask = land_mask(
+                    args.lsm_path, bbox, grid_lat, grid_lon, cache_dir=mask_cache,
+                )["mask"]
+                if np.sum(spatial_mask) == 0:
+                    print("No land points in LSM for this bbox; using all points")
+                    spatial_mask = None
                 else:
-                    print("LSM file not found, using all points:", args.lsm_path)
+                    print("Using land-sea mask: land only")
+            else:
+                print("LSM file not found, using all points:", args.lsm_path)
         else:
             print("Cannot load LSM template (data not found), using all points")
     else:
@@ -527,23 +372,34 @@ def main():
         exclude_dates={target_snapshot.date()},
     )
 
-    target_series = get_t2m_domain_mean_series(
-        target_start, lead_days, args.data_dir,
-        lat_min, lat_max, lon_min, lon_max,
-        spatial_mask,
-    )
+    # Daily domain-mean T2m for all months, computed once per (bbox, mask)
+    # (without the cache, only the needed windows are read from the files)
+    series = None
+    if not args.no_series_cache:
+        series = load_domain_mean_series(
+            args.data_dir,
+            (lat_min, lat_max, lon_min, lon_max),
+            spatial_mask,
+            cache_dir=args.series_cache or str(SERIES_CACHE_DIR),
+        )
+
+    def window(start: datetime) -> np.ndarray:
+        if series is not None:
+            return series_window(series, start, lead_days)
+        return get_t2m_domain_mean_series(
+            start, lead_days, args.data_dir,
+            lat_min, lat_max, lon_min, lon_max,
+            spatial_mask,
+        )
+
+    target_series = window(target_start)
 
     past_series = []
     for a in past_analogues:
         snap = a["date"]
         start = snap - timedelta(days=7)
         try:
-            s = get_t2m_domain_mean_series(
-                start, lead_days, args.data_dir,
-                lat_min, lat_max, lon_min, lon_max,
-                spatial_mask,
-            )
-            past_series.append(s)
+            past_series.append(window(start))
         except FileNotFoundError as e:
             print("Skip past", snap.date(), e)
 
@@ -552,12 +408,7 @@ def main():
         snap = a["date"]
         start = snap - timedelta(days=7)
         try:
-            s = get_t2m_domain_mean_series(
-                start, lead_days, args.data_dir,
-                lat_min, lat_max, lon_min, lon_max,
-                spatial_mask,
-            )
-            present_series.append(s)
+            present_series.append(window(start))
         except FileNotFoundError as e:
             print("Skip present", snap.date(), e)
 
@@ -568,6 +419,7 @@ def main():
         args.data_dir, target_start, lead_days,
         lat_min, lat_max, lon_min, lon_max,
         spatial_mask,
+        series=series,
     )
 
     os.makedirs(args.outdir, exist_ok=True)
@@ -11,10 +11,14 @@ This script handles: event-specific bbox extraction and smoothing
 """
 
 import argparse
+import os
+import shutil
 import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 
 from data_utils import (
     load_env_setting,
@@ -23,12 +27,12 @@ from data_utils import (
     load_events_config,
     get_data_paths,
     ensure_dir,
-    file_exists_and_valid,
     get_yearly_file_path,
     get_anomaly_file_path,
     get_event_dir,
     get_event_bbox_file,
 )
+from manifest import manifest_path, needs_build, record
 
 
 def run_cdo(cmd: str, verbose: bool = True) -> int:
@@ -60,13 +64,86 @@ def run_cdo(cmd: str, verbose: bool = True) -> int:
     return result.returncode
 
 
+def bbox_chain(
+    input_files: List[str],
+    output: Path,
+    bbox: Tuple[float, float, float, float],
+    smooth_days: int,
+) -> str:
+    """
+    CDO command that concatenates, crops and (optionally) smooths in one chain.
+
+    Parameters
+    ----------
+    input_files : list of str
+        Yearly files, in time order
+    output : Path
+        Output file
+    bbox : tuple
+        (lon_min, lon_max, lat_min, lat_max)
+    smooth_days : int
+        Running-mean window; <= 1 skips runmean
+
+    Returns
+    -------
+    str
+        Command for run_cdo
+    """
+    lon_min, lon_max, lat_min, lat_max = bbox
+    chain = f"-sellonlatbox,{lon_min},{lon_max},{lat_min},{lat_max} -cat '{' '.join(input_files)}'"
+    if smooth_days > 1:
+        chain = f"-runmean,{smooth_days} {chain}"
+    return f"cdo {chain} {output}"
+
+
+def extract_var_bbox(
+    var: str,
+    input_files: List[str],
+    output_bbox: Path,
+    output_smooth: Path,
+    bbox: Tuple[float, float, float, float],
+    smooth_days: int,
+    keep_bbox: bool = False,
+    verbose: bool = True
+) -> bool:
+    """
+    Write the smoothed bbox file of one variable.
+
+    By default this is a single CDO chain (cat -> sellonlatbox -> runmean),
+    so the unsmoothed bbox file is never written and read back.  With
+    keep_bbox the unsmoothed file is written first and smoothed from it.
+
+    Returns
+    -------
+    bool
+        True if successful
+    """
+    if not keep_bbox:
+        if run_cdo(bbox_chain(input_files, output_smooth, bbox, smooth_days), verbose) != 0:
+            return False
+    else:
+        if run_cdo(bbox_chain(input_files, output_bbox, bbox, 1), verbose) != 0:
+            return False
+        if smooth_days > 1:
+            if run_cdo(f"cdo runmean,{smooth_days} {output_bbox} {output_smooth}", verbose) != 0:
+                return False
+        else:
+            shutil.copyfile(output_bbox, output_smooth)
+
+    if verbose:
+        print(f"[{var}] Done: {output_smooth}")
+    return True
+
+
 def extract_event_bbox(
     event: Dict[str, Any],
     paths: Dict[str, Path],
     preprocess_config: Dict[str, Any],
     analogue_config: Dict[str, Any],
     skip_existing: bool = True,
-    verbose: bool = True
+    verbose: bool = True,
+    n_workers: int = 1,
+    keep_bbox: bool = False
 ) -> bool:
     """
     Extract bounding box data for a single event.
@@ -75,6 +152,9 @@ def extract_event_bbox(
     1. Concatenate yearly files (anomaly or raw) within event year range
     2. Extract spatial bounding box using CDO sellonlatbox
     3. Apply time-window smoothing using CDO runmean
+
+    The three steps run as one CDO chain per variable, and variables are
+    processed concurrently (n_workers CDO processes at a time).
     
     Parameters
     ----------
@@ -87,9 +167,15 @@ def extract_event_bbox(
     analogue_config : dict
         Analogue search configuration
     skip_existing : bool
-        Skip if output files already exist
+        Skip outputs the manifest records as up to date (stale or missing
+        ones are rebuilt); also requires skip_existing.event_bbox in
+        preprocess_config.yaml
     verbose : bool
         Print progress messages
+    n_workers : int
+        Variables processed at the same time
+    keep_bbox : bool
+        Also write the unsmoothed bbox file ({var}_*_bbox.nc)
         
     Returns
     -------
@@ -107,6 +193,7 @@ def extract_event_bbox(
     lon_max = region['lon_max']
     lat_min = region['lat_min']
     lat_max = region['lat_max']
+    bbox = (lon_min, lon_max, lat_min, lat_max)
     
     # Get smoothing window
     smooth_days = analogue_config.get('smoothing', {}).get('window_days', 1)
@@ -124,115 +211,93 @@ def extract_event_bbox(
         print(f"Smoothing: {smooth_days}-day running mean")
         print(f"{'='*60}")
     
-    # Get variable lists
-    anomaly_vars = [v['name'] for v in preprocess_config['variables'].get('anomaly_vars', [])]
-    raw_vars = [v['name'] for v in preprocess_config['variables'].get('raw_vars', [])]
+    # Get variable lists: anomaly variables read anomaly files, raw variables
+    # read the yearly merged files
+    variables = (
+        [(v['name'], True) for v in preprocess_config['variables'].get('anomaly_vars', [])]
+        + [(v['name'], False) for v in preprocess_config['variables'].get('raw_vars', [])]
+    )
+    
+    # Skip decisions: --force or skip_existing.event_bbox: false rebuilds everything
+    force = not skip_existing or not preprocess_config.get('skip_existing', {}).get('event_bbox', True)
+    manifest = manifest_path(paths['data'])
+    # Settings that determine the smoothed bbox files
+    bbox_config = {'stage': 'event_bbox', 'bbox': bbox, 'smooth_days': smooth_days}
     
     success = True
+    jobs = []
     
-    # Process anomaly variables
-    for var in anomaly_vars:
+    for var, is_anomaly in variables:
+        kind = "anomaly" if is_anomaly else "yearly"
         if verbose:
-            print(f"\n[{var}] Processing anomaly variable...")
+            print(f"\n[{var}] Processing {'anomaly' if is_anomaly else 'raw'} variable...")
         
-        output_bbox = get_event_bbox_file(paths, event_name, var, is_anomaly=True, smoothed=False)
-        output_smooth = get_event_bbox_file(paths, event_name, var, is_anomaly=True, smoothed=True)
+        output_bbox = get_event_bbox_file(paths, event_name, var, is_anomaly=is_anomaly, smoothed=False)
+        output_smooth = get_event_bbox_file(paths, event_name, var, is_anomaly=is_anomaly, smoothed=True)
         
-        # Check if can skip
-        if skip_existing and file_exists_and_valid(output_smooth):
-            if verbose:
-                print(f"[{var}] Skipping - output exists: {output_smooth}")
-            continue
-        
-        # Build list of yearly anomaly files
+        # Build list of yearly files
         yearly_files = []
+        missing_years = []
         for year in range(start_year, end_year + 1):
-            yf = get_anomaly_file_path(paths, var, year)
+            if is_anomaly:
+                yf = get_anomaly_file_path(paths, var, year)
+            else:
+                yf = get_yearly_file_path(paths, var, year)
             if yf.exists():
                 yearly_files.append(str(yf))
             else:
-                print(f"[{var}] Warning: Missing anomaly file for {year}: {yf}")
-        
-        if not yearly_files:
-            print(f"[{var}] Error: No anomaly files found!")
-            success = False
-            continue
-        
-        # Step 1: Concatenate and extract bbox
-        input_files = ' '.join(yearly_files)
-        cmd_bbox = f"cdo -sellonlatbox,{lon_min},{lon_max},{lat_min},{lat_max} -cat '{input_files}' {output_bbox}"
+                missing_years.append((year, yf))
         
-        if run_cdo(cmd_bbox, verbose) != 0:
-            success = False
-            continue
-        
-        # Step 2: Apply smoothing
-        if smooth_days > 1:
-            cmd_smooth = f"cdo runmean,{smooth_days} {output_bbox} {output_smooth}"
-            if run_cdo(cmd_smooth, verbose) != 0:
-                success = False
-                continue
-        else:
-            # No smoothing needed, just copy/link
-            cmd_copy = f"cp {output_bbox} {output_smooth}"
-            subprocess.run(cmd_copy, shell=True)
-        
-        if verbose:
-            print(f"[{var}] Done: {output_smooth}")
-    
-    # Process raw variables (no anomaly, just yearly merged files)
-    for var in raw_vars:
-        if verbose:
-            print(f"\n[{var}] Processing raw variable...")
-        
-        output_bbox = get_event_bbox_file(paths, event_name, var, is_anomaly=False, smoothed=False)
-        output_smooth = get_event_bbox_file(paths, event_name, var, is_anomaly=False, smoothed=True)
-        
-        # Check if can skip
-        if skip_existing and file_exists_and_valid(output_smooth):
+        # Check if can skip: up to date for these inputs and settings
+        build, status = needs_build(manifest, output_smooth, 'event_bbox', yearly_files, bbox_config, force=force)
+        if not build:
             if verbose:
-                print(f"[{var}] Skipping - output exists: {output_smooth}")
+                print(f"[{var}] Skipping - output {status}: {output_smooth}")
             continue
+        if verbose and status.startswith('stale'):
+            print(f"[{var}] Rebuilding - output {status}: {output_smooth}")
         
-        # Build list of yearly files (raw, not anomaly)
-        yearly_files = []
-        for year in range(start_year, end_year + 1):
-            yf = get_yearly_file_path(paths, var, year)
-            if yf.exists():
-                yearly_files.append(str(yf))
-            else:
-                print(f"[{var}] Warning: Missing yearly file for {year}: {yf}")
+        for year, yf in missing_years:
+            print(f"[{var}] Warning: Missing {kind} file for {year}: {yf}")
         
         if not yearly_files:
-            print(f"[{var}] Error: No yearly files found!")
+            print(f"[{var}] Error: No {kind} files found!")
             success = False
             continue
         
-        # Step 1: Concatenate and extract bbox
-        input_files = ' '.join(yearly_files)
-        cmd_bbox = f"cdo -sellonlatbox,{lon_min},{lon_max},{lat_min},{lat_max} -cat '{input_files}' {output_bbox}"
-        
-        if run_cdo(cmd_bbox, verbose) != 0:
-            success = False
-            continue
-        
-        # Step 2: Apply smoothing
-        if smooth_days > 1:
-            cmd_smooth = f"cdo runmean,{smooth_days} {output_bbox} {output_smooth}"
-            if run_cdo(cmd_smooth, verbose) != 0:
+        jobs.append((var, yearly_files, output_bbox, output_smooth))
+    
+    if not jobs:
+        return success
+    
+    def timed_extract(*args) -> Tuple[bool, float]:
+        start = time.perf_counter()
+        return extract_var_bbox(*args), time.perf_counter() - start
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(n_workers, len(jobs)))) as pool:
+        futures = [
+            pool.submit(
+                timed_extract, var, yearly_files, output_bbox, output_smooth,
+                bbox, smooth_days, keep_bbox, verbose
+            )
+            for var, yearly_files, output_bbox, output_smooth in jobs
+        ]
+        for future, (var, yearly_files, output_bbox, output_smooth) in zip(futures, jobs):
+            ok, seconds = future.result()
+            if ok:
+                record(manifest, output_smooth, 'event_bbox', yearly_files, bbox_config, seconds)
+            else:
                 success = False
-                continue
-        else:
-            cmd_copy = f"cp {output_bbox} {output_smooth}"
-            subprocess.run(cmd_copy, shell=True)
-        
-        if verbose:
-            print(f"[{var}] Done: {output_smooth}")
     
     return success
 
 
-def process_all_events(skip_existing: bool = True, verbose: bool = True) -> bool:
+def process_all_events(
+    skip_existing: bool = True,
+    verbose: bool = True,
+    n_workers: int = 1,
+    keep_bbox: bool = False
+) -> bool:
     """
     Process bbox extraction for all events defined in extreme_events.yaml.
     
@@ -264,7 +329,9 @@ def process_all_events(skip_existing: bool = True, verbose: bool = True) -> bool
             preprocess_config=preprocess_config,
             analogue_config=analogue_config,
             skip_existing=skip_existing,
-            verbose=verbose
+            verbose=verbose,
+            n_workers=n_workers,
+            keep_bbox=keep_bbox
         )
         if not success:
             all_success = False
@@ -291,7 +358,18 @@ def main():
     parser.add_argument(
         '--force',
         action='store_true',
-        help='Force recomputation even if output exists'
+        help='Force recomputation even if the manifest records the output as up to date'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=int(os.environ.get('SLURM_CPUS_PER_TASK', '1')),
+        help='Variables extracted concurrently (default: $SLURM_CPUS_PER_TASK or 1)'
+    )
+    parser.add_argument(
+        '--keep-bbox',
+        action='store_true',
+        help='Also write the unsmoothed bbox file (default: smooth in the same CDO chain)'
     )
     parser.add_argument(
         '--quiet',
@@ -330,11 +408,18 @@ def main():
                 preprocess_config=preprocess_config,
                 analogue_config=analogue_config,
                 skip_existing=skip_existing,
-                verbose=verbose
+                verbose=verbose,
+                n_workers=args.workers,
+                keep_bbox=args.keep_bbox
             )
         else:
             # Process all events
-            success = process_all_events(skip_existing=skip_existing, verbose=verbose)
+            success = process_all_events(
+                skip_existing=skip_existing,
+                verbose=verbose,
+                n_workers=args.workers,
+                keep_bbox=args.keep_bbox
+            )
         
         sys.exit(0 if success else 1)
     else:
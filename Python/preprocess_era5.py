@@ -12,9 +12,22 @@ Usage:
     python3 preprocess_era5.py
     python3 preprocess_era5.py --force
     python3 preprocess_era5.py --start-year 2000 --end-year 2020
+    python3 preprocess_era5.py --workers 8
+    python3 preprocess_era5.py --workers 8 --resume
+
+Months run concurrently (--workers CDO processes).  Each finished month is
+recorded in the processing manifest (manifest.py) with its source
+signature and region, so an interrupted run resumes with the missing
+months, and months whose source or region changed are rebuilt.
+
+--resume is the fast restart path: months the manifest records for the
+current region are skipped after one query, without stat-ing their source
+or output; only the remaining months are checked.  Use a plain run to pick
+up changed sources.
 
 Env (all overridable via CLI):
     ERA5_HEAVY_DIR   Source directory with global YYYYMM.nc files
+    ERA5_ZIP_CACHE   Keep extractions of ZIP sources here (optional)
     F01_ERA5_DAILY_MEAN  Output directory for domain-sliced files
     EVENTS_CONFIG    Path to extreme_events.yaml (for region definition)
 """
@@ -24,12 +37,17 @@ import os
 import shutil
 import subprocess
 import sys
-import tempfile
+import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Dict, Optional, Tuple
 
 import yaml
 
+from manifest import manifest_path, needs_build, record, recorded_outputs
+from zip_nc import extract_cached, find_member, is_zip
+
 
 def load_region(events_yaml: str) -> dict:
     """Extract the circulation region from the first event definition."""
@@ -38,24 +56,11 @@ def load_region(events_yaml: str) -> dict:
     return cfg["events"][0]["region"]
 
 
-def is_zip(filepath: Path) -> bool:
-    """Check whether a file is a ZIP archive (CDS raw download)."""
-    try:
-        with open(filepath, "rb") as f:
-            return f.read(2) == b"PK"
-    except OSError:
-        return False
-
-
 def extract_nc_from_zip(zip_path: Path, dest: Path) -> None:
-    """Extract the first .nc file from a ZIP into *dest*."""
+    """Extract the first .nc file from a ZIP into *dest* (streamed, not read into memory)."""
     with zipfile.ZipFile(zip_path) as zf:
-        for name in zf.namelist():
-            if name.endswith(".nc"):
-                with zf.open(name) as src:
-                    dest.write_bytes(src.read())
-                return
-    raise RuntimeError(f"No .nc found inside {zip_path}")
+        with zf.open(find_member(zf)) as src, open(dest, "wb") as out:
+            shutil.copyfileobj(src, out, 1 << 20)
 
 
 def run_cdo(cmd: str, verbose: bool = True) -> int:
@@ -75,40 +80,55 @@ def process_file(
     lat_min: float,
     lat_max: float,
     verbose: bool = True,
+    zip_cache: Optional[Path] = None,
 ) -> bool:
-    """Domain-slice a single monthly file.  Returns True on success."""
-
-    with tempfile.TemporaryDirectory() as tmpdir:
+    """Domain-slice a single monthly file.  Returns True on success.
+
+    ZIP sources are extracted once into zip_cache (keyed by archive path/mtime/size)
+    when given, otherwise streamed into a scratch file next to dst that is
+    removed afterwards.  CDO writes to a temporary name in the output
+    directory, renamed into place on success, so there is no copy across
+    filesystems and an interrupted run never leaves a partial dst.
+    """
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    scratch = dst.with_name(f".{dst.stem}.src{os.getpid()}.nc")
+    dst_tmp = dst.with_name(f".{dst.name}.tmp{os.getpid()}")
+    try:
         # Resolve source: extract ZIP if needed
-        if is_zip(src) or (src.is_symlink() and is_zip(src.resolve())):
-            real_src = src.resolve() if src.is_symlink() else src
-            nc_tmp = Path(tmpdir) / "extracted.nc"
+        if is_zip(src):
+            real_src = src.resolve()
             if verbose:
                 print(f"  Extracting ZIP: {real_src.name}")
             try:
-                extract_nc_from_zip(real_src, nc_tmp)
+                if zip_cache is not None:
+                    input_path = extract_cached(real_src, zip_cache)
+                else:
+                    input_path = scratch
+                    extract_nc_from_zip(real_src, input_path)
             except Exception as e:
                 print(f"  [ERROR] ZIP extraction failed: {e}", file=sys.stderr)
                 return False
-            input_path = nc_tmp
         else:
             input_path = src
 
-        dst_tmp = Path(tmpdir) / dst.name
         cmd = (
             f"cdo -s sellonlatbox,{lon_min},{lon_max},{lat_min},{lat_max} "
             f"{input_path} {dst_tmp}"
         )
-        if run_cdo(cmd, verbose) != 0:
+        if run_cdo(cmd, verbose) != 0 or not dst_tmp.exists():
             return False
+        os.replace(dst_tmp, dst)
+    finally:
+        for p in (scratch, dst_tmp):
+            if p.exists():
+                p.unlink()
+
+    return True
 
-        dst.parent.mkdir(parents=True, exist_ok=True)
-        if dst_tmp.exists():
-            # /tmp and project storage can be different filesystems (EXDEV).
-            # shutil.move safely falls back to copy+remove across devices.
-            shutil.move(str(dst_tmp), str(dst))
 
-    return dst.exists()
+def timed_process_file(src: Path, dst: Path, *args) -> Tuple[bool, float]:
+    start = time.perf_counter()
+    return process_file(src, dst, *args), time.perf_counter() - start
 
 
 def main():
@@ -128,7 +148,21 @@ def main():
     parser.add_argument("--start-year", type=int, default=None)
     parser.add_argument("--end-year", type=int, default=None)
     parser.add_argument("--force", action="store_true",
-                        help="Overwrite existing output files")
+                        help="Overwrite output files the manifest records as up to date")
+    parser.add_argument("--zip-cache", default=os.environ.get("ERA5_ZIP_CACHE"),
+                        help="Keep NetCDF extracted from CDS ZIP sources here, keyed by "
+                             "archive path/mtime/size, so re-runs skip extraction "
+                             "(default: $ERA5_ZIP_CACHE; unset = temporary extraction)")
+    parser.add_argument("--workers", type=int,
+                        default=int(os.environ.get("SLURM_CPUS_PER_TASK", "1")),
+                        help="Months processed concurrently "
+                             "(default: $SLURM_CPUS_PER_TASK or 1)")
+    parser.add_argument("--manifest", default=None,
+                        help="Processing manifest database "
+                             "(default: $PIPELINE_MANIFEST or Data/manifest.sqlite)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip months the manifest records for this region without "
+                             "stat-ing their source or output (fast restart)")
     parser.add_argument("--quiet", action="store_true")
     args = parser.parse_args()
 
@@ -151,6 +185,8 @@ def main():
     start_year = args.start_year or int(os.environ.get("START_YEAR", "1948"))
     end_year = args.end_year or int(os.environ.get("END_YEAR", "2026"))
     verbose = not args.quiet
+    zip_cache = Path(args.zip_cache) if args.zip_cache else None
+    manifest = Path(args.manifest) if args.manifest else manifest_path(root / "Data")
 
     if not source_dir or not source_dir.is_dir():
         print(f"ERROR: Source directory not found: {source_dir}", file=sys.stderr)
@@ -172,10 +208,24 @@ def main():
     print(f"Months:  {sorted(months)}")
     print(f"Years:   {start_year}–{end_year}")
     print(f"Force:   {args.force}")
+    print(f"Workers: {args.workers}")
+    print(f"Manifest: {manifest}")
+    if args.resume:
+        print("Resume:  trusting manifest records (no stat of recorded months)")
+    if zip_cache is not None:
+        print(f"ZIP cache: {zip_cache}")
     print("=" * 60)
     print()
 
+    # Settings that determine a sliced month
+    slice_config = {"stage": "era5_slice", "region": [lon_min, lon_max, lat_min, lat_max]}
+    # One directory listing instead of an exists() per month
+    source_names = {entry.name for entry in os.scandir(source_dir)}
+    # --resume: months already recorded, from one query
+    done = set() if args.force or not args.resume else recorded_outputs(manifest, "era5_slice", slice_config)
+
     ok, skipped, failed, missing = 0, 0, 0, 0
+    tasks: Dict[str, Tuple[Path, Path]] = {}
 
     for year in range(start_year, end_year + 1):
         for month in sorted(months):
@@ -183,25 +233,55 @@ def main():
             src = source_dir / fname
             dst = output_dir / fname
 
-            if not src.exists():
+            if os.path.abspath(dst) in done:
+                if verbose:
+                    print(f"[SKIP] {fname}  (recorded)")
+                skipped += 1
+                continue
+
+            if fname not in source_names:
                 if verbose:
                     print(f"[MISS] {fname}  (not in source)")
                 missing += 1
                 continue
 
-            if dst.exists() and not args.force:
+            build, status = needs_build(manifest, dst, "era5_slice", [src], slice_config, force=args.force)
+            if not build:
                 if verbose:
-                    print(f"[SKIP] {fname}")
+                    print(f"[SKIP] {fname}  ({status})")
                 skipped += 1
                 continue
-
-            print(f"[PROC] {fname}")
-            if process_file(src, dst, lon_min, lon_max, lat_min, lat_max, verbose):
+            if verbose and status.startswith("stale"):
+                print(f"[STALE] {fname}  ({status})")
+
+            tasks[fname] = (src, dst)
+
+    print(f"Queued: {len(tasks)} file(s), {args.workers} worker(s)")
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(args.workers, 1)) as pool:
+        futures = {
+            pool.submit(
+                timed_process_file, src, dst,
+                lon_min, lon_max, lat_min, lat_max, verbose, zip_cache,
+            ): fname
+            for fname, (src, dst) in tasks.items()
+        }
+        for fut in as_completed(futures):
+            fname = futures[fut]
+            try:
+                success, seconds = fut.result()
+            except Exception as e:
+                print(f"  [ERROR] {fname}: {e}", file=sys.stderr)
+                success, seconds = False, 0.0
+            if success:
+                record(manifest, tasks[fname][1], "era5_slice", [tasks[fname][0]], slice_config, seconds)
                 ok += 1
-                print(f"[DONE] {fname}")
+                print(f"[DONE] {fname}  ({seconds:.1f}s)", flush=True)
             else:
                 failed += 1
-                print(f"[FAIL] {fname}")
+                print(f"[FAIL] {fname}", flush=True)
+    if tasks:
+        print(f"[TIME] {len(tasks)} file(s) in {time.perf_counter() - t0:.1f}s wall")
 
     print()
     print("=" * 60)
@@ -8,6 +8,17 @@ Pipeline:
 3. Yearly psurf -> day-of-year climatology
 4. Yearly psurf - climatology -> yearly anomaly files
 
+Steps 3-4 use the streaming Python engine (climatology_engine.py) by
+default: one pass over the yearly files, no merged temporary NetCDF,
+optional harmonic smoothing and extra baseline periods, anomalies written
+per year in parallel.  --climatology-engine cdo keeps the CDO
+mergetime/ydaymean/ydaysub chain.
+
+Step 1 runs CDO mergetime/daymean over the month's GRIB files by default.
+--grib-reader eccodes (grib_daily.py, needs ecCodes) reads only the prmsl
+message of each file, using a cached per-month index of message offsets,
+and writes the daily means directly.
+
 Outputs are written under Data/F01_preprocess/jra3q/ so F02 can run with:
     DATASET=jra3q
 """
@@ -19,11 +30,18 @@ import shutil
 import subprocess
 import sys
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 import yaml
 
+from climatology_engine import stream_climatology, write_anomalies, write_climatology
+from grib_daily import grib_month_to_daily, require_eccodes
+from manifest import manifest_path, needs_build, record
+
 
 def load_region(events_yaml: Path) -> dict:
     with open(events_yaml, "r") as f:
@@ -60,6 +78,56 @@ def run_cdo(args: List[str], verbose: bool = True) -> bool:
     return True
 
 
+def run_stage(
+    stage: str,
+    tasks: List[Tuple[str, Callable[[], str]]],
+    n_workers: int,
+    verbose: bool,
+) -> Dict[str, str]:
+    """
+    Run the independent tasks of one stage concurrently; return label -> status.
+
+    The work is done by CDO subprocesses, so a thread pool is enough to keep
+    n_workers of them busy.  Stages are run one after another, so a stage
+    only starts once every task it depends on has finished.  Each task that
+    did work reports its time; the stage reports wall time vs summed task time.
+    """
+    def timed(label: str, func: Callable[[], str]) -> Tuple[str, str, float]:
+        start = time.perf_counter()
+        try:
+            status = func()
+        except Exception as exc:
+            print(f"[FAIL] {stage} {label}: {exc}", file=sys.stderr)
+            status = "failed"
+        return label, status, time.perf_counter() - start
+
+    results: Dict[str, str] = {}
+    busy = 0.0
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(n_workers, 1)) as pool:
+        futures = [pool.submit(timed, label, func) for label, func in tasks]
+        for fut in as_completed(futures):
+            label, status, seconds = fut.result()
+            results[label] = status
+            busy += seconds
+            if verbose and status in ("ok", "failed"):
+                print(f"[TIME] {stage} {label}: {status} in {seconds:.1f}s", flush=True)
+    if tasks:
+        print(
+            f"[TIME] {stage}: {len(tasks)} tasks in {time.perf_counter() - t0:.1f}s wall "
+            f"({busy:.1f}s task time, {max(n_workers, 1)} worker(s))",
+            flush=True,
+        )
+    return results
+
+
+def count_statuses(results: Dict[str, str]) -> Dict[str, int]:
+    counts = {"ok": 0, "skip": 0, "missing": 0, "failed": 0}
+    for status in results.values():
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
 def grib_files_for_month(src_dir: Path, year: int, month: int) -> List[Path]:
     _, ndays = calendar.monthrange(year, month)
     files: List[Path] = []
@@ -94,19 +162,26 @@ def process_month(
     lat_max: float,
     force: bool,
     verbose: bool,
+    manifest: Optional[Path] = None,
+    grib_reader: str = "cdo",
+    grib_index_dir: Optional[Path] = None,
 ) -> Tuple[str, int]:
     dst = month_file(daily_dir, year, month)
-    if dst.exists() and not force:
-        if verbose:
-            print(f"[SKIP] {dst.name}")
-        return "skip", 0
-
     grib_files = grib_files_for_month(src_dir, year, month)
     if not grib_files:
         if verbose:
             print(f"[MISS] {dst.name}  (no GRIB files)")
         return "missing", 0
 
+    config = {"stage": "jra3q_monthly", "region": [lon_min, lon_max, lat_min, lat_max]}
+    build, status = needs_build(manifest, dst, "jra3q_monthly", grib_files, config, force=force)
+    if not build:
+        if verbose:
+            print(f"[SKIP] {dst.name}  ({status})")
+        return "skip", 0
+    if verbose and status.startswith("stale"):
+        print(f"[STALE] {dst.name}  ({status})")
+
     _, ndays = calendar.monthrange(year, month)
     expected = ndays * 4
     if len(grib_files) < expected and verbose:
@@ -117,6 +192,25 @@ def process_month(
 
     print(f"[PROC] {dst.name}  ({len(grib_files)} GRIB files)")
 
+    start = time.perf_counter()
+    if grib_reader == "eccodes":
+        index_path = grib_index_dir / f"anl_surf125.{year}{month:02d}.json" if grib_index_dir else None
+        try:
+            info = grib_month_to_daily(
+                grib_files, dst, lon_min, lon_max, lat_min, lat_max,
+                short_name="prmsl", out_name="psurf", index_path=index_path,
+            )
+        except (OSError, ValueError) as exc:
+            print(f"[FAIL] {dst.name}: {exc}", file=sys.stderr)
+            return "failed", len(grib_files)
+        if manifest is not None:
+            record(manifest, dst, "jra3q_monthly", grib_files, config, time.perf_counter() - start)
+        print(
+            f"[DONE] {dst.name}  ({info['n_days']} days, {info['n_messages']} messages, "
+            f"{info['n_scanned']} file(s) scanned)"
+        )
+        return "ok", len(grib_files)
+
     with tempfile.TemporaryDirectory() as tmpdir:
         tmp_out = Path(tmpdir) / dst.name
 
@@ -142,6 +236,8 @@ def process_month(
         # shutil.move safely falls back to copy+remove across devices.
         shutil.move(str(tmp_out), str(dst))
 
+    if manifest is not None:
+        record(manifest, dst, "jra3q_monthly", grib_files, config, time.perf_counter() - start)
     print(f"[DONE] {dst.name}")
     return "ok", len(grib_files)
 
@@ -153,13 +249,9 @@ def build_yearly_file(
     months: List[int],
     force: bool,
     verbose: bool,
+    manifest: Optional[Path] = None,
 ) -> str:
     dst = yearly_file(yearly_dir, year)
-    if dst.exists() and not force:
-        if verbose:
-            print(f"[SKIP] yearly {dst.name}")
-        return "skip"
-
     monthly = [month_file(daily_dir, year, m) for m in months]
     monthly = [p for p in monthly if p.exists()]
     if not monthly:
@@ -167,10 +259,22 @@ def build_yearly_file(
             print(f"[MISS] yearly psurf_{year}.nc  (no monthly files)")
         return "missing"
 
+    config = {"stage": "jra3q_yearly"}
+    build, status = needs_build(manifest, dst, "jra3q_yearly", monthly, config, force=force)
+    if not build:
+        if verbose:
+            print(f"[SKIP] yearly {dst.name}  ({status})")
+        return "skip"
+    if verbose and status.startswith("stale"):
+        print(f"[STALE] yearly {dst.name}  ({status})")
+
     yearly_dir.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
 
     if len(monthly) == 1:
         shutil.copy2(monthly[0], dst)
+        if manifest is not None:
+            record(manifest, dst, "jra3q_yearly", monthly, config, time.perf_counter() - start)
         if verbose:
             print(f"[DONE] yearly {dst.name} (single month copy)")
         return "ok"
@@ -180,6 +284,8 @@ def build_yearly_file(
         print(f"[FAIL] yearly {dst.name}")
         return "failed"
 
+    if manifest is not None:
+        record(manifest, dst, "jra3q_yearly", monthly, config, time.perf_counter() - start)
     if verbose:
         print(f"[DONE] yearly {dst.name}")
     return "ok"
@@ -191,13 +297,9 @@ def compute_climatology(
     years: List[int],
     force: bool,
     verbose: bool,
+    manifest: Optional[Path] = None,
 ) -> Tuple[str, Path]:
-    out = climatology_dir / "climatology_psurf.nc"
-    if out.exists() and not force:
-        if verbose:
-            print(f"[SKIP] climatology {out.name}")
-        return "skip", out
-
+    out = climatology_file(climatology_dir)
     inputs: List[Path] = []
     for year in years:
         path = yearly_file(yearly_dir, year)
@@ -206,7 +308,17 @@ def compute_climatology(
     if not inputs:
         return "missing", out
 
+    config = {"stage": "jra3q_climatology", "engine": "cdo"}
+    build, status = needs_build(manifest, out, "jra3q_climatology", inputs, config, force=force)
+    if not build:
+        if verbose:
+            print(f"[SKIP] climatology {out.name}  ({status})")
+        return "skip", out
+    if verbose and status.startswith("stale"):
+        print(f"[STALE] climatology {out.name}  ({status})")
+
     climatology_dir.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
     if len(inputs) == 1:
         cmd = ["-f", "nc", "-setname,psurf", "-ydaymean", str(inputs[0]), str(out)]
         if not run_cdo(cmd, verbose):
@@ -225,11 +337,144 @@ def compute_climatology(
                 print("[FAIL] climatology")
                 return "failed", out
 
+    if manifest is not None:
+        record(manifest, out, "jra3q_climatology", inputs, config, time.perf_counter() - start)
     if verbose:
         print(f"[DONE] climatology {out.name}")
     return "ok", out
 
 
+def parse_baselines(specs: List[str]) -> Dict[str, Tuple[int, int]]:
+    """Parse --baseline NAME=START-END entries."""
+    baselines: Dict[str, Tuple[int, int]] = {}
+    for spec in specs:
+        try:
+            name, span = spec.split("=", 1)
+            y0, y1 = (int(v) for v in span.split("-", 1))
+        except ValueError:
+            raise ValueError(f"Invalid baseline '{spec}'. Use NAME=START-END, e.g. wmo=1991-2020.") from None
+        if not name or y0 > y1:
+            raise ValueError(f"Invalid baseline '{spec}'.")
+        baselines[name] = (y0, y1)
+    return baselines
+
+
+def climatology_file(climatology_dir: Path, baseline: str = "") -> Path:
+    suffix = f"_{baseline}" if baseline else ""
+    return climatology_dir / f"climatology_psurf{suffix}.nc"
+
+
+def compute_climatology_streaming(
+    yearly_dir: Path,
+    climatology_dir: Path,
+    years: List[int],
+    baselines: Dict[str, Tuple[int, int]],
+    n_harmonics: int,
+    force: bool,
+    verbose: bool,
+    manifest: Optional[Path] = None,
+) -> Tuple[str, Path]:
+    """Climatology over all years plus any extra baselines, in one pass (climatology_engine)."""
+    out = climatology_file(climatology_dir)
+    outputs = {"": out, **{name: climatology_file(climatology_dir, name) for name in baselines}}
+    year_files = {y: yearly_file(yearly_dir, y) for y in years if yearly_file(yearly_dir, y).exists()}
+    if not year_files:
+        return "missing", out
+
+    periods = {"": (min(year_files), max(year_files)), **baselines}
+    inputs = [year_files[y] for y in sorted(year_files)]
+    configs = {
+        name: {"stage": "jra3q_climatology", "engine": "python", "harmonics": n_harmonics,
+               "baseline": list(periods[name])}
+        for name in outputs
+    }
+    checks = {
+        name: needs_build(manifest, path, "jra3q_climatology", inputs, configs[name], force=force)
+        for name, path in outputs.items()
+    }
+    if not any(build for build, _ in checks.values()):
+        if verbose:
+            print(f"[SKIP] climatology {', '.join(p.name for p in outputs.values())}")
+        return "skip", out
+    if verbose:
+        for name, (_, status) in checks.items():
+            if status.startswith("stale"):
+                print(f"[STALE] climatology {outputs[name].name}  ({status})")
+
+    start = time.perf_counter()
+    try:
+        result = stream_climatology(year_files, periods, var="psurf", n_harmonics=n_harmonics, verbose=verbose)
+    except (OSError, ValueError) as exc:
+        print(f"[FAIL] climatology: {exc}", file=sys.stderr)
+        return "failed", out
+
+    for name, path in outputs.items():
+        used = result["years"][name]
+        write_climatology(
+            result["clim"][name], result["template"], result["schema"], path, "psurf",
+            attrs={
+                "baseline_years": f"{min(used)}-{max(used)}",
+                "n_years": len(used),
+                "n_harmonics": n_harmonics,
+            },
+        )
+        if manifest is not None:
+            record(manifest, path, "jra3q_climatology", inputs, configs[name], time.perf_counter() - start)
+        if verbose:
+            print(f"[DONE] climatology {path.name} ({min(used)}-{max(used)}, {len(used)} years)")
+    return "ok", out
+
+
+def compute_anomalies_streaming(
+    yearly_dir: Path,
+    anomaly_dir: Path,
+    climatology_path: Path,
+    years: List[int],
+    force: bool,
+    verbose: bool,
+    n_workers: int = 1,
+    manifest: Optional[Path] = None,
+) -> Dict[str, int]:
+    """Yearly anomalies against climatology_path, years in parallel worker processes."""
+    counts = {"ok": 0, "skip": 0, "missing": 0, "failed": 0}
+    config = {"stage": "jra3q_anomaly", "engine": "python"}
+    pairs = []
+    for year in years:
+        src, dst = yearly_file(yearly_dir, year), anomaly_file(anomaly_dir, year)
+        if not src.exists():
+            counts["missing"] += 1
+            continue
+        build, status = needs_build(manifest, dst, "jra3q_anomaly", [src, climatology_path], config, force=force)
+        if not build:
+            if verbose:
+                print(f"[SKIP] anomaly {dst.name}  ({status})")
+            counts["skip"] += 1
+        else:
+            if verbose and status.startswith("stale"):
+                print(f"[STALE] anomaly {dst.name}  ({status})")
+            pairs.append((src, dst))
+
+    t0 = time.perf_counter()
+    results = write_anomalies(pairs, climatology_path, var="psurf", out_name="psurf", n_workers=n_workers)
+    for (src, _), (dst, status, seconds) in zip(pairs, results):
+        if status == "ok":
+            counts["ok"] += 1
+            if manifest is not None:
+                record(manifest, dst, "jra3q_anomaly", [src, climatology_path], config, seconds)
+            if verbose:
+                print(f"[DONE] anomaly {Path(dst).name}")
+                print(f"[TIME] anomaly {Path(dst).name}: ok in {seconds:.1f}s")
+        else:
+            counts["failed"] += 1
+            print(f"[FAIL] anomaly {Path(dst).name}: {status}", file=sys.stderr)
+    if results:
+        print(
+            f"[TIME] anomaly: {len(results)} tasks in {time.perf_counter() - t0:.1f}s wall "
+            f"({sum(r[2] for r in results):.1f}s task time, {max(n_workers, 1)} worker(s))"
+        )
+    return counts
+
+
 def compute_anomaly(
     yearly_dir: Path,
     anomaly_dir: Path,
@@ -237,23 +482,31 @@ def compute_anomaly(
     year: int,
     force: bool,
     verbose: bool,
+    manifest: Optional[Path] = None,
 ) -> str:
     src = yearly_file(yearly_dir, year)
     dst = anomaly_file(anomaly_dir, year)
 
     if not src.exists():
         return "missing"
-    if dst.exists() and not force:
+    config = {"stage": "jra3q_anomaly", "engine": "cdo"}
+    build, status = needs_build(manifest, dst, "jra3q_anomaly", [src, climatology_path], config, force=force)
+    if not build:
         if verbose:
-            print(f"[SKIP] anomaly {dst.name}")
+            print(f"[SKIP] anomaly {dst.name}  ({status})")
         return "skip"
+    if verbose and status.startswith("stale"):
+        print(f"[STALE] anomaly {dst.name}  ({status})")
 
     anomaly_dir.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
     cmd = ["-f", "nc", "-setname,psurf", "-ydaysub", str(src), str(climatology_path), str(dst)]
     if not run_cdo(cmd, verbose):
         print(f"[FAIL] anomaly {dst.name}")
         return "failed"
 
+    if manifest is not None:
+        record(manifest, dst, "jra3q_anomaly", [src, climatology_path], config, time.perf_counter() - start)
     if verbose:
         print(f"[DONE] anomaly {dst.name}")
     return "ok"
@@ -284,13 +537,65 @@ def main() -> None:
     parser.add_argument("--months", default="12,1,2,3,4", help="Comma-separated months to process")
     parser.add_argument("--start-year", type=int, default=None)
     parser.add_argument("--end-year", type=int, default=None)
-    parser.add_argument("--force", action="store_true", help="Overwrite existing outputs")
+    parser.add_argument("--force", action="store_true",
+                        help="Overwrite outputs the manifest records as up to date")
+    parser.add_argument(
+        "--manifest",
+        default=None,
+        help="Processing manifest database (default: $PIPELINE_MANIFEST or Data/manifest.sqlite)",
+    )
+    parser.add_argument(
+        "--grib-reader",
+        choices=("cdo", "eccodes"),
+        default="cdo",
+        help="cdo: mergetime + daymean (default); eccodes: read the prmsl message of each file "
+             "directly (needs ecCodes)",
+    )
+    parser.add_argument(
+        "--grib-index-dir",
+        default=None,
+        help="Cache of per-month GRIB message indexes for --grib-reader eccodes "
+             "(default: $JRA3Q_GRIB_INDEX or <daily-dir>/.grib_index)",
+    )
+    parser.add_argument(
+        "--climatology-engine",
+        choices=("python", "cdo"),
+        default="python",
+        help="python: streaming one-pass engine (default); cdo: mergetime + ydaymean/ydaysub",
+    )
+    parser.add_argument(
+        "--harmonics",
+        type=int,
+        default=0,
+        help="Smooth the climatology with this many annual harmonics (python engine; 0 = raw daily means)",
+    )
+    parser.add_argument(
+        "--baseline",
+        action="append",
+        default=[],
+        metavar="NAME=START-END",
+        help="Extra baseline period written as climatology_psurf_NAME.nc in the same pass "
+             "(python engine; repeatable)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("SLURM_CPUS_PER_TASK", "1")),
+        help="Concurrent tasks per stage (monthly GRIB ingestion, yearly builds, anomalies; "
+             "default: $SLURM_CPUS_PER_TASK or 1)",
+    )
     parser.add_argument("--quiet", action="store_true")
     args = parser.parse_args()
 
     if shutil.which("cdo") is None:
         print("ERROR: cdo not found in PATH.", file=sys.stderr)
         sys.exit(1)
+    if args.grib_reader == "eccodes":
+        try:
+            require_eccodes()
+        except ImportError as exc:
+            print(f"ERROR: {exc}", file=sys.stderr)
+            sys.exit(1)
 
     root = Path(__file__).resolve().parent.parent
     source_dir = Path(
@@ -341,11 +646,18 @@ def main() -> None:
 
     try:
         months = parse_months(args.months)
+        baselines = parse_baselines(args.baseline)
     except ValueError as exc:
         print(f"ERROR: {exc}", file=sys.stderr)
         sys.exit(1)
 
     verbose = not args.quiet
+    manifest = Path(args.manifest) if args.manifest else manifest_path(root / "Data")
+    grib_index_dir = Path(
+        args.grib_index_dir
+        or os.environ.get("JRA3Q_GRIB_INDEX", "")
+        or str(daily_dir / ".grib_index")
+    )
 
     if not source_dir.is_dir():
         print(f"ERROR: Source directory not found: {source_dir}", file=sys.stderr)
@@ -371,24 +683,43 @@ def main() -> None:
     print(f"Months          : {months}")
     print(f"Years           : {start_year}-{end_year}")
     print(f"Force           : {args.force}")
+    print(f"Manifest        : {manifest}")
+    print(f"GRIB reader     : {args.grib_reader}"
+          + (f" (index {grib_index_dir})" if args.grib_reader == "eccodes" else ""))
+    print(f"Climatology     : {args.climatology_engine} engine"
+          + (f", {args.harmonics} harmonics" if args.climatology_engine == "python" and args.harmonics else ""))
+    if baselines:
+        print(f"Baselines       : {', '.join(f'{n}={a}-{b}' for n, (a, b) in baselines.items())}")
     print("=" * 72)
 
-    monthly_counts = {"ok": 0, "skip": 0, "missing": 0, "failed": 0}
-    for year in range(start_year, end_year + 1):
-        for month in months:
-            status, _ = process_month(
-                src_dir=source_dir,
-                daily_dir=daily_dir,
-                year=year,
-                month=month,
-                lon_min=lon_min,
-                lon_max=lon_max,
-                lat_min=lat_min,
-                lat_max=lat_max,
-                force=args.force,
-                verbose=verbose,
-            )
-            monthly_counts[status] = monthly_counts.get(status, 0) + 1
+    def month_task(year: int, month: int) -> str:
+        status, _ = process_month(
+            src_dir=source_dir,
+            daily_dir=daily_dir,
+            year=year,
+            month=month,
+            lon_min=lon_min,
+            lon_max=lon_max,
+            lat_min=lat_min,
+            lat_max=lat_max,
+            force=args.force,
+            verbose=verbose,
+            manifest=manifest,
+            grib_reader=args.grib_reader,
+            grib_index_dir=grib_index_dir,
+        )
+        return status
+
+    monthly_counts = count_statuses(run_stage(
+        "monthly",
+        [
+            (f"{year}{month:02d}", partial(month_task, year, month))
+            for year in range(start_year, end_year + 1)
+            for month in months
+        ],
+        args.workers,
+        verbose,
+    ))
 
     print()
     print(
@@ -399,20 +730,29 @@ def main() -> None:
         f"failed={monthly_counts['failed']}"
     )
 
-    yearly_counts = {"ok": 0, "skip": 0, "missing": 0, "failed": 0}
-    yearly_years: List[int] = []
-    for year in range(start_year, end_year + 1):
-        status = build_yearly_file(
-            daily_dir=daily_dir,
-            yearly_dir=yearly_dir,
-            year=year,
-            months=months,
-            force=args.force,
-            verbose=verbose,
-        )
-        yearly_counts[status] = yearly_counts.get(status, 0) + 1
-        if status in ("ok", "skip") and yearly_file(yearly_dir, year).exists():
-            yearly_years.append(year)
+    yearly_results = run_stage(
+        "yearly",
+        [
+            (str(year), partial(
+                build_yearly_file,
+                daily_dir=daily_dir,
+                yearly_dir=yearly_dir,
+                year=year,
+                months=months,
+                force=args.force,
+                verbose=verbose,
+                manifest=manifest,
+            ))
+            for year in range(start_year, end_year + 1)
+        ],
+        args.workers,
+        verbose,
+    )
+    yearly_counts = count_statuses(yearly_results)
+    yearly_years: List[int] = [
+        year for year in range(start_year, end_year + 1)
+        if yearly_results[str(year)] in ("ok", "skip") and yearly_file(yearly_dir, year).exists()
+    ]
 
     print()
     print(
@@ -427,28 +767,63 @@ def main() -> None:
         print("ERROR: No yearly files available for climatology/anomaly.", file=sys.stderr)
         sys.exit(1)
 
-    climatology_status, climatology_path = compute_climatology(
-        yearly_dir=yearly_dir,
-        climatology_dir=climatology_dir,
-        years=yearly_years,
-        force=args.force,
-        verbose=verbose,
-    )
+    t_clim = time.perf_counter()
+    if args.climatology_engine == "python":
+        climatology_status, climatology_path = compute_climatology_streaming(
+            yearly_dir=yearly_dir,
+            climatology_dir=climatology_dir,
+            years=yearly_years,
+            baselines=baselines,
+            n_harmonics=args.harmonics,
+            force=args.force,
+            verbose=verbose,
+            manifest=manifest,
+        )
+    else:
+        climatology_status, climatology_path = compute_climatology(
+            yearly_dir=yearly_dir,
+            climatology_dir=climatology_dir,
+            years=yearly_years,
+            force=args.force,
+            verbose=verbose,
+            manifest=manifest,
+        )
+    if climatology_status == "ok":
+        print(f"[TIME] climatology: {time.perf_counter() - t_clim:.1f}s")
     if climatology_status in ("failed", "missing") or not climatology_path.exists():
         print("ERROR: Climatology creation failed.", file=sys.stderr)
         sys.exit(1)
 
-    anomaly_counts = {"ok": 0, "skip": 0, "missing": 0, "failed": 0}
-    for year in yearly_years:
-        status = compute_anomaly(
+    if args.climatology_engine == "python":
+        anomaly_counts = compute_anomalies_streaming(
             yearly_dir=yearly_dir,
             anomaly_dir=anomaly_dir,
             climatology_path=climatology_path,
-            year=year,
+            years=yearly_years,
             force=args.force,
             verbose=verbose,
+            n_workers=args.workers,
+            manifest=manifest,
         )
-        anomaly_counts[status] = anomaly_counts.get(status, 0) + 1
+    else:
+        anomaly_counts = count_statuses(run_stage(
+            "anomaly",
+            [
+                (str(year), partial(
+                    compute_anomaly,
+                    yearly_dir=yearly_dir,
+                    anomaly_dir=anomaly_dir,
+                    climatology_path=climatology_path,
+                    year=year,
+                    force=args.force,
+                    verbose=verbose,
+                    manifest=manifest,
+                ))
+                for year in yearly_years
+            ],
+            args.workers,
+            verbose,
+        ))
 
     print()
     print(
@@ -1,155 +1,175 @@
 """
-Temporary script to select analogues from pre-calculated all_distances.csv
+Select analogues from a pre-calculated all_distances.csv.
+
+Re-runs only the selection step of analogue_search.py, so changing the period
+split (or studying its sensitivity) does not need a new distance computation.
+Epochs are taken from analogue_config.yaml (`periods`, plus `period_windows`
+if set) unless overridden on the command line; all of them are selected from
+the same distance table in one grouped pass.
 
 Usage:
-    python select_analogues_from_distances.py
-    
-This reads the existing all_distances.csv and applies the new period ranges
-(past: 1948-1987, present: 1988-2026) to select analogues.
+    python select_analogues_from_distances.py --dataset era5 --event antarctica_peninsula_2020
+    python select_analogues_from_distances.py --dataset era5 --event antarctica_peninsula_2020 \
+        --period_windows 30:10 --output_dir /tmp/sensitivity
+    python select_analogues_from_distances.py --distances all_distances.csv \
+        --snapshot_date 2020-02-08 --epoch past=1948:1987 --epoch present=1988:2026
+
+Outputs (in the distances file's directory unless --output_dir is given;
+.parquet instead of .csv with --output_format parquet):
+    <epoch>_analogues.csv  one file per epoch
+    analogues.csv          all epochs combined (period column = epoch name)
+
+The distances table may be CSV or Parquet.
 """
 
-import pandas as pd
+import argparse
+import sys
 from pathlib import Path
+from typing import Dict, Tuple
+
+import pandas as pd
+
+from data_utils import (
+    load_env_setting,
+    load_analogue_config,
+    load_events_config,
+    get_data_paths,
+    ensure_dir,
+)
+from analogue_selection import epoch_definitions, sliding_epochs, select_epoch_analogues
+from table_io import TABLE_FORMATS, find_table, read_table, read_table_metadata, table_suffix, write_table
 
-# =============================================================================
-# Configuration - edit as needed
-# =============================================================================
-DISTANCES_FILE = Path("/home/yi260/rds/hpc-work/analogue/Data/F02_analogue_search/era5/antarctica_peninsula_2020/all_distances.csv")
-OUTPUT_DIR = DISTANCES_FILE.parent
-
-# Period ranges
-PAST_START = 1948
-PAST_END = 1987
-PRESENT_START = 1988
-PRESENT_END = 2026
-
-# Analogue selection parameters
-N_ANALOGUES = 15
-MIN_SEPARATION_DAYS = 5
-
-# Snapshot date to exclude (and nearby dates)
-SNAPSHOT_DATE = pd.Timestamp("2020-02-08")
-
-# =============================================================================
-# Functions
-# =============================================================================
-
-def select_time_separated_analogues(
-    df: pd.DataFrame,
-    n_analogues: int,
-    time_col: str = 'date',
-    distance_col: str = 'distance',
-    min_separation: pd.Timedelta = pd.Timedelta('5D')
-) -> pd.DataFrame:
-    """
-    Select top N analogues with minimum time separation.
-    """
-    df_sorted = df.sort_values(distance_col).reset_index(drop=True)
-    
-    chosen_indices = []
-    chosen_dates = []
-    
-    for idx, row in df_sorted.iterrows():
-        candidate_date = row[time_col]
-        
-        is_separated = True
-        for chosen_date in chosen_dates:
-            if abs(candidate_date - chosen_date) < min_separation:
-                is_separated = False
-                break
-        
-        if is_separated:
-            chosen_indices.append(idx)
-            chosen_dates.append(candidate_date)
-            
-            if len(chosen_indices) >= n_analogues:
-                break
-    
-    result = df_sorted.loc[chosen_indices].copy()
-    result['rank'] = range(1, len(result) + 1)
-    
-    return result
+
+def parse_epoch(spec: str) -> Tuple[str, Tuple[int, int]]:
+    """Parse 'name=START:END' into (name, (START, END))."""
+    try:
+        name, years = spec.split('=', 1)
+        start, end = years.split(':', 1)
+        return name.strip(), (int(start), int(end))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid epoch '{spec}', expected name=START:END")
 
 
 def main():
+    parser = argparse.ArgumentParser(
+        description='Select analogues for any set of epochs from a pre-calculated all_distances.csv'
+    )
+    parser.add_argument('--dataset', type=str, default=None,
+                        help='Dataset name (used with --event to locate all_distances.csv)')
+    parser.add_argument('--event', type=str, default=None,
+                        help='Event name from extreme_events.yaml (locates inputs and snapshot_date)')
+    parser.add_argument('--distances', type=Path, default=None,
+                        help='Explicit path to all_distances.csv/.parquet (overrides --dataset/--event lookup)')
+    parser.add_argument('--snapshot_date', type=str, default=None,
+                        help='Reference date to exclude (default: event snapshot_date)')
+    parser.add_argument('--epoch', type=parse_epoch, action='append', default=None,
+                        help='Epoch as name=START:END (repeatable); replaces the config periods')
+    parser.add_argument('--period_windows', type=str, default=None,
+                        help='Add sliding epochs LENGTH[:STEP] in years over the span of the data')
+    parser.add_argument('--n_analogues', type=int, default=None,
+                        help='Analogues per epoch (default: config n_analogues)')
+    parser.add_argument('--output_dir', type=Path, default=None,
+                        help='Output directory (default: directory of the distances file)')
+    parser.add_argument('--output_format', choices=TABLE_FORMATS, default='csv',
+                        help='Table format for the analogue outputs (parquet needs pyarrow)')
+    args = parser.parse_args()
+
+    analogue_config = load_analogue_config()
+
+    # Locate distances file and snapshot date
+    snapshot_date = pd.Timestamp(args.snapshot_date) if args.snapshot_date else None
+    distances_file = args.distances
+    if args.event:
+        event = next((e for e in load_events_config().get('events', []) if e['name'] == args.event), None)
+        if event is None:
+            print(f"Event not found: {args.event}")
+            sys.exit(1)
+        if snapshot_date is None and 'snapshot_date' in event:
+            snapshot_date = pd.Timestamp(event['snapshot_date'])
+        if distances_file is None:
+            if not args.dataset:
+                print("--dataset is required with --event unless --distances is given")
+                sys.exit(1)
+            paths = get_data_paths(load_env_setting())
+            distances_file = paths['analogue'] / args.dataset / args.event / 'all_distances.csv'
+    if distances_file is None:
+        parser.error('give --distances, or --dataset and --event')
+    distances_file = find_table(distances_file)
+    if not distances_file.exists():
+        print(f"Distances file not found: {distances_file}")
+        sys.exit(1)
+
+    output_dir = ensure_dir(args.output_dir or distances_file.parent)
+    n_analogues = args.n_analogues or analogue_config.get('n_analogues', 15)
+    smoothing_days = analogue_config.get('smoothing', {}).get('window_days', 5)
+    min_separation = pd.Timedelta(days=smoothing_days)
+
     print("=" * 60)
     print("Select Analogues from Pre-calculated Distances")
     print("=" * 60)
-    print(f"Input: {DISTANCES_FILE}")
-    print(f"Past period: {PAST_START}-{PAST_END}")
-    print(f"Present period: {PRESENT_START}-{PRESENT_END}")
-    print(f"N analogues: {N_ANALOGUES}")
-    print(f"Min separation: {MIN_SEPARATION_DAYS} days")
-    print()
-    
+    print(f"Input: {distances_file}")
+
     # Load distances
     print("Loading distances...")
-    df = pd.read_csv(DISTANCES_FILE)
-    df['date'] = pd.to_datetime(df['date'])
+    df = read_table(distances_file)
+    if 'year' not in df.columns:
+        df['year'] = df['date'].dt.year
     print(f"  Total rows: {len(df)}")
     print(f"  Date range: {df['date'].min()} to {df['date'].max()}")
     print(f"  Distance range: {df['distance'].min():.2e} to {df['distance'].max():.2e}")
+
+    # Epochs: command line overrides config
+    if args.epoch:
+        epochs: Dict[str, Tuple[int, int]] = dict(args.epoch)
+    else:
+        epochs = epoch_definitions(analogue_config)
+    if args.period_windows:
+        length, _, step = args.period_windows.partition(':')
+        epochs.update(sliding_epochs(
+            int(df['year'].min()), int(df['year'].max()), int(length), int(step) if step else 1
+        ))
+    if not epochs:
+        print("No epochs defined (config periods, --epoch or --period_windows)")
+        sys.exit(1)
+
+    print(f"Epochs: {len(epochs)}")
+    for name, (start, end) in epochs.items():
+        print(f"  {name}: {start}-{end}")
+    print(f"N analogues: {n_analogues}")
+    print(f"Min separation: {smoothing_days} days")
+    if snapshot_date is not None:
+        print(f"Excluding around snapshot: {snapshot_date.strftime('%Y-%m-%d')}")
     print()
-    
-    # Define period masks
-    min_separation = pd.Timedelta(days=MIN_SEPARATION_DAYS)
-    
-    past_mask = (df['year'] >= PAST_START) & (df['year'] <= PAST_END)
-    present_mask = (df['year'] >= PRESENT_START) & (df['year'] <= PRESENT_END)
-    
-    # Exclude snapshot date
-    snapshot_exclusion = (
-        (df['date'] >= SNAPSHOT_DATE - min_separation) & 
-        (df['date'] <= SNAPSHOT_DATE + min_separation)
-    )
-    past_mask = past_mask & ~snapshot_exclusion
-    present_mask = present_mask & ~snapshot_exclusion
-    
-    print(f"Past candidates: {past_mask.sum()}")
-    print(f"Present candidates: {present_mask.sum()}")
-    print()
-    
-    # Select past analogues
-    print("Selecting past analogues...")
-    past_candidates = df[past_mask].copy()
-    past_df = select_time_separated_analogues(
-        past_candidates,
-        n_analogues=N_ANALOGUES,
-        min_separation=min_separation
-    )
-    past_df['period'] = 'past'
-    
-    print(f"\n--- Top {len(past_df)} Past Analogues ---")
-    print(past_df[['rank', 'date', 'distance']].to_string(index=False))
-    
-    # Select present analogues
-    print("\nSelecting present analogues...")
-    present_candidates = df[present_mask].copy()
-    present_df = select_time_separated_analogues(
-        present_candidates,
-        n_analogues=N_ANALOGUES,
-        min_separation=min_separation
+
+    selected, masks = select_epoch_analogues(
+        df,
+        epochs,
+        n_analogues=n_analogues,
+        min_separation=min_separation,
+        exclude_around=snapshot_date
     )
-    present_df['period'] = 'present'
-    
-    print(f"\n--- Top {len(present_df)} Present Analogues ---")
-    print(present_df[['rank', 'date', 'distance']].to_string(index=False))
-    
-    # Save results
-    past_file = OUTPUT_DIR / 'past_analogues.csv'
-    present_file = OUTPUT_DIR / 'present_analogues.csv'
-    combined_file = OUTPUT_DIR / 'analogues.csv'
-    
-    past_df.to_csv(past_file, index=False)
-    present_df.to_csv(present_file, index=False)
-    
-    combined = pd.concat([past_df, present_df], ignore_index=True)
-    combined.to_csv(combined_file, index=False)
-    
-    print(f"\n--- Results saved ---")
-    print(f"  Past: {past_file}")
-    print(f"  Present: {present_file}")
-    print(f"  Combined: {combined_file}")
+
+    # Keep the distance run's metadata (Parquet input) and record this selection
+    metadata = {
+        **read_table_metadata(distances_file),
+        'n_analogues': n_analogues,
+        'smoothing_days': smoothing_days,
+        'epochs': {name: list(bounds) for name, bounds in epochs.items()},
+    }
+    ext = table_suffix(args.output_format)
+
+    print("--- Results ---")
+    for name, epoch_df in selected.items():
+        epoch_file = output_dir / f'{name}_analogues{ext}'
+        write_table(epoch_df, epoch_file, {**metadata, 'epoch': name})
+        best = epoch_df['date'].iloc[0].strftime('%Y-%m-%d') if len(epoch_df) > 0 else '-'
+        print(f"  {name}: {int(masks[name].sum())} candidates, {len(epoch_df)} selected, best {best}")
+
+    combined_file = output_dir / f'analogues{ext}'
+    combined = pd.concat(list(selected.values()), ignore_index=True)
+    write_table(combined, combined_file, metadata)
+
+    print(f"\nSaved {len(selected)} epoch file(s) and combined table to: {output_dir}")
     print("=" * 60)
 
 
@@ -0,0 +1,403 @@
+"""
+Content-addressed cache for pre-sliced anomaly cubes.
+
+A slice is fully determined by what goes into it: dataset, variable, region,
+calendar window (centre month-day and half-width), year range, the slicer
+used, and the anomaly files it reads.  The cache key is a hash of exactly
+these, including each source file's mtime and size, so:
+
+  - events with the same domain and window (e.g. antarctica_peninsula_2015,
+    _2020 and _2022) share one slice, and
+  - a slice is rebuilt automatically when an anomaly file or the config
+    changes, because its key changes.
+
+Cached slices live under
+
+    <data>/F02_analogue_search/sliced/<dataset>/_cache/<key>/anomaly_<var>_sliced.nc
+
+and the per-event path that analogue_search.py reads,
+sliced/<dataset>/<event>/anomaly_<var>_sliced.nc, is a symlink to the entry.
+Each entry records its request in request.json, which lets an updated
+archive extend the previous entry (previous_slice) instead of rebuilding it.
+
+Entries are never deleted while slicing: superseded ones stay on disk until
+prune_slice_cache (dask_slice.py --prune) removes every entry no event
+slice or cube store links to.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from data_utils import file_exists_and_valid
+
+# Bump when the slicing code changes in a way that alters its output
+SLICE_CACHE_VERSION = 1
+
+
+def sliced_root(paths: Dict[str, Path], dataset: str) -> Path:
+    """Directory holding per-event slice links for a dataset."""
+    return paths["data"] / "F02_analogue_search" / "sliced" / dataset
+
+
+def event_slice_path(paths: Dict[str, Path], dataset: str, event_name: str, var: str) -> Path:
+    """Per-event sliced file path read by analogue_search.py."""
+    return sliced_root(paths, dataset) / event_name / f"anomaly_{var}_sliced.nc"
+
+
+def slice_year_range(analogue_config: Dict[str, Any]) -> tuple:
+    """(start_year, end_year) sliced: past.start_year to present.end_year."""
+    past = analogue_config.get("periods", {}).get("past", {})
+    present = analogue_config.get("periods", {}).get("present", {})
+    start_year = past.get("start_year")
+    end_year = present.get("end_year")
+    if start_year is None or end_year is None:
+        raise ValueError("analogue_config must define periods.past.start_year and periods.present.end_year")
+    return int(start_year), int(end_year)
+
+
+def anomaly_source_files(paths: Dict[str, Path], dataset: str, var: str, start_year: int, end_year: int) -> List[Path]:
+    """Existing anomaly_<var>_<year>.nc files in the year range."""
+    anom_dir = paths["data"] / "F01_preprocess" / dataset / "anomaly"
+    files = []
+    for year in range(start_year, end_year + 1):
+        f = anom_dir / f"anomaly_{var}_{year}.nc"
+        if f.exists():
+            files.append(f)
+    return files
+
+
+def source_signatures(files: List[Path]) -> List[str]:
+    """'name:mtime_ns:size' for each file."""
+    sigs = []
+    for f in files:
+        st = Path(f).stat()
+        sigs.append(f"{Path(f).name}:{st.st_mtime_ns}:{st.st_size}")
+    return sigs
+
+
+def slice_request(
+    dataset: str,
+    var: str,
+    event: Dict[str, Any],
+    analogue_config: Dict[str, Any],
+    paths: Dict[str, Path],
+    slicer: str,
+) -> Dict[str, Any]:
+    """
+    Everything that determines a slice's content, as a JSON-serialisable dict.
+
+    The event name and the rest of the event config are deliberately left out.
+    """
+    snapshot_date = pd.Timestamp(event["snapshot_date"])
+    region = event["region"]
+    start_year, end_year = slice_year_range(analogue_config)
+    # Keyed on what the slicer selects by: the CDO slicer takes the same
+    # month-day every year, the python slicer (dask_slice.compute_calendar_mask)
+    # the snapshot's day of year, which differs between leap and non-leap
+    # snapshot years after February
+    if slicer == "cdo":
+        window_center = snapshot_date.strftime("%m-%d")
+    else:
+        window_center = int(snapshot_date.dayofyear)
+    files = anomaly_source_files(paths, dataset, var, start_year, end_year)
+    return {
+        "version": SLICE_CACHE_VERSION,
+        "slicer": slicer,
+        "dataset": dataset,
+        "var": var,
+        "region": {k: float(region[k]) for k in ("lat_min", "lat_max", "lon_min", "lon_max")},
+        "window_center": window_center,
+        "window_days": int(analogue_config.get("snapshot_calendar_window", 15)),
+        "years": [start_year, end_year],
+        "sources": source_signatures(files),
+    }
+
+
+def slice_key(request: Dict[str, Any]) -> str:
+    """Stable hash of a slice request."""
+    blob = json.dumps(request, sort_keys=True).encode()
+    return hashlib.sha1(blob).hexdigest()[:16]
+
+
+def cache_entry_dir(paths: Dict[str, Path], dataset: str, key: str) -> Path:
+    return sliced_root(paths, dataset) / "_cache" / key
+
+
+def link_into_event(target: Path, link: Path) -> None:
+    """
+    Point the per-event path at a cache entry.
+
+    Uses a relative symlink; if the filesystem does not support symlinks,
+    falls back to a hard link, then to a copy.  Anything already at the
+    link path (a stale link or an old per-event file/dir) is replaced.
+    """
+    link.parent.mkdir(parents=True, exist_ok=True)
+    if link.is_symlink() or link.is_file():
+        link.unlink()
+    elif link.is_dir():
+        shutil.rmtree(link)
+    try:
+        os.symlink(os.path.relpath(target, link.parent), link)
+        return
+    except OSError:
+        pass
+    if target.is_dir():
+        shutil.copytree(target, link)
+        return
+    try:
+        os.link(target, link)
+    except OSError:
+        shutil.copy2(target, link)
+
+
+def slice_plan(
+    dataset: str,
+    var: str,
+    event: Dict[str, Any],
+    analogue_config: Dict[str, Any],
+    paths: Dict[str, Path],
+    slicer: str,
+) -> Dict[str, Any]:
+    """
+    Resolve where an event's slice lives in the cache.
+
+    Returns a dict with the request, its key, the cache entry directory, the
+    cached file, the per-event link path and a temporary build path.
+    """
+    request = slice_request(dataset, var, event, analogue_config, paths, slicer)
+    if not request["sources"]:
+        start_year, end_year = request["years"]
+        raise FileNotFoundError(f"No anomaly files for {var} in {start_year}-{end_year}")
+
+    key = slice_key(request)
+    entry = cache_entry_dir(paths, dataset, key)
+    return {
+        "request": request,
+        "key": key,
+        "entry": entry,
+        "cached_file": entry / f"anomaly_{var}_sliced.nc",
+        "event_file": event_slice_path(paths, dataset, event["name"], var),
+        "tmp_file": entry / f".tmp{os.getpid()}_anomaly_{var}_sliced.nc",
+    }
+
+
+def is_cached(plan: Dict[str, Any]) -> bool:
+    """True if the plan's cache entry already holds a valid slice."""
+    return file_exists_and_valid(plan["cached_file"])
+
+
+def finalize_slice(plan: Dict[str, Any]) -> Path:
+    """Move a slice built at plan['tmp_file'] into the cache entry."""
+    os.replace(plan["tmp_file"], plan["cached_file"])
+    with open(plan["entry"] / "request.json", "w") as f:
+        json.dump(plan["request"], f, indent=1)
+    return plan["cached_file"]
+
+
+def previous_slice(plan: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Cache entry the event currently links to, if the plan can extend it.
+
+    An entry can be extended when it was built with the same settings
+    (slicer, dataset, var, region, window, start year) and differs only in
+    having fewer or older source files, i.e. new days have been appended
+    to the anomaly archive since it was built.
+
+    Returns
+    -------
+    dict or None
+        entry, cached_file, request and changed_sources (names of source
+        files that are new or modified since the entry was built)
+    """
+    link = plan["event_file"]
+    if not link.is_symlink() or not link.exists():
+        return None
+    cached_file = link.resolve()
+    request_file = cached_file.parent / "request.json"
+    if not request_file.exists():
+        return None
+    with open(request_file) as f:
+        old = json.load(f)
+
+    new = plan["request"]
+    fixed = ("version", "slicer", "dataset", "var", "region", "window_center", "window_days")
+    if any(old.get(k) != new.get(k) for k in fixed):
+        return None
+    if old["years"][0] != new["years"][0] or old["years"][1] > new["years"][1]:
+        return None
+
+    old_sources = set(old["sources"])
+    old_names = {sig.split(":", 1)[0] for sig in old_sources}
+    new_names = {sig.split(":", 1)[0] for sig in new["sources"]}
+    if not old_names <= new_names:
+        return None  # A source file disappeared
+
+    return {
+        "entry": cached_file.parent,
+        "cached_file": cached_file,
+        "request": old,
+        "changed_sources": [sig.split(":", 1)[0] for sig in new["sources"] if sig not in old_sources],
+    }
+
+
+def get_or_create_slice(
+    dataset: str,
+    var: str,
+    event: Dict[str, Any],
+    analogue_config: Dict[str, Any],
+    paths: Dict[str, Path],
+    slicer: str,
+    build: Callable[[Path], Path],
+    force: bool = False,
+    verbose: bool = True,
+) -> Path:
+    """
+    Return the event's sliced file, building it only on a cache miss.
+
+    Parameters
+    ----------
+    dataset, var, event, analogue_config, paths
+        As for the slicing functions
+    slicer : str
+        Name of the slicing method ('python', 'cdo'); part of the key
+    build : callable
+        build(out_file) writes the slice to out_file and returns it
+    force : bool
+        Rebuild even if a valid cache entry exists
+    verbose : bool
+        Print progress
+
+    Returns
+    -------
+    Path
+        Per-event path (a link to the cache entry)
+    """
+    plan = slice_plan(dataset, var, event, analogue_config, paths, slicer)
+
+    if force or not is_cached(plan):
+        if verbose:
+            print(f"Slice cache miss ({plan['key']}); building...", flush=True)
+        plan["entry"].mkdir(parents=True, exist_ok=True)
+        try:
+            build(plan["tmp_file"])
+            finalize_slice(plan)
+        finally:
+            if plan["tmp_file"].exists():
+                plan["tmp_file"].unlink()
+    elif verbose:
+        print(f"Slice cache hit ({plan['key']}): {plan['cached_file']}", flush=True)
+
+    link_into_event(plan["cached_file"], plan["event_file"])
+    return plan["event_file"]
+
+
+def referenced_entries(paths: Dict[str, Path], dataset: str) -> set:
+    """
+    Cache entries some event still points at.
+
+    An entry is referenced by a per-event slice link under sliced/<dataset>/
+    or by a per-event cube store link under store/<dataset>/ (the store
+    lives in the entry as store_<var>).  Per-event hard links count too;
+    per-event copies do not need their entry.
+    """
+    cache_root = sliced_root(paths, dataset) / "_cache"
+    if not cache_root.is_dir():
+        return set()
+    entries = {e.name: e for e in cache_root.iterdir() if e.is_dir()}
+    inodes = {}
+    for key, entry in entries.items():
+        for f in entry.glob("anomaly_*_sliced.nc"):
+            inodes[(f.stat().st_dev, f.stat().st_ino)] = key
+
+    store_root = paths["data"] / "F02_analogue_search" / "store" / dataset
+    candidates = [
+        p
+        for root in (sliced_root(paths, dataset), store_root)
+        if root.is_dir()
+        for event_dir in root.iterdir()
+        if event_dir.is_dir() and event_dir.name != "_cache"
+        for p in event_dir.iterdir()
+    ]
+
+    referenced = set()
+    for p in candidates:
+        if p.is_symlink():
+            target = p.resolve()
+            # Slice file or store_<var> directory directly inside an entry;
+            # dangling links (e.g. a store moved on by --incremental) do not count
+            if target.exists() and target.parent.parent == cache_root.resolve():
+                referenced.add(target.parent.name)
+        elif p.is_file():
+            st = p.stat()
+            key = inodes.get((st.st_dev, st.st_ino))
+            if key is not None:
+                referenced.add(key)
+    return referenced
+
+
+def prune_slice_cache(
+    paths: Dict[str, Path],
+    dataset: str,
+    dry_run: bool = False,
+    verbose: bool = True,
+) -> List[Path]:
+    """
+    Delete cache entries that no event references any more.
+
+    Entries become orphaned when the anomaly files or the config change
+    (the event is relinked to a new key), when --incremental moves an event
+    to an extended entry, or when an event is removed.  Each orphaned entry
+    is deleted with everything in it, including its cube stores.  Entries
+    holding an in-progress build (dot-files from a running slicer) are kept.
+
+    Do not run this while another process may be between building an entry
+    and linking its event.
+
+    Parameters
+    ----------
+    paths : dict
+        Data paths from get_data_paths
+    dataset : str
+        Dataset whose cache to prune
+    dry_run : bool
+        Only report what would be deleted
+    verbose : bool
+        Print each entry and the space freed
+
+    Returns
+    -------
+    list of Path
+        Entries deleted (or that would be deleted with dry_run)
+    """
+    cache_root = sliced_root(paths, dataset) / "_cache"
+    if not cache_root.is_dir():
+        return []
+    referenced = referenced_entries(paths, dataset)
+
+    pruned = []
+    freed = 0
+    for entry in sorted(cache_root.iterdir()):
+        if not entry.is_dir() or entry.name in referenced:
+            continue
+        if any(f.name.startswith(".") for f in entry.iterdir()):
+            if verbose:
+                print(f"Slice cache: keeping {entry.name} (build in progress)")
+            continue
+        size = sum(f.stat().st_size for f in entry.rglob("*") if f.is_file())
+        if verbose:
+            print(f"Slice cache: {'would remove' if dry_run else 'removing'} {entry.name} ({size / 1e6:.1f} MB)")
+        if not dry_run:
+            shutil.rmtree(entry)
+        pruned.append(entry)
+        freed += size
+
+    if verbose:
+        print(f"Slice cache: {len(pruned)} unreferenced entries, {freed / 1e9:.2f} GB "
+              f"{'reclaimable' if dry_run else 'freed'}, {len(referenced)} in use", flush=True)
+    return pruned
@@ -0,0 +1,130 @@
+"""
+Reading and writing analogue tables as CSV or Parquet.
+
+all_distances and analogue tables are written as CSV by default.  With
+output_format='parquet' they are written as Parquet instead: typed columns
+(timestamp dates, small integers), compressed, and with run metadata
+(dataset, metric, sigma, calendar window, ...) stored in the file schema.
+Parquet needs pyarrow, which is optional; CSV output works without it.
+
+The format is chosen by file suffix, so readers accept either:
+
+    df = read_table(find_table(output_dir / 'analogues.csv'))
+
+finds analogues.parquet if only that exists.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+TABLE_FORMATS = ('csv', 'parquet')
+
+# Schema metadata key holding the run metadata (JSON)
+METADATA_KEY = b'analogue'
+
+# Columns stored as timestamps (Parquet) / parsed as datetime64 on read
+DATE_COLUMNS = ('date', 'reference_date')
+
+# Narrow integer types for calendar/rank columns in Parquet output
+_PARQUET_DTYPES = {'year': 'int16', 'month': 'int8', 'day': 'int8', 'rank': 'int16'}
+
+
+def table_suffix(output_format: str) -> str:
+    """File suffix ('.csv' or '.parquet') for an output format."""
+    if output_format not in TABLE_FORMATS:
+        raise ValueError(f"Unknown table format '{output_format}'; choose from {', '.join(TABLE_FORMATS)}")
+    return f'.{output_format}'
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet tables need pyarrow. Install: pip install pyarrow") from None
+    return pyarrow
+
+
+def write_table(df: pd.DataFrame, path: Path, metadata: Optional[Dict[str, Any]] = None) -> Path:
+    """
+    Write a table; the format follows the suffix of path.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Table to write (the index is not written)
+    path : Path
+        Output path ending in .csv or .parquet
+    metadata : dict, optional
+        JSON-serialisable run metadata, stored in the Parquet schema
+        (not written for CSV)
+
+    Returns
+    -------
+    Path
+        The written file
+    """
+    path = Path(path)
+    if path.suffix != '.parquet':
+        df.to_csv(path, index=False)
+        return path
+
+    pa = _require_pyarrow()
+    df = df.astype({col: dtype for col, dtype in _PARQUET_DTYPES.items() if col in df.columns})
+    df = df.assign(**{col: pd.to_datetime(df[col]) for col in DATE_COLUMNS if col in df.columns})
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if metadata:
+        schema_meta = dict(table.schema.metadata or {})
+        schema_meta[METADATA_KEY] = json.dumps(metadata, default=str).encode()
+        table = table.replace_schema_metadata(schema_meta)
+    pa.parquet.write_table(table, path, compression='zstd')
+    return path
+
+
+def read_table(path: Path) -> pd.DataFrame:
+    """
+    Read a CSV or Parquet table; date-like columns are returned as datetime64.
+
+    CSV floats are parsed with round-trip precision, so values written by
+    write_table are read back exactly.
+    """
+    path = Path(path)
+    if path.suffix == '.parquet':
+        _require_pyarrow()
+        return pd.read_parquet(path)
+    df = pd.read_csv(path, float_precision='round_trip')
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def read_table_metadata(path: Path) -> Dict[str, Any]:
+    """Run metadata stored with a Parquet table ({} for CSV or if absent)."""
+    path = Path(path)
+    if path.suffix != '.parquet':
+        return {}
+    pa = _require_pyarrow()
+    schema_meta = pa.parquet.read_schema(path).metadata or {}
+    if METADATA_KEY not in schema_meta:
+        return {}
+    return json.loads(schema_meta[METADATA_KEY])
+
+
+def find_table(path: Path) -> Path:
+    """
+    Return path, or its sibling with the other table suffix if only that exists.
+
+    Lets tools configured with '<name>.csv' read '<name>.parquet' outputs.
+    """
+    path = Path(path)
+    if path.exists():
+        return path
+    for fmt in TABLE_FORMATS:
+        alt = path.with_suffix(table_suffix(fmt))
+        if alt.exists():
+            return alt
+    return path
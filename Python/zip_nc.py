@@ -0,0 +1,107 @@
+"""
+NetCDF files delivered inside CDS ZIP archives.
+
+Older CDS downloads (and some data_slice files) are ZIP archives holding a
+single NetCDF member.  Rather than extracting the member to a temporary
+.nc on every access:
+
+    open_zip_dataset(path)          opens the member from memory (xarray)
+    open_zip_nc(path)               same, as a netCDF4.Dataset
+    extract_cached(path, cache_dir) one-time extraction for tools that need
+                                    a real file (CDO), keyed by archive
+                                    path, mtime and size
+
+Member bytes are kept in a small in-process cache keyed by (path, mtime,
+size), so opening the same archive again costs no decompression.
+"""
+
+import hashlib
+import os
+import shutil
+import zipfile
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import netCDF4
+import xarray as xr
+
+PathLike = Union[str, Path]
+
+# Archives whose member bytes are kept in memory (data slices are small)
+MEMBER_CACHE_SIZE = 8
+
+
+def is_zip(path: PathLike) -> bool:
+    """Check whether a file is a ZIP archive (CDS raw download)."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(4) == b"PK\x03\x04"
+    except OSError:
+        return False
+
+
+def find_member(zf: zipfile.ZipFile, match: Optional[Callable[[str], bool]] = None) -> str:
+    """Name of the first member accepted by match (default: first .nc member)."""
+    match = match or (lambda n: n.endswith(".nc"))
+    for name in zf.namelist():
+        if match(name):
+            return name
+    raise ValueError(f"No matching NetCDF member in {zf.filename}")
+
+
+@lru_cache(maxsize=MEMBER_CACHE_SIZE)
+def _member_bytes(path: str, mtime_ns: int, size: int, match: Optional[Callable[[str], bool]]) -> bytes:
+    with zipfile.ZipFile(path) as zf:
+        return zf.read(find_member(zf, match))
+
+
+def read_member(path: PathLike, match: Optional[Callable[[str], bool]] = None) -> bytes:
+    """Bytes of the NetCDF member of a ZIP archive (cached while the file is unchanged)."""
+    path = os.path.realpath(path)
+    st = os.stat(path)
+    return _member_bytes(path, st.st_mtime_ns, st.st_size, match)
+
+
+def open_zip_nc(path: PathLike, match: Optional[Callable[[str], bool]] = None) -> netCDF4.Dataset:
+    """Open the NetCDF member of a ZIP archive in memory as a netCDF4.Dataset."""
+    return netCDF4.Dataset(os.path.basename(path), mode="r", memory=read_member(path, match))
+
+
+def open_zip_dataset(path: PathLike, match: Optional[Callable[[str], bool]] = None) -> xr.Dataset:
+    """Open the NetCDF member of a ZIP archive in memory as an xarray Dataset."""
+    store = xr.backends.NetCDF4DataStore(open_zip_nc(path, match))
+    return xr.open_dataset(store)
+
+
+def archive_key(path: PathLike) -> str:
+    """sha1 of the archive's (resolved path, mtime_ns, size); no content read."""
+    path = os.path.realpath(path)
+    st = os.stat(path)
+    return hashlib.sha1(f"{path}:{st.st_mtime_ns}:{st.st_size}".encode()).hexdigest()
+
+
+def extract_cached(path: PathLike, cache_dir: PathLike) -> Path:
+    """
+    Extract the NetCDF member of a ZIP archive once into cache_dir.
+
+    The extracted file is named by archive_key, so re-runs and other links
+    to the same archive reuse it without re-reading the archive; a rewritten
+    archive gets a new name.  Writes are atomic (tmp + rename).
+
+    Returns
+    -------
+    Path
+        <cache_dir>/<archive_key>.nc
+    """
+    cache_dir = Path(cache_dir)
+    dest = cache_dir / f"{archive_key(path)}.nc"
+    if dest.exists():
+        return dest
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + f".tmp{os.getpid()}")
+    with zipfile.ZipFile(path) as zf:
+        with zf.open(find_member(zf)) as src, open(tmp, "wb") as out:
+            shutil.copyfileobj(src, out, 1 << 20)
+    os.replace(tmp, dest)
+    return dest
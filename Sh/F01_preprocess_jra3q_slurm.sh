@@ -23,6 +23,9 @@
 #   sbatch F01_preprocess_jra3q_slurm.sh
 #   FORCE=1 sbatch F01_preprocess_jra3q_slurm.sh
 #   START_YEAR=1948 END_YEAR=2025 MONTHS="12,1,2,3,4" sbatch F01_preprocess_jra3q_slurm.sh
+#   CLIM_ENGINE=cdo sbatch F01_preprocess_jra3q_slurm.sh      # CDO mergetime/ydaymean chain
+#   GRIB_READER=eccodes sbatch F01_preprocess_jra3q_slurm.sh  # direct GRIB reader (needs ecCodes)
+#   HARMONICS=3 BASELINES="wmo=1991-2020" sbatch --cpus-per-task=4 F01_preprocess_jra3q_slurm.sh
 # =============================================================================
 
 set -euo pipefail
@@ -64,6 +67,15 @@ if [ "${FORCE:-0}" = "1" ]; then
     CMD+=(--force)
 fi
 
+CMD+=(--grib-reader "${GRIB_READER:-cdo}")
+CMD+=(--climatology-engine "${CLIM_ENGINE:-python}")
+if [ -n "${HARMONICS:-}" ]; then
+    CMD+=(--harmonics "${HARMONICS}")
+fi
+for baseline in ${BASELINES:-}; do
+    CMD+=(--baseline "${baseline}")
+done
+
 echo "================================================================"
 echo "F01: JRA-3Q preprocess"
 echo "================================================================"
@@ -74,6 +86,7 @@ echo "START_YEAR:   ${START_YEAR:-$JRA3Q_START_YEAR}"
 echo "END_YEAR:     ${END_YEAR:-$END_YEAR}"
 echo "MONTHS:       ${MONTHS:-12,1,2,3,4}"
 echo "FORCE:        ${FORCE:-0}"
+echo "CLIM_ENGINE:  ${CLIM_ENGINE:-python}"
 echo "Command:      ${CMD[*]}"
 echo "================================================================"
 
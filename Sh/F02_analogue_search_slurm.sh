@@ -26,6 +26,8 @@
 #   DATASET=era5 sbatch F02_analogue_search_slurm.sh
 #   DATASET=mswx sbatch F02_analogue_search_slurm.sh
 #   SKIP_CDO=true sbatch ...                         # Skip CDO, use Python/dask lazy loading (faster)
+#   STORE=true sbatch ...                            # Also build the memory-mapped cube store
+#   INCREMENTAL=true sbatch ...                      # Append new days to slice/distances instead of rebuilding
 # =============================================================================
 
 set -e  # Exit on error
@@ -61,6 +63,8 @@ DATASET="${DATASET:-era5}"
 EVENT="${EVENT:-antarctica_peninsula_2022}"
 PERIOD="${PERIOD:-}"  # Empty = process both periods
 SKIP_CDO="${SKIP_CDO:-false}"  # Skip CDO pre-slicing, use Python/dask lazy loading instead
+STORE="${STORE:-false}"  # Also write a memory-mapped cube store (opened in preference to the .nc)
+INCREMENTAL="${INCREMENTAL:-false}"  # After an archive update, process only the new days
 
 # Validate dataset
 case "$DATASET" in
@@ -113,13 +117,21 @@ SLICED_DIR="${DATA_DIR}/F02_analogue_search/sliced/${DATASET}/${EVENT}"
 echo ""
 if [ "$SKIP_CDO" = "true" ]; then
     echo "Step 1: Skipped (SKIP_CDO=true). Python will load full anomaly files with lazy slicing."
-elif [ -d "$SLICED_DIR" ] && ls "${SLICED_DIR}"/anomaly_*_sliced.nc 1>/dev/null 2>&1; then
-    echo "Step 1: Sliced data already exists in ${SLICED_DIR}, skipping."
 else
-    echo "Step 1: Pre-slicing anomaly data..."
-    # Use sequential mode for reliability (avoids HDF5/netCDF threading issues)
+    # Always call the slicer: it reuses a cached slice keyed by dataset/var/region/
+    # window/years/source files and rebuilds only when any of those changed.
+    echo "Step 1: Pre-slicing anomaly data (content-addressed cache)..."
+    # Use sequential mode for reliability (avoids HDF5/netCDF threading issues);
+    # year files are sliced in one worker process per allocated CPU
     export HDF5_USE_FILE_LOCKING=FALSE
-    SLICE_CMD=(run_poetry run python3 Python/dask_slice.py --dataset "$DATASET" --event "$EVENT" --sequential)
+    SLICE_CMD=(run_poetry run python3 Python/dask_slice.py --dataset "$DATASET" --event "$EVENT" --sequential
+               --workers "${SLURM_CPUS_PER_TASK:-4}")
+    if [ "$STORE" = "true" ]; then
+        SLICE_CMD+=(--store)
+    fi
+    if [ "$INCREMENTAL" = "true" ]; then
+        SLICE_CMD+=(--incremental)
+    fi
     echo "Running: ${SLICE_CMD[*]}"
     "${SLICE_CMD[@]}" || {
         echo "ERROR: Pre-slicing failed."
@@ -138,7 +150,11 @@ fi
 echo ""
 
 # Build command with optional period argument
-CMD=(run_poetry run python3 Python/analogue_search.py --dataset "$DATASET" --event "$EVENT" --force)
+if [ "$INCREMENTAL" = "true" ]; then
+    CMD=(run_poetry run python3 Python/analogue_search.py --dataset "$DATASET" --event "$EVENT" --incremental)
+else
+    CMD=(run_poetry run python3 Python/analogue_search.py --dataset "$DATASET" --event "$EVENT" --force)
+fi
 if [ -n "$PERIOD" ]; then
     CMD+=(--period "$PERIOD")
 fi